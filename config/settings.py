@@ -25,6 +25,15 @@ DATA_CSV_PATH = DATA_DIR / "done_des.csv"
 DUCKDB_PATH = ":memory:"
 TABLE_NAME = "trade"
 
+# Snapshot - persistent DuckDB copy of the CSV, attached read-only at startup
+# and rebuilt only when the CSV checksum changes
+USE_SNAPSHOT = True
+SNAPSHOT_PATH = DATA_DIR / "done_des.duckdb"
+# Read a Parquet dataset partitioned by Year/Direction instead of the snapshot
+USE_PARQUET = False
+PARQUET_DIR = DATA_DIR / "done_des_parquet"
+PARQUET_ROW_GROUP_SIZE = 32768  # Rows per row group inside each partition file
+
 # Model configurations
 MISTRAL_MODEL = "mistralai/Mistral-7B-Instruct-v0.2"
 LLAMA_MODEL = "meta-llama/Llama-3.2-1B-Instruct"
@@ -39,15 +48,99 @@ FORMAT_MAX_TOKENS = 512
 SQL_TEMPERATURE = 0.0  # Deterministic for SQL generation
 FORMAT_TEMPERATURE = 0.7  # Creative for natural responses
 TEMPERATURE = 0.7  # Legacy, use SQL_TEMPERATURE or FORMAT_TEMPERATURE
+# Grammar-constrained SQL decoding (src/sql_grammar.py): the SQL model can only produce
+# a valid SELECT over trade's columns and catalogued values. Steps giving up after
+# SQL_GRAMMAR_MAX_REJECTIONS masked tokens end the generation early.
+CONSTRAINED_SQL_DECODING = False
+SQL_GRAMMAR_MAX_REJECTIONS = 512
 
 # Query settings
 MAX_QUERY_TIMEOUT = 30
+# Wall-clock limit in seconds per query class - longer queries are interrupted
+QUERY_TIMEOUTS = {
+    "rollup": 5,  # answered from a pre-aggregated rollup table
+    "aggregate": 15,  # aggregates over the full trade table
+    "rows": MAX_QUERY_TIMEOUT,  # row listings
+}
+QUERY_TIMEOUT_GRACE = 2  # Seconds to wait for an interrupted query to stop
+STREAM_BATCH_SIZE = 2048  # Rows per Arrow record batch when streaming results
+PREVIEW_ROWS = 15  # Rows the formatter shows; larger results are only counted
+RESULT_CACHE_BYTES = 64 * 1024**2  # Memory budget for cached query results (0 disables)
+CURSOR_POOL_SIZE = os.cpu_count() or 4  # Queries allowed to run at once per process
+CURSOR_CHECKOUT_TIMEOUT = 10  # Seconds to wait for a free cursor before failing
 DEFAULT_LIMIT = 1000
+REWRITE_SQL = True  # Apply equivalence-preserving rewrite rules before execution
+# Rules from src/sql_rewrite.py, applied in this order to every SELECT
+REWRITE_RULES = ("drop_tautologies", "having_to_where", "hs_prefix", "sample_random_limit")
+ROUTE_ROLLUPS = True  # Answer aggregate queries from pre-aggregated rollup tables
+# Approximate mode: estimate SUM/COUNT/AVG from a stratified sample (Year, Direction,
+# Country) with confidence intervals; QueryExecutor.execute(approximate=False) is exact
+APPROXIMATE_ANSWERS = False
+APPROX_SAMPLE_FRACTION = 0.05  # Share of each stratum kept in the sample
+APPROX_MIN_STRATUM_ROWS = 20  # Strata smaller than this are kept whole
+APPROX_TAKE_ALL_QUANTILE = 0.99  # Rows with a Value/Quantity/Revenue above this quantile are all kept
+APPROX_CONFIDENCE = 0.95
+USE_DESCRIPTION_INDEX = True  # Serve Description LIKE '%term%' from the substring index
+DESCRIPTION_INDEX_MAX_MATCHES = 200  # Broader terms keep the plain LIKE scan
+# Value catalog (built at load, saved beside the snapshot/Parquet dataset): filters on
+# values that are not in the data are answered "no data" without running the query
+CHECK_LITERALS = True
+CATALOG_TOP_COUNTRIES = 15  # Countries listed in the SQL prompt (keep it short: 1024-token context)
+CATALOG_TOP_TERMS = 15  # Description words listed in the SQL prompt
+# QueryExecutor.execute_many: aggregate queries over trade are answered in batches of at
+# most FUSION_MAX_QUERIES from one shared scan (a temporary rollup over the columns
+# they filter and group on)
+FUSE_BATCH_QUERIES = True
+FUSION_MAX_QUERIES = 16
+# Keyset-paginated results (QueryExecutor.execute_paged): rows per page, and open cursors
+# expire after PAGE_CURSOR_IDLE_SECONDS without a fetch (at most MAX_PAGE_CURSORS kept)
+PAGE_SIZE = DEFAULT_LIMIT
+PAGE_CURSOR_IDLE_SECONDS = 600
+MAX_PAGE_CURSORS = 256
+
+# Admission control - EXPLAIN each query before it runs and act on expensive plans.
+# Actions: "allow", "cap" (append LIMIT ADMISSION_ROW_CAP), "queue" (run behind
+# other heavy queries, ADMISSION_HEAVY_SLOTS at a time) or "reject"
+ADMISSION_CONTROL = True
+ADMISSION_POLICY = {
+    "cross_product": "reject",  # cross join / nested-loop join over many row pairs
+    "huge_join": "queue",  # hash join with a very large estimated output
+    "unbounded_sort": "cap",  # ORDER BY over many rows without LIMIT
+    "huge_result": "cap",  # very large estimated result set
+}
+ADMISSION_THRESHOLDS = {
+    "cross_product": 10_000_000,  # row pairs
+    "huge_join": 10_000_000,  # rows
+    "unbounded_sort": 100_000,  # rows
+    "huge_result": 100_000,  # rows
+}
+ADMISSION_ROW_CAP = DEFAULT_LIMIT
+ADMISSION_HEAVY_SLOTS = 1
+ADMISSION_QUEUE_TIMEOUT = 30  # Seconds a queued query waits for a heavy slot
+
+# Question-answering pipeline (src/pipeline.py)
+PIPELINE_INFERENCE_WORKERS = 1  # Local model calls at once (one model instance)
+PIPELINE_QUERY_WORKERS = CURSOR_POOL_SIZE  # Threads running QueryExecutor.execute
+PIPELINE_MAX_IN_FLIGHT = 1000  # Questions AsyncQueryPipeline works on at once; the rest wait
+GROQ_MAX_CONCURRENCY = 32  # Concurrent Groq requests from the async pipeline
+# Answer questions that differ from an earlier one only in country, year, Nepali month,
+# direction or commodity with its validated SQL, without the SQL model (src/question_templates.py)
+QUESTION_TEMPLATES = True
+QUESTION_TEMPLATE_MAX = 5000  # Templates kept (least recently used dropped)
+# Write SQL for common aggregate questions (totals, top N, per year/month) directly
+# (src/intent_router.py); the SQL model gets questions with words the router did not use
+INTENT_ROUTER = True
+INTENT_ROUTER_MIN_CONFIDENCE = 1.0  # Share of the question's words the parse must account for
 
 # Logging
 LOG_QUERIES = True
 LOG_ERRORS = True
 LOG_PERFORMANCE = True
+# Opt-in DuckDB JSON profiling of every executed query; profiles of queries slower
+# than SLOW_QUERY_SECONDS go to SLOW_QUERY_LOG (operator timings, rows scanned, memory)
+PROFILE_QUERIES = False
+SLOW_QUERY_SECONDS = 1.0
+SLOW_QUERY_LOG = LOGS_DIR / "slow_queries.jsonl"
 
 # Create directories
 DATA_DIR.mkdir(exist_ok=True)
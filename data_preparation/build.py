@@ -1,10 +1,11 @@
 # Build done_des.csv from Excel files
 
+import sys
 import pandas as pd
 from pathlib import Path
-from .config import EXCEL_BASE_DIR, FISCAL_YEARS, MONTH_ORDER, OUTPUT_DIR, NEPALI_MONTHS
+from .config import EXCEL_BASE_DIR, FISCAL_YEARS, MONTH_ORDER, OUTPUT_DIR, NEPALI_MONTHS, HS_LEVELS
 from .excel_reader import read_excel_file
-from .processor import prepare_dataframe, calculate_monthly
+from .processor import prepare_dataframe, calculate_monthly, add_hs_levels
 from .metadata import get_files_with_metadata
 
 
@@ -87,26 +88,8 @@ def process_fiscal_year(year_dir: str, files: list) -> list:
     return all_monthly_data
 
 
-def main():
-    # Main execution
-    print("Building done_des.csv...\n")
-    
-    files_by_year = discover_files()
-    all_data = []
-    
-    for year_dir in FISCAL_YEARS:
-        if year_dir not in files_by_year:
-            continue
-        
-        monthly_data = process_fiscal_year(year_dir, files_by_year[year_dir])
-        all_data.extend(monthly_data)
-    
-    # Combine
-    print("\nCombining all data...")
-    done_df = pd.concat(all_data, ignore_index=True)
-    print(f"Total records before cleaning: {len(done_df):,}")
-    
-    # Clean - Remove records where BOTH Value=0 AND Quantity=0
+def clean_records(done_df: pd.DataFrame) -> pd.DataFrame:
+    # Drop empty records, fix types and keep the done_des.csv columns
     print("\nCleaning zero-value records...")
     both_zero = (done_df['Value'] == 0) & (done_df['Quantity'] == 0)
     print(f"Records with Value=0 AND Quantity=0: {both_zero.sum():,}")
@@ -135,13 +118,76 @@ def main():
     print("\nNormalizing Description column to lowercase...")
     done_df['Description'] = done_df['Description'].str.lower()
     
+    # HS chapter/heading/subheading as integers
+    done_df = add_hs_levels(done_df)
+    
     # Final columns
-    final_cols = ['Year', 'Month', 'Direction', 'HS_Code', 'Description', 'Country', 
+    final_cols = ['Year', 'Month', 'Direction', 'HS_Code', *HS_LEVELS, 'Description', 'Country', 
                   'Value', 'Quantity', 'Unit']
     if 'Revenue' in done_df.columns:
         final_cols.append('Revenue')
     
-    done_df = done_df[final_cols]
+    return done_df[final_cols]
+
+
+def build_month(year_dir: str, month: int) -> Path:
+    # Build the CSV for one month only, for incremental ingest (scripts/ingest_month.py).
+    # Monthly values are this month's cumulative file minus the previous month's.
+    files = discover_files().get(year_dir)
+    if not files:
+        raise FileNotFoundError(f"No Excel files for fiscal year {year_dir}")
+    files_metadata = {fm['month']: fm for fm in get_files_with_metadata(files, year_dir)}
+    
+    if month not in files_metadata:
+        raise FileNotFoundError(f"No file for month {month} in {year_dir}")
+    
+    def cumulative(file_meta):
+        import_df, export_df = read_excel_file(file_meta['path'])
+        return pd.concat([
+            prepare_dataframe(import_df, 'I', file_meta['year'], file_meta['month']),
+            prepare_dataframe(export_df, 'E', file_meta['year'], file_meta['month']),
+        ], ignore_index=True)
+    
+    position = MONTH_ORDER.index(month)
+    previous_cumulative = None
+    if position > 0:
+        previous_month = MONTH_ORDER[position - 1]
+        if previous_month not in files_metadata:
+            raise FileNotFoundError(f"Month {month} needs the cumulative file for month {previous_month}")
+        previous_cumulative = cumulative(files_metadata[previous_month])
+    
+    year_num = files_metadata[month]['year']
+    monthly_df = calculate_monthly(cumulative(files_metadata[month]), previous_cumulative, year_num, month)
+    monthly_df = clean_records(monthly_df)
+    
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    output_path = OUTPUT_DIR / f'month_{year_num}_{month:02d}.csv'
+    monthly_df.to_csv(output_path, index=False)
+    
+    print(f"\nSaved {len(monthly_df):,} records to: {output_path}")
+    return output_path
+
+
+def main():
+    # Main execution
+    print("Building done_des.csv...\n")
+    
+    files_by_year = discover_files()
+    all_data = []
+    
+    for year_dir in FISCAL_YEARS:
+        if year_dir not in files_by_year:
+            continue
+        
+        monthly_data = process_fiscal_year(year_dir, files_by_year[year_dir])
+        all_data.extend(monthly_data)
+    
+    # Combine
+    print("\nCombining all data...")
+    done_df = pd.concat(all_data, ignore_index=True)
+    print(f"Total records before cleaning: {len(done_df):,}")
+    
+    done_df = clean_records(done_df)
     
     print(f"Total records after cleaning: {len(done_df):,}")
     
@@ -162,4 +208,8 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    if len(sys.argv) == 4 and sys.argv[1] == '--month':
+        # python -m data_preparation.build --month 82-83 5
+        build_month(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
@@ -21,6 +21,10 @@ NEPALI_MONTHS = {
     9: 'Poush', 10: 'Magh', 11: 'Falgun', 12: 'Chaitra'
 }
 
+# HS hierarchy columns (chapter, heading, subheading) -> leading digits of HS_Code,
+# as the trade table declares them
+from src.schema import HS_LEVELS
+
 # Sheet keywords for Excel files
 IMPORT_SHEET_KEYS = ['4', 'import', 'table 4']
 EXPORT_SHEET_KEYS = ['6', 'export', 'table 6']
@@ -4,7 +4,27 @@ import pandas as pd
 from pathlib import Path
 from typing import List, Tuple
 from .utils import get_iso2_code
-from .config import MONTH_ORDER
+from .config import MONTH_ORDER, HS_LEVELS
+
+
+def normalize_hs_codes(codes: pd.Series) -> pd.Series:
+    # HS codes as text; codes Excel stored as numbers lose their leading zero
+    # (1012100.0 for 01012100), so 7-digit strings are padded back to 8
+    codes = codes.astype(str).str.replace('.0', '', regex=False)
+    unpadded = codes.str.fullmatch(r'[0-9]{7}')
+    return codes.where(~unpadded, '0' + codes)
+
+
+def add_hs_levels(df: pd.DataFrame) -> pd.DataFrame:
+    # HS2/HS4/HS6 integer columns from the leading digits of HS_Code (missing
+    # when those characters are not all digits)
+    df = df.copy()
+    codes = df['HS_Code'].astype(str)
+    for column, width in HS_LEVELS.items():
+        prefix = codes.str[:width]
+        digits = prefix.where(prefix.str.fullmatch(rf'[0-9]{{{width}}}'))
+        df[column] = pd.to_numeric(digits, errors='coerce').astype('Int64')
+    return df
 
 
 def prepare_dataframe(df: pd.DataFrame, direction: str, year: int, month: int) -> pd.DataFrame:
@@ -28,7 +48,7 @@ def prepare_dataframe(df: pd.DataFrame, direction: str, year: int, month: int) -
         df['Description'] = ''
     
     # Clean HS codes
-    df['HS_Code'] = df['HS_Code'].astype(str).str.replace('.0', '', regex=False)
+    df['HS_Code'] = normalize_hs_codes(df['HS_Code'])
     
     # Convert countries to ISO-2
     df['Country'] = df['Country'].apply(get_iso2_code)
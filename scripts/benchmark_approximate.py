@@ -0,0 +1,95 @@
+# Exact vs approximate (stratified sample) answers on TEST_CASES: time, error and CI coverage
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from config.settings import DATA_CSV_PATH
+from src.approximate import Approximator, CI_SUFFIXES
+from src.database import TradeDatabase
+from tests.test_data import TEST_CASES
+
+
+def best_time(db, sql, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = db.execute_query(sql, timeout=None)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def compare(exact, approx):
+    # (relative errors, estimates inside their interval, estimates) over every
+    # estimated cell, matching groups on the columns that are not estimated
+    estimated = [name for name in exact.columns if name + CI_SUFFIXES[0] in approx.columns]
+    keys = [name for name in exact.columns if name not in estimated]
+    if keys:
+        matched = exact.merge(approx, on=keys, suffixes=("", "_approx"))
+    else:
+        matched = exact.join(approx, rsuffix="_approx")
+    
+    errors, covered, total = [], 0, 0
+    for name in estimated:
+        truth = matched[name].to_numpy(dtype=float)
+        estimate = matched[name + "_approx"].to_numpy(dtype=float)
+        low, high = (matched[name + suffix].to_numpy(dtype=float) for suffix in CI_SUFFIXES)
+        ok = ~np.isnan(truth) & ~np.isnan(estimate)
+        errors.extend(np.abs(estimate[ok] - truth[ok]) / np.maximum(np.abs(truth[ok]), 1e-9))
+        covered += int(((low[ok] <= truth[ok]) & (truth[ok] <= high[ok])).sum())
+        total += int(ok.sum())
+    return errors, covered, total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default=str(DATA_CSV_PATH))
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate N synthetic rows instead")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = Path(args.csv)
+        if args.synthetic:
+            from tests.synthetic_data import write_synthetic_csv
+            csv_path = write_synthetic_csv(Path(work_dir) / "done_des.csv", n_rows=args.synthetic)
+        
+        with TradeDatabase(csv_path, use_snapshot=False, result_cache_bytes=0) as db:
+            start = time.perf_counter()
+            sample = db.sample()
+            print(f"Sample: {sample['sample_rows']:,} of {sample['population_rows']:,} rows "
+                  f"in {sample['strata']} strata, built in {time.perf_counter() - start:.2f}s\n")
+            
+            approximator = Approximator(db)
+            exact_time = approx_time = 0.0
+            errors, covered, total, skipped = [], 0, 0, 0
+            for sql in dict.fromkeys(case["expected_sql"] for case in TEST_CASES):
+                approx_sql = approximator.plan(sql)
+                if approx_sql is None:
+                    skipped += 1
+                    continue
+                exact, exact_seconds = best_time(db, sql, args.repeat)
+                approx, approx_seconds = best_time(db, approx_sql, args.repeat)
+                exact_time += exact_seconds
+                approx_time += approx_seconds
+                query_errors, query_covered, query_total = compare(exact, approx)
+                errors.extend(query_errors)
+                covered += query_covered
+                total += query_total
+            
+            print(f"Approximated: {total} estimates, {skipped} queries run exactly")
+            print(f"Exact total:  {exact_time * 1000:.1f} ms")
+            print(f"Approx total: {approx_time * 1000:.1f} ms ({approx_time / exact_time:.1%} of exact)")
+            print(f"Relative error: median {statistics.median(errors):.2%}, "
+                  f"p90 {np.percentile(errors, 90):.2%}")
+            print(f"Exact value inside the {approximator.confidence:.0%} interval: {covered / total:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Compare Description LIKE '%term%' scans against the substring index rewrite
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+from config.settings import DATA_CSV_PATH, TABLE_NAME
+from src.database import TradeDatabase
+from src.description_index import DescriptionRewriter
+from tests.test_data import TEST_CASES
+
+
+def timed(db, sql, repeat):
+    # Best of `repeat` runs, after one warm-up
+    result = db.execute_query(sql)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.execute_query(sql)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(csv_path, scale, repeat):
+    db = TradeDatabase(csv_path, use_snapshot=False, result_cache_bytes=0)
+    db.load_data()
+    base_rows = db.get_row_count()
+    for _ in range(scale - 1):
+        db.conn.execute(f"INSERT INTO {TABLE_NAME} SELECT * FROM {TABLE_NAME} LIMIT {base_rows}")
+    
+    start = time.perf_counter()
+    index = db.description_index()
+    build_time = time.perf_counter() - start
+    rewriter = DescriptionRewriter(index)
+    
+    print(f"\nRows: {db.get_row_count():,}  distinct descriptions: {len(index):,}  index build: {build_time * 1000:.1f} ms")
+    print(f"{'query':<70}{'scan ms':>10}{'index ms':>10}{'rewrite ms':>12}")
+    
+    queries = sorted({c["expected_sql"] for c in TEST_CASES if "LIKE '%" in c["expected_sql"]})
+    total_scan = total_index = 0.0
+    for sql in queries:
+        start = time.perf_counter()
+        rewritten = rewriter.rewrite(sql)
+        rewrite_time = time.perf_counter() - start
+        if rewritten == sql:
+            continue
+        
+        scan_time, expected = timed(db, sql, repeat)
+        index_time, actual = timed(db, rewritten, repeat)
+        pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-9)
+        
+        total_scan += scan_time
+        total_index += index_time
+        print(f"{sql[:68]:<70}{scan_time * 1000:>10.1f}{index_time * 1000:>10.1f}{rewrite_time * 1000:>12.1f}")
+    
+    print(f"{'total':<70}{total_scan * 1000:>10.1f}{total_index * 1000:>10.1f}")
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default=str(DATA_CSV_PATH))
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate N synthetic rows instead")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10], help="Table size multipliers")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = Path(args.csv)
+        if args.synthetic:
+            from tests.synthetic_data import write_synthetic_csv
+            csv_path = write_synthetic_csv(Path(work_dir) / "done_des.csv", n_rows=args.synthetic)
+        
+        print(f"Source: {csv_path}")
+        for scale in args.scale:
+            run(csv_path, scale, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
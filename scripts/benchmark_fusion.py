@@ -0,0 +1,72 @@
+# One execute() per query vs QueryExecutor.execute_many on TEST_CASES: time, shared
+# scans and whether every result matches, with and without rollup routing
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+from config.settings import DATA_CSV_PATH
+from src.database import TradeDatabase
+from src.executor import QueryExecutor
+from tests.test_data import TEST_CASES
+
+
+def same_result(sql, single, batched):
+    if single[0] != batched[0] or single[2] != batched[2]:
+        return False
+    left, right = single[1], batched[1]
+    if "ORDER BY" not in sql.upper() and not left.empty:
+        left = left.sort_values(list(left.columns)).reset_index(drop=True)
+        right = right.sort_values(list(right.columns)).reset_index(drop=True)
+    try:
+        pd.testing.assert_frame_equal(left, right)
+    except AssertionError:
+        return False
+    return True
+
+
+def best_time(run, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = run()
+        best = min(best, time.perf_counter() - start)
+    return results, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default=str(DATA_CSV_PATH))
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate N synthetic rows instead")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = Path(args.csv)
+        if args.synthetic:
+            from tests.synthetic_data import write_synthetic_csv
+            csv_path = write_synthetic_csv(Path(work_dir) / "done_des.csv", n_rows=args.synthetic)
+        
+        # No result cache: repeats would otherwise be lookups
+        with TradeDatabase(csv_path, use_snapshot=False, result_cache_bytes=0) as db:
+            sqls = [case["expected_sql"] for case in TEST_CASES]
+            print(f"Queries: {len(sqls)}\n")
+            print(f"{'rollups':<9}{'single ms':>11}{'batch ms':>10}{'speedup':>9}{'scans':>7}{'fused':>7}{'identical':>11}")
+            for route_rollups in (True, False):
+                executor = QueryExecutor(log_failures=False, db=db, route_rollups=route_rollups)
+                batches = executor._fusion_batches(sqls)
+                single, single_time = best_time(lambda: [executor.execute(sql) for sql in sqls], args.repeat)
+                batched, batch_time = best_time(lambda: executor.execute_many(sqls), args.repeat)
+                same = sum(same_result(*item) for item in zip(sqls, single, batched))
+                print(f"{'on' if route_rollups else 'off':<9}{single_time * 1000:>11.1f}{batch_time * 1000:>10.1f}"
+                      f"{single_time / batch_time:>8.2f}x{len(batches):>7}"
+                      f"{sum(len(batch.members) for batch in batches):>7}{same:>7}/{len(sqls)}")
+
+
+if __name__ == "__main__":
+    main()
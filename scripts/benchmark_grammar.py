@@ -0,0 +1,121 @@
+# Retry rate with and without grammar-constrained SQL decoding. Without a model, the SQL
+# of TEST_CASES plus every failure logged in logs/query_errors.jsonl is executed, and the
+# queries that fail or need a Groq regeneration are checked against the grammar: how many
+# constrained decoding could not have produced, whether it blocks any reference query, and
+# what a grammar check costs. Pass --real to generate TEST_CASES with the GGUF model both ways.
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import LOGS_DIR
+from src.database import TradeDatabase
+from src.executor import QueryExecutor
+from src.prompt_builder import SQLPromptBuilder
+from src.sql_grammar import SQLGrammar
+from tests.detailed_test_data import DETAILED_TRADE_CASES
+from tests.test_data import TEST_CASES
+from tests.variety_test_data import ADDITIONAL_VARIETY_CASES
+
+
+def first_try_fails(executor, sql, question):
+    # Whether sql fails, or is only answered after a regeneration
+    regenerations = []
+    success, _, _ = executor.execute(sql, question, lambda q, error: regenerations.append(error) or sql)
+    return not success or bool(regenerations)
+
+
+def blocked_at(grammar, sql):
+    # Length of the shortest prefix of sql constrained decoding cannot produce, or None
+    for end in range(1, len(sql) + 1):
+        if not grammar.accepts(sql[:end]):
+            return end
+    return None if grammar.complete(sql) else len(sql)
+
+
+def replay(executor, grammar, show):
+    references = [case["expected_sql"] for case in TEST_CASES + DETAILED_TRADE_CASES + ADDITIONAL_VARIETY_CASES]
+    logged = [json.loads(line) for line in open(LOGS_DIR / "query_errors.jsonl", encoding="utf-8")]
+    workload = ([(case["question"], case["expected_sql"]) for case in TEST_CASES]
+                + [(entry["question"], entry["sql"]) for entry in logged])
+    
+    failing = [(question, sql) for question, sql in workload if first_try_fails(executor, sql, question)]
+    prevented = 0
+    for question, sql in failing:
+        end = blocked_at(grammar, sql)
+        prevented += end is not None
+        if show:
+            print(f"  {question}\n    " + (f"blocked at {sql[:end][-40:]!r}" if end is not None else "still generable"))
+    remaining = len(failing) - prevented
+    print(f"Questions: {len(workload)} (TEST_CASES and {len(logged)} logged failures)")
+    print(f"Retry rate, free decoding:   {len(failing)}/{len(workload)} ({len(failing) / len(workload):.1%})")
+    print(f"Failing SQL the grammar cannot produce: {prevented}/{len(failing)}")
+    print(f"Retry rate, constrained, if the model writes valid SQL in its place: "
+          f"{remaining}/{len(workload)} ({remaining / len(workload):.1%})")
+    
+    blocked = [sql for sql in references if blocked_at(grammar, sql) is not None]
+    checks = 0
+    start = time.perf_counter()
+    for sql in references:
+        for end in range(1, len(sql) + 1):
+            grammar.accepts(sql[:end])
+            checks += 1
+    per_check = (time.perf_counter() - start) / checks * 1000
+    print(f"Reference queries blocked: {len(blocked)}/{len(references)}")
+    print(f"Grammar check: {per_check:.3f} ms (one per sampled token, one more per masked token)")
+
+
+def generate(executor, builder, show):
+    from src.models import ModelLoader
+    loader = ModelLoader()
+    loader.load_sql_generator()
+    loader.prime_sql_prefix(builder.prefix())
+    print(f"Questions: {len(TEST_CASES)}")
+    print(f"{'decoding':<14}{'retries':>9}{'retry rate':>12}{'seconds':>10}")
+    for grammar in (None, SQLGrammar(builder.catalog)):
+        loader.constrain_sql(grammar)
+        retries, seconds = [], 0.0
+        for case in TEST_CASES:
+            start = time.perf_counter()
+            sql = builder.extract_sql(loader.generate_sql(builder.build_prompt(case["question"])))
+            seconds += time.perf_counter() - start
+            if first_try_fails(executor, sql, case["question"]):
+                retries.append((case["question"], sql))
+        name = "free" if grammar is None else "constrained"
+        print(f"{name:<14}{len(retries):>9}{len(retries) / len(TEST_CASES):>12.1%}{seconds:>10.1f}")
+        if show:
+            for question, sql in retries:
+                print(f"  {question}\n    {sql}")
+    print(f"Masked tokens: {loader.grammar_stats['masked_tokens']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", type=int, default=200_000, help="Synthetic rows (0 uses the real data)")
+    parser.add_argument("--real", action="store_true", help="Generate TEST_CASES with the GGUF SQL model")
+    parser.add_argument("--show", action="store_true", help="Print the failing queries")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.synthetic:
+            from tests.synthetic_data import write_synthetic_csv
+            db = TradeDatabase(write_synthetic_csv(Path(work_dir) / "done_des.csv", n_rows=args.synthetic))
+        else:
+            db = TradeDatabase()
+        db.load_data()
+        executor = QueryExecutor(log_failures=False, db=db)
+        builder = SQLPromptBuilder(db.catalog())
+        if args.real:
+            generate(executor, builder, args.show)
+        else:
+            replay(executor, SQLGrammar(builder.catalog), args.show)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Rows scanned and query time on TEST_CASES: single CSV vs loaded table vs partitioned Parquet
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import duckdb
+from config.settings import DATA_CSV_PATH, TABLE_NAME, PARQUET_ROW_GROUP_SIZE
+from src.parquet_store import attach_parquet, build_parquet
+from src.schema import create_trade_table, read_csv_sql
+from tests.test_data import TEST_CASES
+
+
+def open_csv(csv_path, work_dir):
+    # Baseline: every query parses the single CSV
+    conn = duckdb.connect()
+    conn.execute(f"CREATE VIEW {TABLE_NAME} AS {read_csv_sql(csv_path)}")
+    return conn
+
+
+def open_table(csv_path, work_dir):
+    conn = duckdb.connect()
+    create_trade_table(conn, csv_path)
+    return conn
+
+
+def open_parquet(csv_path, work_dir, row_group_size):
+    dataset_dir = Path(work_dir) / f"parquet_{row_group_size}"
+    build_parquet(csv_path, dataset_dir, row_group_size=row_group_size)
+    conn = duckdb.connect()
+    attach_parquet(conn, dataset_dir)
+    return conn
+
+
+def measure(conn, sql, work_dir, repeat):
+    # (rows read by scans, best wall time) for one query
+    profile_path = Path(work_dir) / "profile.json"
+    conn.execute("PRAGMA enable_profiling = 'json'")
+    conn.execute(f"PRAGMA profiling_output = '{profile_path}'")
+    conn.execute(sql).fetchall()
+    conn.execute("PRAGMA disable_profiling")
+    rows_scanned = json.loads(profile_path.read_text())["cumulative_rows_scanned"]
+    
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return rows_scanned, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default=str(DATA_CSV_PATH))
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate N synthetic rows instead")
+    parser.add_argument("--row-group-size", type=int, nargs="+", default=[PARQUET_ROW_GROUP_SIZE])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = Path(args.csv)
+        if args.synthetic:
+            from tests.synthetic_data import write_synthetic_csv
+            csv_path = write_synthetic_csv(Path(work_dir) / "done_des.csv", n_rows=args.synthetic)
+        print(f"Source: {csv_path}")
+        
+        sources = {"csv": lambda: open_csv(csv_path, work_dir), "table": lambda: open_table(csv_path, work_dir)}
+        for size in args.row_group_size:
+            sources[f"parquet/{size}"] = lambda size=size: open_parquet(csv_path, work_dir, size)
+        
+        queries = list(dict.fromkeys(case["expected_sql"] for case in TEST_CASES))
+        print(f"Queries: {len(queries)}\n")
+        print(f"{'source':<16}{'rows scanned':>16}{'vs csv':>9}{'total ms':>11}{'vs csv':>9}")
+        
+        baseline = None
+        for name, open_source in sources.items():
+            conn = open_source()
+            total_rows = total_time = 0.0
+            for sql in queries:
+                rows_scanned, elapsed = measure(conn, sql, work_dir, args.repeat)
+                total_rows += rows_scanned
+                total_time += elapsed
+            conn.close()
+            
+            baseline = baseline or (total_rows, total_time)
+            print(f"{name:<16}{int(total_rows):>16,}{total_rows / baseline[0]:>8.1%}"
+                  f"{total_time * 1000:>11.1f}{total_time / baseline[1]:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# Questions per second through the blocking pipeline vs AsyncQueryPipeline.
+# The local model and Groq are replaced by stand-ins with fixed latencies (no GPU or
+# API key needed); DuckDB execution is real. Pass --real to use the actual models.
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.database import TradeDatabase
+from src.executor import QueryExecutor
+from src.pipeline import AsyncQueryPipeline, QueryPipeline
+from tests.test_data import TEST_CASES
+
+
+class TimedModel:
+    # Answers TEST_CASES questions with their expected SQL after a fixed delay.
+    # One model instance runs one generation at a time, like the GGUF model.
+    
+    def __init__(self, latency):
+        self.latency = latency
+        self.sql = {case["question"]: case["expected_sql"] for case in TEST_CASES}
+        self._lock = threading.Lock()
+    
+    def generate_sql(self, prompt):
+        question = prompt.rsplit("User Question: ", 1)[1].rsplit("\n\nSQL:", 1)[0]
+        with self._lock:
+            time.sleep(self.latency)
+        return self.sql[question]
+
+
+class TimedGroq:
+    # Groq stand-in: network round trips of a fixed length, blocking and awaitable
+    
+    def __init__(self, latency):
+        self.latency = latency
+    
+    def generate(self, prompt, temperature=0.7, max_tokens=1024):
+        time.sleep(self.latency)
+        return "Answer."
+    
+    async def agenerate(self, prompt, temperature=0.7, max_tokens=1024):
+        await asyncio.sleep(self.latency)
+        return "Answer."
+    
+    def fix_sql(self, question, bad_sql, error_msg):
+        time.sleep(self.latency)
+        return bad_sql
+    
+    async def afix_sql(self, question, bad_sql, error_msg):
+        await asyncio.sleep(self.latency)
+        return bad_sql
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=200, help="Questions per run (TEST_CASES repeated)")
+    parser.add_argument("--model-latency", type=float, default=0.02, help="Seconds per simulated SQL generation")
+    parser.add_argument("--groq-latency", type=float, default=0.3, help="Seconds per simulated Groq call")
+    parser.add_argument("--synthetic", type=int, default=200_000, help="Synthetic rows (0 uses the real data)")
+    parser.add_argument("--real", action="store_true", help="Use the GGUF model and the Groq API")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.synthetic:
+            from tests.synthetic_data import write_synthetic_csv
+            db = TradeDatabase(write_synthetic_csv(Path(work_dir) / "done_des.csv", n_rows=args.synthetic))
+        else:
+            db = TradeDatabase()
+        db.load_data()
+        # Caching would turn repeated questions into lookups after the first round
+        executor = QueryExecutor(log_failures=False, db=db)
+        db.result_cache = None
+        
+        if args.real:
+            pipeline = QueryPipeline(executor=executor)
+        else:
+            from src.formatter import ResponseFormatter
+            from src.prompt_builder import SQLPromptBuilder
+            groq = TimedGroq(args.groq_latency)
+            pipeline = QueryPipeline(
+                TimedModel(args.model_latency), executor, groq, SQLPromptBuilder(db.catalog()), ResponseFormatter(groq)
+            )
+        
+        questions = [TEST_CASES[i % len(TEST_CASES)]["question"] for i in range(args.questions)]
+        print(f"Questions: {len(questions)}")
+        
+        start = time.perf_counter()
+        sync_answers = [pipeline.answer(question) for question in questions]
+        sync_time = time.perf_counter() - start
+        
+        async def run():
+            async with AsyncQueryPipeline(pipeline) as async_pipeline:
+                return await async_pipeline.answer_many(questions)
+        
+        start = time.perf_counter()
+        async_answers = asyncio.run(run())
+        async_time = time.perf_counter() - start
+        
+        same = sum(a["answer"] == b["answer"] and a["success"] == b["success"]
+                   for a, b in zip(sync_answers, async_answers))
+        print(f"{'path':<8}{'seconds':>10}{'questions/s':>14}")
+        print(f"{'sync':<8}{sync_time:>10.2f}{len(questions) / sync_time:>14.1f}")
+        print(f"{'async':<8}{async_time:>10.2f}{len(questions) / async_time:>14.1f}")
+        print(f"Speedup: {sync_time / async_time:.1f}x, identical answers: {same}/{len(questions)}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# Accuracy and latency of the intent router against the SQL model on TEST_CASES. A
+# question's SQL is accurate when its result matches the result of the case's expected
+# SQL (same rows in any order). Without --real only the routed path is measured; the
+# questions the model would get are counted.
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.database import TradeDatabase
+from src.intent_router import IntentRouter
+from src.prompt_builder import SQLPromptBuilder
+from tests.test_data import TEST_CASES
+
+
+def rows(db, sql):
+    # Result rows in a canonical order, or None if sql fails
+    try:
+        frame = db.execute_query(sql)
+    except Exception:
+        return None
+    values = [tuple(None if pd.isna(value) else round(value, 4) if isinstance(value, float) else value
+                    for value in row)
+              for row in frame.itertuples(index=False)]
+    return sorted(values, key=repr)
+
+
+def report(name, results):
+    if not results:
+        print(f"{name:<8}{0:>11}")
+        return
+    accurate = sum(correct for correct, _ in results)
+    latency = sum(seconds for _, seconds in results) / len(results) * 1000
+    print(f"{name:<8}{len(results):>11}{accurate:>10}{accurate / len(results):>10.1%}{latency:>14.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", type=int, default=200_000, help="Synthetic rows (0 uses the real data)")
+    parser.add_argument("--real", action="store_true", help="Also generate the fallback questions with the GGUF model")
+    parser.add_argument("--show", action="store_true", help="Print the inaccurate routed questions")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.synthetic:
+            from tests.synthetic_data import write_synthetic_csv
+            db = TradeDatabase(write_synthetic_csv(Path(work_dir) / "done_des.csv", n_rows=args.synthetic))
+        else:
+            db = TradeDatabase()
+        db.load_data()
+        builder = SQLPromptBuilder(db.catalog())
+        router = IntentRouter(builder.catalog)
+        
+        loader = None
+        if args.real:
+            from src.models import ModelLoader
+            loader = ModelLoader()
+            loader.load_sql_generator()
+            loader.prime_sql_prefix(builder.prefix())
+        
+        routed, generated, fallbacks = [], [], []
+        for case in TEST_CASES:
+            start = time.perf_counter()
+            sql = router.route(case["question"])
+            seconds = time.perf_counter() - start
+            if sql is None:
+                fallbacks.append(case)
+                if loader is None:
+                    continue
+                start = time.perf_counter()
+                sql = builder.extract_sql(loader.generate_sql(builder.build_prompt(case["question"])))
+                seconds += time.perf_counter() - start
+                results = generated
+            else:
+                results = routed
+            result = rows(db, sql)
+            correct = result is not None and result == rows(db, case["expected_sql"])
+            results.append((correct, seconds))
+            if args.show and not correct and results is routed:
+                print(f"  {case['question']}\n    routed:   {sql}\n    expected: {case['expected_sql']}")
+        db.close()
+    
+    print(f"Questions: {len(TEST_CASES)}, routed: {len(routed)}, to the model: {len(fallbacks)}")
+    print(f"{'path':<8}{'questions':>11}{'accurate':>10}{'accuracy':>10}{'ms/question':>14}")
+    report("routed", routed)
+    if loader is not None:
+        report("model", generated)
+    else:
+        print(f"{'model':<8}{len(fallbacks):>11}   (not measured; pass --real)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Compare read_csv_auto against the declared trade schema: load time, memory, snapshot size
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import duckdb
+from config.settings import DATA_CSV_PATH, TABLE_NAME
+from src.schema import create_trade_table, memory_usage_bytes
+
+
+def load_auto(conn, csv_path):
+    conn.execute(f"CREATE TABLE {TABLE_NAME} AS SELECT * FROM read_csv_auto('{csv_path}')")
+
+
+def load_typed(conn, csv_path):
+    create_trade_table(conn, csv_path)
+
+
+def measure(name, loader, csv_path, work_dir):
+    # In-memory load time and footprint, plus size of a persisted copy
+    conn = duckdb.connect()
+    start = time.perf_counter()
+    loader(conn, csv_path)
+    load_time = time.perf_counter() - start
+    memory = memory_usage_bytes(conn)
+    
+    start = time.perf_counter()
+    conn.execute(f"SELECT SUM(Value) FROM {TABLE_NAME} WHERE Country = 'IN' AND Direction = 'I'").fetchone()
+    query_time = time.perf_counter() - start
+    conn.close()
+    
+    db_path = Path(work_dir) / f"{name}.duckdb"
+    conn = duckdb.connect(str(db_path))
+    loader(conn, csv_path)
+    conn.execute("CHECKPOINT")
+    conn.close()
+    
+    return {
+        "load_s": load_time,
+        "memory_mb": memory / 1024**2,
+        "query_ms": query_time * 1000,
+        "file_mb": db_path.stat().st_size / 1024**2,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default=str(DATA_CSV_PATH))
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate N synthetic rows instead")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = Path(args.csv)
+        if args.synthetic:
+            from tests.synthetic_data import write_synthetic_csv
+            csv_path = write_synthetic_csv(Path(work_dir) / "done_des.csv", n_rows=args.synthetic)
+        
+        print(f"Source: {csv_path}\n")
+        results = {
+            "read_csv_auto": measure("auto", load_auto, csv_path, work_dir),
+            "declared": measure("typed", load_typed, csv_path, work_dir),
+        }
+    
+    print(f"{'schema':<15}{'load s':>10}{'memory MB':>12}{'file MB':>10}{'query ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<15}{r['load_s']:>10.2f}{r['memory_mb']:>12.1f}{r['file_mb']:>10.1f}{r['query_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# Tokens generated per TEST_CASES question with and without stopping at the end of the
+# SQL statement. By default the model is a stand-in that writes the expected SQL and then
+# carries on the way Mistral does after a few-shot answer; pass --real for the GGUF model.
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.prompt_builder import SQLPromptBuilder
+from src.streaming import until_statement_end
+from tests.test_data import TEST_CASES
+
+MAX_NEW_TOKENS = 150
+STOP = ["\n\nQuestion:", "Q:"]
+
+# After its answer the model continues the few-shot pattern: either a next example
+# (ends at the "\n\nQuestion:" stop string) or a prompt-style "User Question:" turn,
+# which no stop string matches, so it runs to the token limit
+CONTINUATIONS = {
+    "next example": "\n\nQuestion: Exports to China?\nSELECT SUM(Value) FROM trade WHERE Country = 'CN';",
+    "new user turn": "\n\nUser Question: Exports to China?\n\nSQL: SELECT SUM(Value) FROM trade WHERE Country = 'CN';" * 8,
+}
+
+
+def pieces(text):
+    # Word and punctuation pieces, roughly like the tokenizer splits SQL
+    return re.findall(r"\s*\w+|\s*[^\w\s]|\s+", text)
+
+
+class Counted:
+    # Wraps a token stream and counts the tokens drawn from it
+    
+    def __init__(self, stream):
+        self.stream = iter(stream)
+        self.count = 0
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        token = next(self.stream)
+        self.count += 1
+        return token
+    
+    def close(self):
+        close = getattr(self.stream, "close", None)
+        if close is not None:
+            close()
+
+
+def until_stop(tokens):
+    # The old behaviour: stop strings or the token limit
+    text = ""
+    for count, token in enumerate(tokens, 1):
+        text += token
+        if any(stop in text for stop in STOP) or count >= MAX_NEW_TOKENS:
+            break
+    return text
+
+
+def simulate():
+    builder = SQLPromptBuilder()
+    for name, continuation in CONTINUATIONS.items():
+        before = after = same = 0
+        for case in TEST_CASES:
+            output = case["expected_sql"] + continuation
+            full = Counted(pieces(output))
+            full_sql = builder.extract_sql(until_stop(full))
+            early = Counted(pieces(output))
+            early_sql = builder.extract_sql("".join(until_statement_end(early)))
+            before += full.count
+            after += early.count
+            same += full_sql == early_sql
+        report(name, before, after, same)
+
+
+def real():
+    from src.models import ModelLoader
+    loader = ModelLoader()
+    loader.load_sql_generator()
+    builder = SQLPromptBuilder()
+    before = after = same = 0
+    old_time = new_time = 0.0
+    for case in TEST_CASES:
+        prompt = builder.build_prompt(case["question"])
+        start = time.perf_counter()
+        full = Counted(loader.sql_model(
+            prompt, max_new_tokens=MAX_NEW_TOKENS, temperature=0.25, top_p=0.85,
+            repetition_penalty=1.15, stop=STOP, threads=8, stream=True, seed=0
+        ))
+        full_sql = builder.extract_sql("".join(full))
+        old_time += time.perf_counter() - start
+        
+        start = time.perf_counter()
+        early = Counted(loader.sql_model(
+            prompt, max_new_tokens=MAX_NEW_TOKENS, temperature=0.25, top_p=0.85,
+            repetition_penalty=1.15, stop=STOP, threads=8, stream=True, seed=0
+        ))
+        early_sql = builder.extract_sql("".join(until_statement_end(early)))
+        new_time += time.perf_counter() - start
+        before += full.count
+        after += early.count
+        same += full_sql == early_sql
+    report("GGUF model", before, after, same)
+    print(f"Generation time: {old_time:.1f}s -> {new_time:.1f}s")
+
+
+def report(name, before, after, same):
+    queries = len(TEST_CASES)
+    print(f"{name}: {before / queries:.1f} -> {after / queries:.1f} tokens per query "
+          f"({(before - after) / queries:.1f} saved, {1 - after / before:.0%}), "
+          f"same extracted SQL {same}/{queries}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--real", action="store_true", help="Use the GGUF SQL model")
+    args = parser.parse_args()
+    real() if args.real else simulate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# Build (or refresh) the persistent DuckDB snapshot of done_des.csv
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import DATA_CSV_PATH, SNAPSHOT_PATH
+from src.snapshot import ensure_snapshot
+
+
+def main():
+    print(f"Source:   {DATA_CSV_PATH}")
+    print(f"Snapshot: {SNAPSHOT_PATH}")
+    
+    start = time.perf_counter()
+    meta = ensure_snapshot(DATA_CSV_PATH, SNAPSHOT_PATH)
+    elapsed = time.perf_counter() - start
+    
+    print(f"\nRows:     {meta['row_count']:,}")
+    print(f"Checksum: {meta['checksum'][:16]}...")
+    print(f"Built at: {meta['built_at']}")
+    print(f"Elapsed:  {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# Replace one (Year, Month) partition of the persistent snapshot (or Parquet dataset) from a monthly CSV
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import DATA_CSV_PATH, SNAPSHOT_PATH, USE_PARQUET, PARQUET_DIR
+from src.ingest import ingest_parquet_partition, ingest_partition
+from src.parquet_store import ensure_parquet
+from src.snapshot import ensure_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("month_csv", help="CSV in done_des.csv layout holding one (Year, Month)")
+    parser.add_argument("--snapshot", default=str(SNAPSHOT_PATH))
+    parser.add_argument("--parquet", nargs="?", const=str(PARQUET_DIR), default=str(PARQUET_DIR) if USE_PARQUET else None,
+                        help="Ingest into this Parquet dataset instead of the snapshot")
+    args = parser.parse_args()
+    
+    target = Path(args.parquet or args.snapshot)
+    print(f"Month:    {args.month_csv}")
+    print(f"{'Dataset:' if args.parquet else 'Snapshot:':<10}{target}")
+    
+    start = time.perf_counter()
+    if args.parquet:
+        if target == PARQUET_DIR:
+            ensure_parquet(DATA_CSV_PATH, target)
+        partition = ingest_parquet_partition(Path(args.month_csv), target)
+    else:
+        if target == SNAPSHOT_PATH:
+            ensure_snapshot(DATA_CSV_PATH, target)
+        partition = ingest_partition(Path(args.month_csv), target)
+    elapsed = time.perf_counter() - start
+    
+    print(f"\nPartition: {partition['year']}-{partition['month']:02d}")
+    print(f"Replaced:  {partition['deleted']:,} rows with {partition['inserted']:,}")
+    if partition["widened_enums"]:
+        print(f"New values in: {', '.join(partition['widened_enums'])}")
+    print(f"Elapsed:   {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
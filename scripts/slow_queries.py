@@ -0,0 +1,42 @@
+# Summarize the slow-query log: slowest query shapes and their hottest operators
+
+import argparse
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import SLOW_QUERY_LOG
+from src.profiling import SlowQueryLog
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", default=str(SLOW_QUERY_LOG))
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    
+    entries = SlowQueryLog(Path(args.log), threshold=0.0).read()
+    if not entries:
+        print(f"No slow queries in {args.log}")
+        return
+    
+    by_fingerprint = defaultdict(list)
+    for entry in entries:
+        by_fingerprint[entry["fingerprint"]].append(entry)
+    ranked = sorted(by_fingerprint.values(), key=lambda group: -max(e["elapsed_time"] for e in group))
+    
+    for group in ranked[:args.top]:
+        worst = max(group, key=lambda e: e["elapsed_time"])
+        print(f"{worst['elapsed_time']:.2f}s worst, {len(group)} run(s), "
+              f"{worst['rows_scanned'] or 0:,} rows scanned, {worst['peak_memory_bytes'] / 2**20:.1f} MiB peak")
+        print(f"  Q:   {worst['question']}")
+        print(f"  SQL: {' '.join(worst['sql'].split())}")
+        for op in sorted(worst["operators"], key=lambda op: -op["seconds"])[:3]:
+            print(f"    {op['operator']:<24}{op['seconds']:>8.3f}s{op['rows_scanned']:>12,} scanned")
+        print()
+
+
+if __name__ == "__main__":
+    main()
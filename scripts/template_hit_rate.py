@@ -0,0 +1,91 @@
+# Replay the query log through the question-template cache: how many questions it would
+# have answered without the SQL model, and whether its SQL matches what was logged
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config.settings import LOGS_DIR
+from src.question_templates import QuestionTemplates
+from src.result_cache import fingerprint
+
+
+def read_log(path):
+    # (question, sql) of each answered question, oldest first
+    with open(path, encoding="utf-8") as f:
+        return [(entry["question"], entry["sql"]) for entry in map(json.loads, f) if entry.get("sql")]
+
+
+def test_cases():
+    from tests.detailed_test_data import DETAILED_TRADE_CASES
+    from tests.test_data import TEST_CASES
+    from tests.variety_test_data import ADDITIONAL_VARIETY_CASES
+    return [(case["question"], case["expected_sql"])
+            for case in TEST_CASES + DETAILED_TRADE_CASES + ADDITIONAL_VARIETY_CASES]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", default=str(LOGS_DIR / "queries.log"))
+    parser.add_argument("--test-cases", action="store_true", help="Replay the test questions instead of the log")
+    parser.add_argument("--synthetic", type=int, default=0, help="Synthetic rows for the catalog (0 uses the real data)")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    
+    if args.test_cases:
+        entries = test_cases()
+    elif Path(args.log).exists():
+        entries = read_log(args.log)
+    else:
+        print(f"No query log at {args.log}")
+        return
+    
+    # Commodity slots come from the catalog's description words
+    from src.database import TradeDatabase
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.synthetic:
+            from tests.synthetic_data import write_synthetic_csv
+            db = TradeDatabase(write_synthetic_csv(Path(work_dir) / "done_des.csv", n_rows=args.synthetic))
+        else:
+            db = TradeDatabase()
+        db.load_data()
+        templates = QuestionTemplates(db.catalog())
+        db.close()
+    
+    same, different, seconds = 0, [], 0.0
+    template_hits = Counter()
+    for question, sql in entries:
+        start = time.perf_counter()
+        cached = templates.sql_for(question)
+        seconds += time.perf_counter() - start
+        if cached is not None:
+            template_hits[templates.template(question)[0]] += 1
+            if fingerprint(cached) == fingerprint(sql):
+                same += 1
+            else:
+                different.append((question, cached, sql))
+        # Logged SQL was answered, so it counts as validated
+        templates.learn(question, sql)
+    
+    stats = templates.stats()
+    print(f"Questions: {len(entries)}, templates: {stats['templates']}")
+    print(f"Hits: {stats['hits']} ({stats['hit_rate']:.1%}), "
+          f"{same} with the logged SQL, {len(different)} with other SQL")
+    print(f"Lookup: {seconds / len(entries) * 1000:.3f} ms per question")
+    print("\nMost reused templates:")
+    for template, hits in template_hits.most_common(args.top):
+        print(f"  {hits:>5}  {template}")
+    if different:
+        print("\nHits whose SQL differs from the logged SQL:")
+        for question, cached, sql in different[:args.top]:
+            print(f"  Q:      {question}\n  cached: {cached}\n  logged: {' '.join(sql.split())}")
+
+
+if __name__ == "__main__":
+    main()
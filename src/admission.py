@@ -0,0 +1,199 @@
+# Cost-based admission control: EXPLAIN a query and decide whether and how it runs
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from config.settings import (
+    ADMISSION_POLICY, ADMISSION_THRESHOLDS, ADMISSION_ROW_CAP,
+    ADMISSION_HEAVY_SLOTS, ADMISSION_QUEUE_TIMEOUT
+)
+from src import sql_ast
+from src.database import QueryExecutionError
+
+# Plan operators that pair every row of one input with every row of the other
+PRODUCT_JOINS = {"CROSS_PRODUCT", "NESTED_LOOP_JOIN", "BLOCKWISE_NL_JOIN", "PIECEWISE_MERGE_JOIN", "IE_JOIN"}
+HASH_JOINS = {"HASH_JOIN", "DELIM_JOIN", "LEFT_DELIM_JOIN", "RIGHT_DELIM_JOIN"}
+LIMITS = {"LIMIT", "STREAMING_LIMIT", "LIMIT_PERCENT", "TOP_N"}
+SINGLE_ROW = {"UNGROUPED_AGGREGATE", "SIMPLE_AGGREGATE"}
+# Group counts are not estimated, and the estimates above them are input sizes
+GROUPING = {"HASH_GROUP_BY", "PERFECT_HASH_GROUP_BY", "PARTITIONED_AGGREGATE"}
+
+ACTIONS = ("allow", "cap", "queue", "reject")
+LIMIT_MODIFIERS = {"LIMIT_MODIFIER", "LIMIT_PERCENT_MODIFIER"}
+
+
+def top_level_limit(sql: str) -> tuple:
+    # (whether the outermost query has a LIMIT, its row bound or None). LIMITs in
+    # subqueries, CTEs or string literals do not bound the result. SQL that does not
+    # parse counts as limited, so it is never capped.
+    statements = sql_ast.parse_statements(sql)
+    if not statements or len(statements) != 1:
+        return True, None
+    limits = [m for m in statements[0].get("modifiers", []) if m["type"] in LIMIT_MODIFIERS]
+    if not limits:
+        return False, None
+    limit = limits[0]
+    try:
+        rows = sql_ast.constant_value(limit["limit"]) if limit.get("limit") is not None else None
+        offset = sql_ast.constant_value(limit["offset"]) if limit.get("offset") is not None else 0
+    except KeyError:
+        return True, None
+    if limit["type"] != "LIMIT_MODIFIER" or not isinstance(rows, int) or not isinstance(offset, int):
+        return True, None
+    return True, rows + offset
+
+
+class QueryRejectedError(QueryExecutionError):
+    # Raised when admission control refuses to run a query
+    
+    def __init__(self, message: str):
+        super().__init__(message, deterministic=True)
+
+
+class Admission:
+    # Outcome of reviewing one query plan
+    
+    def __init__(self, action: str, sql: str, reasons: list, estimated_rows: Optional[int]):
+        self.action = action
+        self.sql = sql
+        self.reasons = reasons
+        self.estimated_rows = estimated_rows
+    
+    def __repr__(self):
+        return f"Admission({self.action!r}, reasons={self.reasons}, estimated_rows={self.estimated_rows})"
+
+
+class PlanReview:
+    # Walks an EXPLAIN (FORMAT JSON) plan, estimating rows and collecting flags
+    
+    def __init__(self, plan: list, sql: str, thresholds: dict):
+        self.thresholds = thresholds
+        self.sql_limit = top_level_limit(sql)[1]
+        self.flags = {}
+        self.result_rows = self._rows(plan[0]) if plan else None
+        if self.result_rows is not None and self.result_rows > thresholds["huge_result"]:
+            self._flag("huge_result", f"~{self.result_rows:,} result rows")
+    
+    def _flag(self, name: str, reason: str) -> None:
+        self.flags.setdefault(name, reason)
+    
+    def _rows(self, node: dict) -> Optional[int]:
+        # Estimated output rows of node (None if unknown)
+        name = node["name"].strip()
+        info = node.get("extra_info") or {}
+        children = [self._rows(child) for child in node.get("children", [])]
+        known = [rows for rows in children if rows is not None]
+        
+        estimate = info.get("Estimated Cardinality") if isinstance(info, dict) else None
+        rows = int(estimate) if estimate is not None and str(estimate).isdigit() else None
+        
+        if name in PRODUCT_JOINS and len(known) == 2:
+            product = known[0] * known[1]
+            if product > self.thresholds["cross_product"]:
+                self._flag("cross_product", f"{name} over ~{product:,} row pairs")
+        if name in HASH_JOINS and rows is not None and rows > self.thresholds["huge_join"]:
+            self._flag("huge_join", f"{name} producing ~{rows:,} rows")
+        if name == "ORDER_BY" and known and max(known) > self.thresholds["unbounded_sort"]:
+            self._flag("unbounded_sort", f"ORDER BY without LIMIT over ~{max(known):,} rows")
+        
+        if name in SINGLE_ROW:
+            return 1
+        if name in GROUPING:
+            return None
+        if name in LIMITS:
+            # Cardinality estimates ignore LIMIT, so bound them here
+            top = info.get("Top") if isinstance(info, dict) else None
+            bound = int(top) + int(info.get("Offset", 0)) if top else self.sql_limit
+            return min([bound] + known) if bound is not None else min(known, default=None)
+        if name in PRODUCT_JOINS | HASH_JOINS:
+            return rows if rows is not None else max(known, default=None)
+        if node.get("children"):
+            # Filters and projections never add rows to what their inputs produce
+            return min(known + ([rows] if rows is not None else [])) if known else None
+        return rows
+
+
+class AdmissionController:
+    # Reviews prepared SQL before execution and applies the configured policy
+    
+    def __init__(
+        self,
+        db,
+        policy: Optional[dict] = None,
+        thresholds: Optional[dict] = None,
+        row_cap: int = ADMISSION_ROW_CAP,
+        heavy_slots: int = ADMISSION_HEAVY_SLOTS,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        cache_size: int = 512
+    ):
+        self.db = db
+        self.policy = dict(ADMISSION_POLICY, **(policy or {}))
+        self.thresholds = dict(ADMISSION_THRESHOLDS, **(thresholds or {}))
+        for flag, action in self.policy.items():
+            if action not in ACTIONS:
+                raise ValueError(f"Unknown admission action for {flag}: {action}")
+        self.row_cap = row_cap
+        self.queue_timeout = queue_timeout
+        self._heavy = threading.BoundedSemaphore(heavy_slots)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+    
+    def review(self, sql: str) -> Admission:
+        # Decide how sql may run; plans are reviewed once per data version
+        key = (self.db.data_version, sql)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        
+        admission = self._review(sql)
+        
+        with self._lock:
+            self._cache[key] = admission
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return admission
+    
+    def _review(self, sql: str) -> Admission:
+        review = PlanReview(self.db.explain(sql), sql, self.thresholds)
+        reasons = [f"{flag}: {reason}" for flag, reason in review.flags.items()]
+        
+        # The strictest action among the raised flags wins
+        actions = [self.policy.get(flag, "allow") for flag in review.flags] or ["allow"]
+        action = max(actions, key=ACTIONS.index)
+        
+        admitted_sql = sql
+        if action == "cap":
+            admitted_sql = self._cap(sql)
+            if admitted_sql == sql:
+                # Already limited somewhere - capping again would change nothing
+                action = "queue"
+        return Admission(action, admitted_sql, reasons, review.result_rows)
+    
+    def _cap(self, sql: str) -> str:
+        if top_level_limit(sql)[0]:
+            return sql
+        return sql.strip().rstrip(';').strip() + f" LIMIT {self.row_cap}"
+    
+    @contextmanager
+    def admitted(self, admission: Admission) -> Iterator[str]:
+        # Yield the SQL to run, holding a heavy-query slot for queued plans
+        if admission.action == "reject":
+            raise QueryRejectedError(f"Query rejected by admission control ({'; '.join(admission.reasons)})")
+        
+        if admission.action != "queue":
+            yield admission.sql
+            return
+        
+        if not self._heavy.acquire(timeout=self.queue_timeout):
+            # Deterministic: a retry would only queue for the same slot again
+            raise QueryExecutionError(
+                f"Query queued behind other expensive queries for over {self.queue_timeout:g}s",
+                deterministic=True
+            )
+        try:
+            yield admission.sql
+        finally:
+            self._heavy.release()
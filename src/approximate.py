@@ -0,0 +1,348 @@
+# Approximate answers: SUM/COUNT/AVG estimated from a stratified sample of the trade table
+
+import json
+import threading
+import duckdb
+from collections import OrderedDict
+from statistics import NormalDist
+from typing import Optional
+from config.settings import (
+    TABLE_NAME, APPROX_SAMPLE_FRACTION, APPROX_MIN_STRATUM_ROWS, APPROX_TAKE_ALL_QUANTILE, APPROX_CONFIDENCE
+)
+from src import sql_ast
+from src.rollups import AGGREGATES, MEASURES
+from src.schema import TRADE_COLUMNS
+
+SAMPLE_TABLE = "trade_sample"
+# Every (Year, Direction, Country) cell is sampled separately, so small countries are kept
+STRATA = ("Year", "Direction", "Country")
+# Rows are ranked within their stratum by a hash of these (hashing every column is slower)
+HASH_COLUMNS = ("Month", "HS_Code", "Value", "Quantity")
+
+# Aggregates with an unbiased scaled estimate and a variance formula
+ESTIMABLE = {"sum", "count", "count_star", "avg", "mean"}
+
+# Suffixes of the interval columns added after each estimated aggregate
+CI_SUFFIXES = ("_ci_low", "_ci_high")
+
+BASE_COLUMNS = {column.lower() for column in TRADE_COLUMNS}
+
+
+def build_sample(
+    conn: duckdb.DuckDBPyConnection,
+    fraction: float = APPROX_SAMPLE_FRACTION,
+    min_rows: int = APPROX_MIN_STRATUM_ROWS,
+    take_all_quantile: float = APPROX_TAKE_ALL_QUANTILE,
+    source: str = TABLE_NAME
+) -> dict:
+    # Keep ceil(fraction * rows) rows of every stratum (whole strata below min_rows),
+    # picked by a hash of the row so rebuilding the same data gives the same sample.
+    # Rows with any measure above its take_all_quantile are all kept, in strata of
+    # their own: trade values are heavy-tailed and a few shipments carry the totals.
+    # Each row carries its stratum's size and sample size for weighting.
+    columns = ", ".join(TRADE_COLUMNS)
+    cutoffs = conn.execute(f"""
+        SELECT {", ".join(f"quantile_cont({m}, {float(take_all_quantile)})" for m in MEASURES)} FROM {source}
+    """).fetchone()
+    take_all = " OR ".join(
+        f"{measure} > {cutoff!r}" for measure, cutoff in zip(MEASURES, cutoffs) if cutoff is not None
+    ) or "false"
+    strata = ", ".join(STRATA + ("take_all",))
+    conn.execute(f"""
+        CREATE OR REPLACE TABLE {SAMPLE_TABLE} AS
+        SELECT {columns}, take_all, stratum_rows, stratum_sampled
+        FROM (
+            SELECT *,
+                   CASE WHEN take_all THEN stratum_rows
+                        ELSE GREATEST(LEAST(stratum_rows, {int(min_rows)}), CEIL(stratum_rows * {float(fraction)}))
+                   END::BIGINT AS stratum_sampled
+            FROM (
+                SELECT *,
+                       row_number() OVER (PARTITION BY {strata} ORDER BY hash({", ".join(HASH_COLUMNS)})) AS stratum_rank,
+                       COUNT(*) OVER (PARTITION BY {strata}) AS stratum_rows
+                FROM (SELECT {columns}, COALESCE({take_all}, false) AS take_all FROM {source})
+            )
+        )
+        WHERE stratum_rank <= stratum_sampled
+    """)
+    sample_rows, strata_count, take_all_rows = conn.execute(f"""
+        SELECT COUNT(*), COUNT(DISTINCT ({strata})), COUNT(*) FILTER (WHERE take_all) FROM {SAMPLE_TABLE}
+    """).fetchone()
+    population_rows = conn.execute(f"SELECT COUNT(*) FROM {source}").fetchone()[0]
+    return {
+        "sample_rows": sample_rows,
+        "population_rows": population_rows,
+        "strata": strata_count,
+        "take_all_rows": take_all_rows,
+        "fraction": fraction,
+    }
+
+
+class NotApproximable(Exception):
+    # Query has no scaled estimate from the sample
+    pass
+
+
+def _shape(value):
+    # Expression tree without aliases and source positions, for comparisons
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in value.items() if k not in ("alias", "query_location")}
+    if isinstance(value, list):
+        return [_shape(v) for v in value]
+    return value
+
+
+def _same(a: dict, b: dict) -> bool:
+    return json.dumps(_shape(a), sort_keys=True) == json.dumps(_shape(b), sort_keys=True)
+
+
+def _is_aggregate(expr: dict) -> bool:
+    return expr.get("class") == "FUNCTION" and expr["function_name"].lower() in AGGREGATES
+
+
+def _has_aggregate(value) -> bool:
+    return any(_is_aggregate(e) for e in sql_ast.walk(value))
+
+
+def _expression_sql(expr: dict) -> str:
+    # SQL text of a single expression
+    node = sql_ast.parse_select("SELECT 1")
+    node["select_list"] = [dict(expr, alias="")]
+    return sql_ast.render(node)[len("SELECT "):]
+
+
+class Approximator:
+    # Rewrites aggregate queries over trade into estimates from the stratified sample
+    
+    def __init__(self, db, confidence: float = APPROX_CONFIDENCE, cache_size: int = 512):
+        self.db = db
+        self.confidence = confidence
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+    
+    def plan(self, sql: str) -> Optional[str]:
+        # Estimating SQL over the sample, or None if sql cannot be approximated.
+        # The result has sql's columns followed by <column>_ci_low/_ci_high
+        # for every output that is a bare SUM, COUNT or AVG.
+        self.db.sample()
+        with self._lock:
+            if sql in self._cache:
+                self._cache.move_to_end(sql)
+                return self._cache[sql]
+        
+        approx_sql = self._plan(sql)
+        
+        with self._lock:
+            self._cache[sql] = approx_sql
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return approx_sql
+    
+    def _plan(self, sql: str) -> Optional[str]:
+        node = sql_ast.parse_select(sql)
+        if node is None or not self._is_candidate(node):
+            return None
+        
+        cursor = self.db.cursor()
+        try:
+            names = [row[0] for row in cursor.execute(f"DESCRIBE {sql.rstrip().rstrip(';')}").fetchall()]
+            approx_sql = _Estimate(node, names, self.z).run()
+            approx_names = [row[0] for row in cursor.execute(f"DESCRIBE {approx_sql}").fetchall()]
+        except (NotApproximable, duckdb.Error):
+            return None
+        finally:
+            cursor.close()
+        
+        if approx_names[:len(names)] != names:
+            return None
+        return approx_sql
+    
+    @staticmethod
+    def _is_candidate(node: dict) -> bool:
+        from_table = node.get("from_table") or {}
+        return (
+            from_table.get("type") == "BASE_TABLE"
+            and from_table.get("table_name", "").lower() == TABLE_NAME
+            and not from_table.get("schema_name")
+            and not from_table.get("catalog_name")
+            and not from_table.get("sample")
+            and not node.get("cte_map", {}).get("map")
+            and node.get("sample") is None
+            and node.get("qualify") is None
+            and node.get("having") is None
+            and len(node.get("group_sets") or []) <= 1
+            and not any(m["type"] == "DISTINCT_MODIFIER" for m in node.get("modifiers", []))
+            and _has_aggregate(node["select_list"])
+        )
+
+
+class _Estimate:
+    # Builds the estimating query for one parsed SELECT. Per output group it sums
+    # weighted sample totals over the strata, with the stratified variance
+    #   Var = sum_h N_h^2 (1 - n_h/N_h) s_h^2 / n_h
+    # (AVG is a ratio of two totals, linearised).
+    
+    def __init__(self, node: dict, names: list, z: float):
+        self.node = node
+        self.names = names
+        self.z = z
+        self.keys = self._group_keys()
+        self.aggregates = []
+    
+    def _group_keys(self) -> list:
+        node = self.node
+        select_list = node["select_list"]
+        if node.get("aggregate_handling") == "FORCE_AGGREGATES":
+            keys = [item for item in select_list if not _has_aggregate(item)]
+        else:
+            keys = []
+            for expr in node.get("group_expressions", []):
+                if sql_ast.is_constant(expr):
+                    position = sql_ast.constant_value(expr)
+                    if not isinstance(position, int) or not 1 <= position <= len(select_list):
+                        raise NotApproximable()
+                    expr = select_list[position - 1]
+                keys.append(expr)
+        for key in keys:
+            if _has_aggregate(key) or any(e.get("class") in ("SUBQUERY", "WINDOW") for e in sql_ast.walk(key)):
+                raise NotApproximable()
+        return keys
+    
+    def run(self) -> str:
+        node = self.node
+        select_list = []
+        intervals = []
+        for item, name in zip(node["select_list"], self.names):
+            mapped = self._map(item)
+            mapped["alias"] = name
+            select_list.append(mapped)
+            if _is_aggregate(item):
+                intervals.append((self._aggregate_index(item), name))
+        
+        for index, name in intervals:
+            margin = f"{self.z!r} * sqrt(GREATEST(_v{index}, 0))"
+            for suffix, sign in zip(CI_SUFFIXES, "-+"):
+                bound = sql_ast.parse_expression(f"_e{index} {sign} {margin}")
+                bound["alias"] = name + suffix
+                select_list.append(bound)
+        
+        estimated = dict(node)
+        estimated["select_list"] = select_list
+        estimated["modifiers"] = [self._map(m) for m in node.get("modifiers", [])]
+        estimated["from_table"] = sql_ast.parse_select("SELECT * FROM estimates")["from_table"]
+        estimated["where_clause"] = None
+        estimated["group_expressions"] = []
+        estimated["group_sets"] = []
+        estimated["aggregate_handling"] = "STANDARD_HANDLING"
+        return f"WITH {self._cells()}, {self._totals()}, {self._estimates()} {sql_ast.render(estimated)}"
+    
+    def _map(self, value):
+        return sql_ast.transform(value, self._visit)
+    
+    def _visit(self, expr: dict) -> Optional[dict]:
+        for i, key in enumerate(self.keys):
+            if _same(expr, key):
+                return sql_ast.parse_expression(f"_g{i}")
+        expr_class = expr.get("class")
+        if expr_class in ("SUBQUERY", "WINDOW", "STAR", "COLUMNS"):
+            raise NotApproximable()
+        if _is_aggregate(expr):
+            return sql_ast.parse_expression(f"_e{self._aggregate_index(expr)}")
+        if expr_class == "COLUMN_REF" and sql_ast.column_name(expr).lower() in BASE_COLUMNS:
+            # A base column outside the grouping keys has no per-group value
+            raise NotApproximable()
+        return None
+    
+    def _aggregate_index(self, expr: dict) -> int:
+        for i, (_name, known) in enumerate(self.aggregates):
+            if _same(expr, known):
+                return i
+        
+        name = expr["function_name"].lower()
+        children = expr.get("children", [])
+        if (name not in ESTIMABLE or expr.get("distinct") or expr.get("filter") is not None
+                or expr.get("order_bys", {}).get("orders")):
+            raise NotApproximable()
+        if name != "count_star" and children:
+            if len(children) != 1 or _has_aggregate(children):
+                raise NotApproximable()
+            if any(e.get("class") in ("SUBQUERY", "WINDOW") for e in sql_ast.walk(children)):
+                raise NotApproximable()
+        if name == "count" and not children:
+            name = "count_star"
+        if name == "mean":
+            name = "avg"
+        self.aggregates.append((name, expr))
+        return len(self.aggregates) - 1
+    
+    def _cells(self) -> str:
+        # Per group and stratum: sample sums, sums of squares and counts
+        columns = [f"{_expression_sql(key)} AS _g{i}" for i, key in enumerate(self.keys)]
+        columns += ["FIRST(stratum_rows) AS _pop", "FIRST(stratum_sampled) AS _kept"]
+        for i, (name, expr) in enumerate(self.aggregates):
+            if name == "count_star":
+                columns.append(f"COUNT(*) AS _c{i}")
+                continue
+            argument = f"CAST({_expression_sql(expr['children'][0])} AS DOUBLE)"
+            if name in ("sum", "avg"):
+                columns.append(f"SUM({argument}) AS _s{i}, SUM({argument} * {argument}) AS _q{i}")
+            if name in ("count", "avg"):
+                columns.append(f"COUNT({argument}) AS _c{i}")
+        
+        where = self.node.get("where_clause")
+        where_sql = f"WHERE {_expression_sql(where)}" if where is not None else ""
+        group_by = [f"_g{i}" for i in range(len(self.keys))] + list(STRATA) + ["take_all"]
+        return f"""cells AS (
+            SELECT {", ".join(columns)}
+            FROM {SAMPLE_TABLE}
+            {where_sql}
+            GROUP BY {", ".join(group_by)}
+        )"""
+    
+    def _totals(self) -> str:
+        # Weighted totals and variance terms per group (_a is the per-stratum factor)
+        keys = [f"_g{i}" for i in range(len(self.keys))]
+        columns = list(keys)
+        for i, (name, _expr) in enumerate(self.aggregates):
+            if name == "sum":
+                columns.append(f"SUM(_pop / _kept * _s{i}) AS _e{i}, SUM(_a * (_q{i} - _s{i} * _s{i} / _kept)) AS _v{i}")
+            elif name in ("count", "count_star"):
+                columns.append(f"SUM(_pop / _kept * _c{i}) AS _e{i}, SUM(_a * (_c{i} - _c{i} * _c{i} / _kept)) AS _v{i}")
+            else:
+                columns.append(
+                    f"SUM(_pop / _kept * _s{i}) AS _y{i}, SUM(_pop / _kept * _c{i}) AS _x{i}, "
+                    f"SUM(_a * (_q{i} - _s{i} * _s{i} / _kept)) AS _vyy{i}, "
+                    f"SUM(_a * (_c{i} - _c{i} * _c{i} / _kept)) AS _vxx{i}, "
+                    f"SUM(_a * (_s{i} - _s{i} * _c{i} / _kept)) AS _vxy{i}"
+                )
+        group_by = f"GROUP BY {', '.join(keys)}" if keys else ""
+        return f"""totals AS (
+            SELECT {", ".join(columns)}
+            FROM (
+                SELECT *,
+                       CASE WHEN _kept > 1 THEN _pop * _pop * (1 - _kept / _pop) / _kept / (_kept - 1) ELSE 0 END AS _a
+                FROM cells
+            )
+            {group_by}
+        )"""
+    
+    def _estimates(self) -> str:
+        # Final estimate and variance per aggregate; counts are whole numbers
+        columns = [f"_g{i}" for i in range(len(self.keys))]
+        for i, (name, _expr) in enumerate(self.aggregates):
+            if name == "sum":
+                columns.append(f"_e{i}, _v{i}")
+            elif name in ("count", "count_star"):
+                columns.append(f"CAST(ROUND(COALESCE(_e{i}, 0)) AS BIGINT) AS _e{i}, COALESCE(_v{i}, 0) AS _v{i}")
+            else:
+                ratio = f"(_y{i} / NULLIF(_x{i}, 0))"
+                columns.append(
+                    f"{ratio} AS _e{i}, "
+                    f"(_vyy{i} + {ratio} * {ratio} * _vxx{i} - 2 * {ratio} * _vxy{i}) / (_x{i} * _x{i}) AS _v{i}"
+                )
+        return f"""estimates AS (
+            SELECT {", ".join(columns)}
+            FROM totals
+        )"""
@@ -0,0 +1,220 @@
+# Catalog of the literal values present in the trade data, for prompt grounding and
+# for spotting filters that cannot match before a query is run
+
+import difflib
+import json
+import os
+import re
+import duckdb
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+from config.settings import TABLE_NAME
+from src import sql_ast
+from src.snapshot import temp_path
+
+# Columns compared with = / IN against exact values
+VALUE_COLUMNS = ("Direction", "Country", "Unit", "Year", "Month", "HS2", "HS4", "Description")
+INTEGER_COLUMNS = {"year", "month", "hs2", "hs4"}
+
+# Filler words left out of the description terms shown in prompts
+STOP_WORDS = {"and", "or", "of", "the", "for", "with", "other", "its", "not", "in", "nes", "etc"}
+
+CATALOG_FORMAT = 1
+
+
+def _terms(descriptions: dict) -> Counter:
+    # Whitespace-separated words -> rows whose description contains them
+    terms = Counter()
+    for description, rows in descriptions.items():
+        for word in set(description.split()):
+            terms[word] += rows
+    return terms
+
+
+class ValueCatalog:
+    # Distinct values (with row counts) of the filterable columns, the (Year, Month)
+    # pairs present and the words of every Description. Lookups are set/dict hits.
+    
+    def __init__(self, values: dict, year_months: list, data_version: Optional[str] = None):
+        self.values = {column.lower(): dict(counts) for column, counts in values.items()}
+        self.year_months = {tuple(pair) for pair in year_months}
+        self.data_version = data_version
+        self.terms = _terms(self.values.get("description", {}))
+        self._fragments = None
+    
+    @classmethod
+    def build(cls, conn: duckdb.DuckDBPyConnection, data_version: Optional[str] = None,
+              table: str = TABLE_NAME) -> "ValueCatalog":
+        values = {}
+        for column in VALUE_COLUMNS:
+            rows = conn.execute(f"""
+                SELECT CAST({column} AS VARCHAR), COUNT(*) FROM {table}
+                WHERE {column} IS NOT NULL GROUP BY ALL
+            """).fetchall()
+            values[column] = {value: count for value, count in rows}
+        year_months = conn.execute(f"""
+            SELECT DISTINCT Year, Month FROM {table} WHERE Year IS NOT NULL AND Month IS NOT NULL
+        """).fetchall()
+        return cls(values, year_months, data_version)
+    
+    def to_dict(self) -> dict:
+        return {
+            "format": CATALOG_FORMAT,
+            "data_version": self.data_version,
+            "values": self.values,
+            "year_months": sorted(self.year_months),
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> "ValueCatalog":
+        return cls(data["values"], data["year_months"], data.get("data_version"))
+    
+    def save(self, path: Path) -> None:
+        # Write atomically beside the data it describes. Processes loading the same
+        # data each write their own temp file; the catalog is a cache, so failing to
+        # save (or losing the rename to another writer) only means building it again.
+        path = Path(path)
+        tmp_path = temp_path(path, '.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+    
+    @classmethod
+    def load(cls, path: Path, data_version: Optional[str] = None) -> Optional["ValueCatalog"]:
+        # Saved catalog, None if missing, unreadable or built from other data
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("format") != CATALOG_FORMAT or data.get("data_version") != data_version:
+            return None
+        return cls.from_dict(data)
+    
+    def known(self, column: str, value) -> bool:
+        # Whether column holds value in at least one row (unknown columns: True)
+        counts = self.values.get(column.lower())
+        if counts is None:
+            return True
+        return str(value) in counts
+    
+    def common(self, column: str, n: int = 20) -> list:
+        # Most frequent values of column
+        counts = self.values.get(column.lower(), {})
+        return sorted(counts, key=lambda value: (-counts[value], value))[:n]
+    
+    def top_terms(self, n: int = 40) -> list:
+        # (word, rows) for the most frequent description words
+        words = [(word, rows) for word, rows in self.terms.items()
+                 if word.isalpha() and len(word) > 2 and word not in STOP_WORDS]
+        return sorted(words, key=lambda item: (-item[1], item[0]))[:n]
+    
+    def _fragment_set(self) -> set:
+        # Every substring of every description word
+        if self._fragments is None:
+            self._fragments = {
+                word[i:j] for word in self.terms for i in range(len(word)) for j in range(i + 1, len(word) + 1)
+            }
+        return self._fragments
+    
+    def description_may_match(self, text: str) -> bool:
+        # False only if no description can contain text: a word of text that is
+        # not part of any description word cannot occur in any description
+        fragments = self._fragment_set()
+        return all(word in fragments for word in text.split())
+    
+    def check(self, sql: str) -> list:
+        # Filters in the WHERE clause of sql that no row satisfies, as messages.
+        # Only top-level AND terms are checked, so an empty list proves nothing.
+        node = sql_ast.parse_select(sql)
+        if node is None:
+            return []
+        from_table = node.get("from_table") or {}
+        if from_table.get("type") != "BASE_TABLE" or from_table.get("table_name", "").lower() != TABLE_NAME:
+            return []
+        
+        problems = []
+        equalities = {}
+        for term in sql_ast.conjuncts(node.get("where_clause")):
+            column, values = self._equality(term)
+            if column is not None:
+                missing = [value for value in values if not self.known(column, value)]
+                if len(missing) == len(values):
+                    problems.append(self._describe(column, missing))
+                if len(values) == 1:
+                    equalities[column.lower()] = values[0]
+                continue
+            text = self._like_text(term)
+            if text is not None and not self.description_may_match(text):
+                problems.append(f"no Description contains '{text}'")
+        
+        if not problems and "year" in equalities and "month" in equalities:
+            if (equalities["year"], equalities["month"]) not in self.year_months:
+                problems.append(f"no data for Year {equalities['year']} Month {equalities['month']}")
+        return problems
+    
+    def _describe(self, column: str, missing: list) -> str:
+        shown = ", ".join(repr(value) for value in missing)
+        close = []
+        if isinstance(missing[0], str):
+            # Case-insensitive, since a wrong case is the most common near miss
+            by_lower = {value.lower(): value for value in self.values.get(column.lower(), {})}
+            close = [by_lower[value] for value in difflib.get_close_matches(missing[0].lower(), list(by_lower), n=3)]
+        hint = f" (closest: {', '.join(close)})" if close else ""
+        return f"{column} {shown} not in the data{hint}"
+    
+    @staticmethod
+    def _constant(expr: dict):
+        try:
+            return sql_ast.constant_value(expr)
+        except KeyError:
+            return None
+    
+    def _typed(self, column: str, values: list) -> bool:
+        # Only compare constants of the column's own kind (leave casts to DuckDB)
+        integer = column.lower() in INTEGER_COLUMNS
+        return all(
+            isinstance(value, int) and not isinstance(value, bool) if integer else isinstance(value, str)
+            for value in values
+        )
+    
+    def _equality(self, term: dict) -> tuple:
+        # (column, constants) for column = constant and column IN (constants)
+        if term.get("class") == "COMPARISON" and term.get("type") == "COMPARE_EQUAL":
+            pairs = [(term["left"], term["right"]), (term["right"], term["left"])]
+        elif term.get("class") == "OPERATOR" and term.get("type") == "COMPARE_IN":
+            pairs = [(term["children"][0], None)]
+        else:
+            return None, []
+        
+        for column, constant in pairs:
+            name = sql_ast.column_name(column)
+            if name is None or name.lower() not in self.values:
+                continue
+            constants = [constant] if constant is not None else term["children"][1:]
+            if not all(sql_ast.is_constant(c) for c in constants):
+                continue
+            values = [self._constant(c) for c in constants]
+            if any(value is None for value in values) or not self._typed(name, values):
+                continue
+            return name, values
+        return None, []
+    
+    def _like_text(self, term: dict) -> Optional[str]:
+        # Literal text of Description LIKE '%text%' ('text%' and '%text' too)
+        if (term.get("class") != "FUNCTION" or term["function_name"] != "~~"
+                or len(term.get("children", [])) != 2):
+            return None
+        column, pattern = term["children"]
+        name = sql_ast.column_name(column)
+        pattern = self._constant(pattern) if sql_ast.is_constant(pattern) else None
+        if name is None or name.lower() != "description" or not isinstance(pattern, str):
+            return None
+        text = pattern.strip("%")
+        if not text or re.search(r"[%_\\]", text):
+            return None
+        return text
@@ -0,0 +1,96 @@
+# Bounded pool of DuckDB cursors over one loaded database
+
+import queue
+import threading
+import duckdb
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class PoolTimeoutError(Exception):
+    # Raised when no cursor frees up within the checkout timeout
+    pass
+
+
+class CursorPool:
+    # Hands out at most `size` cursors at a time; each is used by one thread until released
+    
+    def __init__(self, conn: duckdb.DuckDBPyConnection, size: int, checkout_timeout: float):
+        if size < 1:
+            raise ValueError("Cursor pool size must be at least 1")
+        self.conn = conn
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+    
+    def acquire(self, timeout: float = None) -> duckdb.DuckDBPyConnection:
+        # Check out a cursor, waiting up to timeout seconds for a free slot
+        timeout = self.checkout_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeoutError(f"No database cursor free after {timeout:g}s ({self.size} in use)")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        try:
+            with self._lock:
+                if self._closed:
+                    raise PoolTimeoutError("Cursor pool is closed")
+                cursor = self.conn.cursor()
+                self._created += 1
+            return cursor
+        except BaseException:
+            self._slots.release()
+            raise
+    
+    def release(self, cursor: duckdb.DuckDBPyConnection) -> None:
+        # Return a checked-out cursor to the pool
+        with self._lock:
+            closed = self._closed
+        if closed:
+            cursor.close()
+        else:
+            self._idle.put(cursor)
+        self._slots.release()
+    
+    @contextmanager
+    def checkout(self, timeout: float = None) -> Iterator[duckdb.DuckDBPyConnection]:
+        cursor = self.acquire(timeout)
+        try:
+            yield cursor
+        finally:
+            self.release(cursor)
+    
+    @contextmanager
+    def drained(self, timeout: float = None) -> Iterator[None]:
+        # Wait for every checked-out cursor to come back and hold new checkouts
+        # off until the block exits (for changes to the data underneath)
+        timeout = self.checkout_timeout if timeout is None else timeout
+        held = 0
+        try:
+            for _ in range(self.size):
+                if not self._slots.acquire(timeout=timeout):
+                    raise PoolTimeoutError(f"Queries still running after {timeout:g}s")
+                held += 1
+            yield
+        finally:
+            for _ in range(held):
+                self._slots.release()
+    
+    def stats(self) -> dict:
+        return {"size": self.size, "created": self._created, "idle": self._idle.qsize()}
+    
+    def close(self) -> None:
+        # Close idle cursors; cursors still checked out are closed on release
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
@@ -1,51 +1,474 @@
 # DuckDB database operations for trade data
 
+import json
+import threading
 import duckdb
 import pandas as pd
+import pyarrow as pa
 from pathlib import Path
-from typing import Optional
-from config.settings import DATA_CSV_PATH, DUCKDB_PATH, TABLE_NAME, MAX_QUERY_TIMEOUT
+from typing import Any, Callable, Iterator, Optional
+from config.settings import (
+    DATA_CSV_PATH, DUCKDB_PATH, TABLE_NAME, MAX_QUERY_TIMEOUT, QUERY_TIMEOUT_GRACE,
+    USE_SNAPSHOT, SNAPSHOT_PATH, USE_PARQUET, PARQUET_DIR, STREAM_BATCH_SIZE, PREVIEW_ROWS,
+    RESULT_CACHE_BYTES, CURSOR_POOL_SIZE, CURSOR_CHECKOUT_TIMEOUT, PROFILE_QUERIES, SLOW_QUERY_SECONDS,
+    SLOW_QUERY_LOG
+)
+from src.schema import create_trade_table
+from src.rollups import build_rollups
+from src.description_index import DescriptionIndex
+from src.result_cache import ResultCache, fingerprint
+from src.cursor_pool import CursorPool
+from src.profiling import SlowQueryLog
+from src.approximate import build_sample
+from src.catalog import ValueCatalog
+from src.snapshot import ensure_snapshot, file_checksum
+from src.parquet_store import attach_parquet, ensure_parquet
+from src.ingest import ingest_parquet_partition, ingest_partition, next_data_version, replace_partition
+
+# DuckDB errors that fail the same way on every run of the same SQL
+DETERMINISTIC_ERRORS = (
+    duckdb.ParserException,
+    duckdb.BinderException,
+    duckdb.CatalogException,
+    duckdb.ConversionException,
+    duckdb.InvalidInputException,
+    duckdb.NotImplementedException,
+    duckdb.SyntaxException,
+    duckdb.TypeMismatchException,
+)
+
+
+def arrow_to_pandas(table: pa.Table) -> pd.DataFrame:
+    # DuckDB ENUM columns arrive with unsigned dictionary indices, which pandas
+    # cannot convert; recast them to the ordered categoricals fetchdf() returns
+    fields = [
+        pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type, ordered=True))
+        if pa.types.is_dictionary(f.type) else f
+        for f in table.schema
+    ]
+    return table.cast(pa.schema(fields)).to_pandas()
+
+
+class QueryExecutionError(Exception):
+    # Raised when DuckDB rejects or fails a query
+    
+    def __init__(self, message: str, deterministic: bool = False):
+        super().__init__(message)
+        self.deterministic = deterministic
+
+
+class QueryTimeoutError(QueryExecutionError):
+    # Raised when a query runs past its wall-clock limit and is interrupted
+    
+    def __init__(self, timeout: float):
+        super().__init__(f"Query timeout: exceeded {timeout:g}s and was interrupted")
+        self.timeout = timeout
+
 
 class TradeDatabase:
     # Manages DuckDB connection and query execution for trade data
     
-    def __init__(self):
+    _shared = None
+    _shared_lock = threading.Lock()
+    
+    def __init__(
+        self,
+        csv_path: Optional[Path] = None,
+        use_snapshot: bool = USE_SNAPSHOT,
+        snapshot_path: Optional[Path] = None,
+        result_cache_bytes: int = RESULT_CACHE_BYTES,
+        pool_size: int = CURSOR_POOL_SIZE,
+        use_parquet: bool = USE_PARQUET,
+        parquet_dir: Optional[Path] = None,
+        profile_queries: bool = PROFILE_QUERIES
+    ):
+        self.csv_path = Path(csv_path) if csv_path else DATA_CSV_PATH
+        if snapshot_path:
+            self.snapshot_path = Path(snapshot_path)
+        elif csv_path:
+            self.snapshot_path = self.csv_path.with_suffix(".duckdb")
+        else:
+            self.snapshot_path = SNAPSHOT_PATH
+        self.use_snapshot = use_snapshot
+        if parquet_dir:
+            self.parquet_dir = Path(parquet_dir)
+        elif csv_path:
+            self.parquet_dir = self.csv_path.with_name(f"{self.csv_path.stem}_parquet")
+        else:
+            self.parquet_dir = PARQUET_DIR
+        self.use_parquet = use_parquet
         self.conn = duckdb.connect(DUCKDB_PATH)
         self.table_loaded = False
+        self.data_version = None
+        self._load_lock = threading.Lock()
+        self._description_index = None
+        self._sample = None
+        self._catalog = None
+        # Results are cached per data version; 0 bytes disables the cache
+        self.result_cache = ResultCache(result_cache_bytes) if result_cache_bytes else None
+        # Queries run on pooled cursors, at most pool_size at once
+        self.pool = CursorPool(self.conn, pool_size, CURSOR_CHECKOUT_TIMEOUT)
+        # Opt-in: profile every executed query and log the slow ones
+        self.slow_log = SlowQueryLog(SLOW_QUERY_LOG, SLOW_QUERY_SECONDS) if profile_queries else None
+    
+    @classmethod
+    def shared(cls) -> "TradeDatabase":
+        # Process-wide database, loaded once and reused by every query
+        with cls._shared_lock:
+            if cls._shared is None:
+                db = cls()
+                db.load_data()
+                cls._shared = db
+            return cls._shared
+    
+    @classmethod
+    def reset_shared(cls) -> None:
+        # Drop the process-wide database so the next shared() call reloads
+        with cls._shared_lock:
+            if cls._shared is not None:
+                cls._shared.close()
+                cls._shared = None
     
     def load_data(self) -> None:
-        # Load done_des.csv into DuckDB table
-        if self.table_loaded:
-            return
+        # Load trade data from the Parquet dataset, the snapshot or done_des.csv directly
+        with self._load_lock:
+            if self.table_loaded:
+                return
+            
+            if self.use_parquet:
+                self._attach_parquet()
+            elif self.use_snapshot:
+                self._attach_snapshot()
+            else:
+                self._load_csv()
+            
+            self._catalog = self._load_catalog()
+            self.table_loaded = True
+    
+    def _load_csv(self) -> None:
+        # Parse done_des.csv into an in-memory table with the declared schema
+        create_trade_table(self.conn, self.csv_path)
+        build_rollups(self.conn)
+        self.data_version = file_checksum(self.csv_path)
+    
+    def _attach_snapshot(self) -> None:
+        # Attach the persistent snapshot read-only and expose its tables (trade, rollups)
+        meta = ensure_snapshot(self.csv_path, self.snapshot_path)
+        self._expose_snapshot()
+        self.data_version = meta.get("data_version", meta["checksum"])
+    
+    def _attach_parquet(self) -> None:
+        # Read the Year/Direction-partitioned Parquet dataset in place (nothing is loaded)
+        meta = ensure_parquet(self.csv_path, self.parquet_dir)
+        attach_parquet(self.conn, self.parquet_dir)
+        self.data_version = meta.get("data_version", meta["checksum"])
+    
+    def _catalog_path(self) -> Optional[Path]:
+        # The catalog is saved beside the snapshot or dataset it describes
+        if self.use_parquet:
+            return self.parquet_dir / "catalog.json"
+        if self.use_snapshot:
+            return self.snapshot_path.with_suffix(".catalog.json")
+        return None
+    
+    def _load_catalog(self) -> ValueCatalog:
+        # Saved catalog for the current data version, else build (and save) one
+        path = self._catalog_path()
+        catalog = ValueCatalog.load(path, self.data_version) if path else None
+        if catalog is None:
+            catalog = ValueCatalog.build(self.conn, self.data_version)
+            if path:
+                catalog.save(path)
+        return catalog
+    
+    def _expose_snapshot(self) -> None:
+        # Attach the snapshot file and (re)create a view per table - views fix their
+        # column types when created, so they are replaced after a partition swap
+        self.conn.execute(f"ATTACH '{self.snapshot_path}' AS snapshot (READ_ONLY)")
+        tables = self.conn.execute("""
+            SELECT table_name FROM duckdb_tables()
+            WHERE database_name = 'snapshot' AND schema_name = 'main'
+        """).fetchall()
+        for (table,) in tables:
+            self.conn.execute(f"""
+                CREATE OR REPLACE VIEW {table} AS
+                SELECT * FROM snapshot.{table}
+            """)
+    
+    def replace_partition(self, csv_path: Path) -> dict:
+        # Swap in one (Year, Month) partition without reloading everything else (a
+        # Parquet dataset rewrites that month's Year directory). Running queries
+        # finish first and new ones wait until the swap is done.
+        self.load_data()
+        with self.pool.drained(), self._load_lock:
+            if self.use_parquet:
+                # The views read the files at query time, so they see the new ones
+                partition = ingest_parquet_partition(csv_path, self.parquet_dir)
+            elif self.use_snapshot:
+                # A new snapshot file replaces the attached one; attach that instead
+                partition = ingest_partition(csv_path, self.snapshot_path)
+                self.conn.execute("DETACH snapshot")
+                self._expose_snapshot()
+            else:
+                partition = replace_partition(self.conn, csv_path)
+            
+            previous_version = self.data_version
+            self.data_version = next_data_version(previous_version, partition)
+            
+            # Extend the description index with the new month instead of rebuilding it
+            index = self._description_index
+            if index is not None and index[0] == previous_version:
+                rows = self.conn.execute(f"""
+                    SELECT DISTINCT Description, lower(Description) FROM {TABLE_NAME}
+                    WHERE Year = ? AND Month = ? AND Description IS NOT NULL
+                """, [partition["year"], partition["month"]]).fetchall()
+                self._description_index = (
+                    self.data_version,
+                    index[1].extended([row[0] for row in rows], [row[1] for row in rows])
+                )
+            self._catalog = self._load_catalog()
+        return partition
+    
+    def description_index(self) -> DescriptionIndex:
+        # Substring index over distinct descriptions, rebuilt when the data version changes
+        self.load_data()
+        with self._load_lock:
+            index = self._description_index
+            if index is None or index[0] != self.data_version:
+                cursor = self.conn.cursor()
+                try:
+                    index = (self.data_version, DescriptionIndex.build(cursor))
+                finally:
+                    cursor.close()
+                self._description_index = index
+            return index[1]
+    
+    def catalog(self) -> ValueCatalog:
+        # Values present in the loaded data (built with it, rebuilt on partition swaps)
+        self.load_data()
+        return self._catalog
+    
+    def sample(self) -> dict:
+        # Stratified sample for approximate answers, rebuilt when the data version changes
+        self.load_data()
+        with self._load_lock:
+            sample = self._sample
+            if sample is None or sample[0] != self.data_version:
+                cursor = self.conn.cursor()
+                try:
+                    sample = (self.data_version, build_sample(cursor))
+                finally:
+                    cursor.close()
+                self._sample = sample
+            return sample[1]
+    
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        # Independent cursor over the loaded database (caller closes it)
+        self.load_data()
+        return self.conn.cursor()
+    
+    def execute_query(
+        self,
+        sql: str,
+        timeout: Optional[float] = MAX_QUERY_TIMEOUT,
+        question: Optional[str] = None
+    ) -> Optional[pd.DataFrame]:
+        # Execute SQL query on a fresh cursor and return DataFrame.
+        # question only labels the query in the slow-query log.
+        fetch = self._profiled(sql, lambda cursor: cursor.execute(sql).fetchdf(), question)
+        return self._cached(sql, lambda: self._supervised(fetch, timeout))
+    
+    def preview_query(
+        self,
+        sql: str,
+        max_rows: int = PREVIEW_ROWS,
+        timeout: Optional[float] = MAX_QUERY_TIMEOUT,
+        batch_size: int = STREAM_BATCH_SIZE,
+        question: Optional[str] = None
+    ) -> pd.DataFrame:
+        # First max_rows rows as a DataFrame, with the full row count in attrs["total_rows"].
+        # The rest of the result is streamed and counted, never materialised.
+        def preview(cursor):
+            reader = cursor.execute(sql).fetch_record_batch(batch_size)
+            head, total_rows = [], 0
+            for batch in reader:
+                if total_rows < max_rows:
+                    head.append(batch.slice(0, max_rows - total_rows))
+                total_rows += batch.num_rows
+            frame = arrow_to_pandas(pa.Table.from_batches(head, schema=reader.schema))
+            frame.attrs["total_rows"] = total_rows
+            return frame
+        
+        fetch = self._profiled(sql, preview, question)
+        return self._cached(sql, lambda: self._supervised(fetch, timeout), f"preview:{max_rows}:")
+    
+    def execute_page(
+        self,
+        sql: str,
+        params: Optional[list] = None,
+        timeout: Optional[float] = MAX_QUERY_TIMEOUT,
+        question: Optional[str] = None
+    ) -> pa.Table:
+        # Execute a parameterised page query (see src/paging.py) as Arrow; never cached
+        fetch = self._profiled(sql, lambda cursor: cursor.execute(sql, params).fetch_arrow_table(), question)
+        return self._supervised(fetch, timeout)
+    
+    def execute_over(
+        self,
+        shared_sql: str,
+        name: str,
+        sqls: list,
+        timeout: Optional[float] = MAX_QUERY_TIMEOUT
+    ) -> list:
+        # Materialise shared_sql once as temporary table name, then run each of sqls
+        # over it on the same cursor (one timeout for the lot). Not cached.
+        def run(cursor):
+            cursor.execute(f"CREATE OR REPLACE TEMP TABLE {name} AS {shared_sql}")
+            try:
+                return [cursor.execute(sql).fetchdf() for sql in sqls]
+            finally:
+                cursor.execute(f"DROP TABLE IF EXISTS {name}")
+        
+        return self._supervised(self._profiled(shared_sql, run, None), timeout)
+    
+    def _profiled(
+        self,
+        sql: str,
+        fn: Callable[[duckdb.DuckDBPyConnection], Any],
+        question: Optional[str]
+    ) -> Callable[[duckdb.DuckDBPyConnection], Any]:
+        # fn, run under the DuckDB profiler when profiling is switched on
+        if self.slow_log is None:
+            return fn
+        return lambda cursor: self.slow_log.run(self.conn, cursor, sql, fn, question)
+    
+    def _cached(self, sql: str, run: Callable[[], pd.DataFrame], kind: str = "") -> pd.DataFrame:
+        # Serve sql from the result cache, or run it and remember the result
+        if self.result_cache is None:
+            return run()
+        
+        self.load_data()
+        key = fingerprint(sql)
+        key = kind + key if key else None
+        # A partition swap while run() executes bumps the version; its result may
+        # predate the swap, so it is returned but not cached under either version
+        version = self.data_version
+        result = self.result_cache.get(key, version)
+        if result is None:
+            result = run()
+            if self.data_version == version:
+                self.result_cache.put(key, version, result)
+        return result
+    
+    def stream_query(
+        self,
+        sql: str,
+        batch_size: int = STREAM_BATCH_SIZE,
+        timeout: Optional[float] = MAX_QUERY_TIMEOUT
+    ) -> Iterator[pa.RecordBatch]:
+        # Yield the result as Arrow record batches of at most batch_size rows.
+        # Stop iterating (or close the generator) to abandon the rest of the query;
+        # the timeout covers the whole stream, including time spent by the consumer.
+        self.load_data()
+        cursor = self.pool.acquire()
+        watchdog = threading.Timer(timeout, cursor.interrupt) if timeout else None
+        if watchdog:
+            watchdog.daemon = True
+            watchdog.start()
+        try:
+            reader = self._wrapped(lambda: cursor.execute(sql).fetch_record_batch(batch_size))
+            while True:
+                try:
+                    batch = self._wrapped(reader.read_next_batch)
+                except StopIteration:
+                    return
+                yield batch
+        except QueryExecutionError as e:
+            if isinstance(e.__cause__, duckdb.InterruptException) and timeout:
+                raise QueryTimeoutError(timeout) from e.__cause__
+            raise
+        finally:
+            if watchdog:
+                watchdog.cancel()
+            self.pool.release(cursor)
+    
+    def _supervised(self, fn: Callable[[duckdb.DuckDBPyConnection], Any], timeout: Optional[float]) -> Any:
+        # Run fn on a fresh cursor. With a timeout it runs on a watchdog-supervised
+        # thread: at the deadline the cursor is interrupted and the caller gets
+        # QueryTimeoutError, even if DuckDB is slow to notice the interrupt
+        # (e.g. inside a cross join).
+        self.load_data()
+        cursor = self.pool.acquire()
+        if not timeout:
+            try:
+                return self._wrapped(lambda: fn(cursor))
+            finally:
+                self.pool.release(cursor)
+        
+        outcome = {}
         
-        csv_path = str(DATA_CSV_PATH)
+        def run():
+            try:
+                outcome["result"] = self._wrapped(lambda: fn(cursor))
+            except QueryExecutionError as e:
+                outcome["error"] = e
+            finally:
+                # A runaway query keeps its pool slot until it has unwound
+                self.pool.release(cursor)
         
-        self.conn.execute(f"""
-            CREATE TABLE {TABLE_NAME} AS 
-            SELECT * FROM read_csv_auto('{csv_path}')
-        """)
+        worker = threading.Thread(target=run, name="duckdb-query", daemon=True)
+        worker.start()
+        worker.join(timeout)
         
-        self.table_loaded = True
+        if worker.is_alive():
+            cursor.interrupt()
+            worker.join(QUERY_TIMEOUT_GRACE)
+            if worker.is_alive():
+                # Still unwinding - leave it to finish in the background
+                raise QueryTimeoutError(timeout)
+            error = outcome.get("error")
+            if error is not None and isinstance(error.__cause__, duckdb.InterruptException):
+                raise QueryTimeoutError(timeout) from error.__cause__
+        
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
     
-    def execute_query(self, sql: str, timeout: int = MAX_QUERY_TIMEOUT) -> Optional[pd.DataFrame]:
-        # Execute SQL query and return DataFrame
+    @staticmethod
+    def _wrapped(fn: Callable[[], Any]) -> Any:
+        # Call fn, turning DuckDB failures into QueryExecutionError
         try:
-            result = self.conn.execute(sql).fetchdf()
-            return result
+            return fn()
+        except StopIteration:
+            raise
         except Exception as e:
-            raise Exception(f"Query execution failed: {str(e)}")
+            raise QueryExecutionError(
+                f"Query execution failed: {str(e)}",
+                deterministic=isinstance(e, DETERMINISTIC_ERRORS)
+            ) from e
+    
+    def explain(self, sql: str) -> list:
+        # Physical plan of sql, parsed from EXPLAIN (FORMAT JSON)
+        self.load_data()
+        statement = sql.strip().rstrip(';')
+        with self.pool.checkout() as cursor:
+            rows = self._wrapped(lambda: cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}").fetchall())
+        return json.loads(rows[0][1])
     
     def get_row_count(self) -> int:
         # Get total number of rows in trade table
-        result = self.conn.execute(f"SELECT COUNT(*) as count FROM {TABLE_NAME}").fetchone()
+        with self.pool.checkout() as cursor:
+            result = cursor.execute(f"SELECT COUNT(*) as count FROM {TABLE_NAME}").fetchone()
         return result[0] if result else 0
     
     def get_schema(self) -> pd.DataFrame:
         # Return table schema information
-        return self.conn.execute(f"DESCRIBE {TABLE_NAME}").fetchdf()
+        with self.pool.checkout() as cursor:
+            return cursor.execute(f"DESCRIBE {TABLE_NAME}").fetchdf()
     
     def close(self) -> None:
         # Close database connection
+        self.pool.close()
         if self.conn:
             self.conn.close()
     
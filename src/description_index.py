@@ -0,0 +1,190 @@
+# Trigram index over the distinct Description values for '%term%' lookups
+
+import duckdb
+from collections import defaultdict
+from typing import Optional
+from config.settings import TABLE_NAME, DESCRIPTION_INDEX_MAX_MATCHES
+from src import sql_ast
+from src.rollups import reads_trade_table
+
+# LIKE / NOT LIKE / ILIKE / NOT ILIKE as they appear in DuckDB's syntax tree
+LIKE_FUNCTIONS = {
+    "~~": (False, False),
+    "!~~": (True, False),
+    "~~*": (False, True),
+    "!~~*": (True, True),
+}
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class DescriptionIndex:
+    # Maps substrings to the distinct Description values containing them
+    
+    def __init__(self, descriptions: list, lowered: Optional[list] = None):
+        # lowered[i] is DuckDB's lower() of descriptions[i] (Python's lower() if not given)
+        pairs = sorted(set(zip(descriptions, lowered or [d.lower() for d in descriptions])))
+        self.descriptions = [d for d, _ in pairs]
+        self.lowered = [low for _, low in pairs]
+        self.postings = defaultdict(set)
+        for i, text in enumerate(self.lowered):
+            for gram in _trigrams(text):
+                self.postings[gram].add(i)
+    
+    @classmethod
+    def build(cls, conn: duckdb.DuckDBPyConnection, table: str = TABLE_NAME) -> "DescriptionIndex":
+        rows = conn.execute(f"""
+            SELECT DISTINCT Description, lower(Description) FROM {table}
+            WHERE Description IS NOT NULL
+        """).fetchall()
+        return cls([row[0] for row in rows], [row[1] for row in rows])
+    
+    def extended(self, descriptions: list, lowered: list) -> "DescriptionIndex":
+        # New index that also covers descriptions. Values no longer in the table
+        # stay listed, which is harmless: an IN list entry matching no rows adds nothing.
+        return DescriptionIndex(self.descriptions + descriptions, self.lowered + lowered)
+    
+    def __len__(self) -> int:
+        return len(self.descriptions)
+    
+    def lookup(self, term: str, case_sensitive: bool = True) -> list:
+        # Every distinct Description containing term (sorted)
+        needle = term.lower()
+        grams = _trigrams(needle) if term.isascii() else set()
+        if grams:
+            postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+            candidates = sorted(set.intersection(*postings))
+        else:
+            # Terms shorter than a trigram check every value
+            candidates = range(len(self.descriptions))
+        
+        if case_sensitive:
+            return [self.descriptions[i] for i in candidates if term in self.descriptions[i]]
+        return [self.descriptions[i] for i in candidates if needle in self.lowered[i]]
+
+
+def _substring_term(pattern) -> Optional[str]:
+    # 'term' from a '%term%' pattern with no other wildcards
+    if not isinstance(pattern, str) or len(pattern) < 2:
+        return None
+    if not (pattern.startswith("%") and pattern.endswith("%")):
+        return None
+    term = pattern[1:-1]
+    if any(ch in "%_\\" for ch in term):
+        return None
+    return term
+
+
+def _is_description(expr: dict, alias: str) -> bool:
+    # Description of the scanned trade table, unqualified or qualified by its alias
+    if expr.get("class") != "COLUMN_REF":
+        return False
+    names = [name.lower() for name in expr["column_names"]]
+    return names[-1] == "description" and names[:-1] in ([], [alias])
+
+
+def _description_operand(expr: dict, alias: str) -> Optional[bool]:
+    # True for Description, False for lower(Description), None for anything else
+    if _is_description(expr, alias):
+        return True
+    if (expr.get("class") == "FUNCTION" and expr["function_name"].lower() == "lower"
+            and len(expr.get("children", [])) == 1
+            and _is_description(expr["children"][0], alias)):
+        return False
+    return None
+
+
+def _defines_trade(value) -> bool:
+    # Whether any WITH clause in the tree names a CTE after the trade table
+    if isinstance(value, dict):
+        ctes = value.get("cte_map", {}).get("map", []) if isinstance(value.get("cte_map"), dict) else []
+        if any(entry["key"].lower() == TABLE_NAME for entry in ctes):
+            return True
+        return any(_defines_trade(child) for child in value.values())
+    if isinstance(value, list):
+        return any(_defines_trade(child) for child in value)
+    return False
+
+
+def _string_list(values: list) -> str:
+    return ", ".join("'" + value.replace("'", "''") + "'" for value in values)
+
+
+class DescriptionRewriter:
+    # Replaces Description LIKE '%term%' in WHERE clauses with an exact IN list
+    
+    def __init__(self, index: DescriptionIndex, max_matches: int = DESCRIPTION_INDEX_MAX_MATCHES):
+        self.index = index
+        self.max_matches = max_matches
+    
+    def rewrite(self, sql: str) -> str:
+        # Return sql with indexable LIKE predicates replaced, or sql unchanged
+        node = sql_ast.parse_select(sql)
+        if node is None or _defines_trade(node):
+            return sql
+        
+        replaced = []
+        rewritten = self._rewrite_where(node, replaced)
+        if not replaced:
+            return sql
+        return sql_ast.render(rewritten)
+    
+    def _rewrite_where(self, value, replaced: list):
+        # Only WHERE clauses of a direct trade scan: select-list aliases, derived
+        # tables and joins could all give Description another meaning there
+        if isinstance(value, dict):
+            result = {}
+            for key, child in value.items():
+                if key == "where_clause" and child is not None and reads_trade_table(value):
+                    alias = (value["from_table"].get("alias") or TABLE_NAME).lower()
+                    result[key] = self._rewrite_condition(child, alias, replaced)
+                else:
+                    result[key] = self._rewrite_where(child, replaced)
+            return result
+        if isinstance(value, list):
+            return [self._rewrite_where(child, replaced) for child in value]
+        return value
+    
+    def _rewrite_condition(self, condition: dict, alias: str, replaced: list) -> dict:
+        def visit(expr):
+            if expr.get("class") == "SUBQUERY":
+                # A subquery's WHERE is checked against its own FROM
+                return self._rewrite_where(expr, replaced)
+            replacement = self._replacement(expr, alias)
+            if replacement is not None:
+                replaced.append(expr)
+            return replacement
+        
+        return sql_ast.transform(condition, visit)
+    
+    def _replacement(self, expr: dict, alias: str) -> Optional[dict]:
+        if expr.get("class") != "FUNCTION" or expr["function_name"] not in LIKE_FUNCTIONS:
+            return None
+        children = expr.get("children", [])
+        if len(children) != 2 or not sql_ast.is_constant(children[1]):
+            return None
+        
+        negated, insensitive = LIKE_FUNCTIONS[expr["function_name"]]
+        operand = _description_operand(children[0], alias)
+        term = _substring_term(sql_ast.constant_value(children[1]))
+        if operand is None or term is None:
+            return None
+        if not operand or insensitive:
+            # Case-insensitive paths rely on Python lowering agreeing with DuckDB's
+            if not term.isascii() or (not operand and term != term.lower()):
+                return None
+        
+        case_sensitive = operand and not insensitive
+        matches = self.index.lookup(term, case_sensitive=case_sensitive)
+        if len(matches) > self.max_matches:
+            return None
+        
+        if not matches:
+            # NULL for NULL descriptions, like LIKE itself
+            return sql_ast.parse_expression(
+                "Description = Description" if negated else "Description <> Description"
+            )
+        op = "NOT IN" if negated else "IN"
+        return sql_ast.parse_expression(f"Description {op} ({_string_list(matches)})")
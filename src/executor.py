@@ -3,34 +3,98 @@ SQL query executor with intelligent error recovery.
 
 Features:
 - Pre-execution validation
-- Safe DuckDB execution
+- Safe DuckDB execution on a shared, load-once database
 - Automatic regeneration on failure
-- Timeout handling with LIMIT injection
+- Fail-fast on deterministic errors (no identical re-runs)
+- Rule-based rewrites of wasteful generated SQL (random sampling, tautologies, HAVING)
+- Cost-based admission control (EXPLAIN, then allow / cap / queue / reject)
+- Rollup routing for aggregate queries
+- Optional approximate answers from a stratified sample, with confidence intervals
+- Filters on values absent from the data caught from the value catalog (no query run)
+- Batches of aggregate queries fused into shared scans (execute_many)
+- Keyset-paginated large results behind expiring page tokens (execute_paged)
+- Description substring lookups served from an index
+- Per-query-class wall-clock timeouts with interruption and LIMIT injection
 - Comprehensive failure logging
-- Result capture as DataFrame
+- Result capture as DataFrame (or a streamed, bounded preview)
 """
 
+import duckdb
 import pandas as pd
 import json
+import re
 from pathlib import Path
 from datetime import datetime
 from typing import Tuple, Optional, Callable
 
-from src.database import TradeDatabase
+from config.settings import (
+    REWRITE_SQL, ROUTE_ROLLUPS, USE_DESCRIPTION_INDEX, QUERY_TIMEOUTS, ADMISSION_CONTROL,
+    APPROXIMATE_ANSWERS, CHECK_LITERALS, FUSE_BATCH_QUERIES, FUSION_MAX_QUERIES
+)
+from src.admission import AdmissionController, QueryRejectedError
+from src.approximate import Approximator
+from src.database import TradeDatabase, QueryExecutionError, QueryTimeoutError
+from src.paging import ResultPager
+from src.description_index import DescriptionRewriter
+from src.query_fusion import BATCH_TABLE, QueryFuser
+from src.rollups import RollupRouter
+from src.sql_rewrite import SQLRewriter
 from src.validators import SQLValidator
 
 
 class QueryExecutor:
     """Execute SQL queries with intelligent error recovery."""
     
-    def __init__(self, max_retries: int = 2, log_failures: bool = True):
+    def __init__(
+        self,
+        max_retries: int = 2,
+        log_failures: bool = True,
+        db: Optional[TradeDatabase] = None,
+        rewrite_sql: bool = REWRITE_SQL,
+        route_rollups: bool = ROUTE_ROLLUPS,
+        use_description_index: bool = USE_DESCRIPTION_INDEX,
+        admission: Optional[AdmissionController] = None,
+        admission_control: bool = ADMISSION_CONTROL,
+        approximate: bool = APPROXIMATE_ANSWERS,
+        check_literals: bool = CHECK_LITERALS,
+        fuse_queries: bool = FUSE_BATCH_QUERIES,
+        pager: Optional[ResultPager] = None
+    ):
         """
         Initialize executor.
         
         Args:
             max_retries: Maximum retry attempts
             log_failures: Whether to log failures to file
+            db: Database to query (defaults to the process-wide shared one)
+            rewrite_sql: Apply the REWRITE_RULES rewrites before anything else
+            route_rollups: Answer aggregates from rollup tables when equivalent
+            use_description_index: Rewrite Description LIKE '%term%' to exact IN lists
+            admission: Admission controller (defaults to one with the configured policy)
+            admission_control: Review query plans before running them
+            approximate: Estimate SUM/COUNT/AVG queries from the stratified sample
+                (execute() can override this per call)
+            check_literals: Look up filter values in the value catalog and answer
+                "no data" without running queries that cannot match
+            fuse_queries: Let execute_many() answer compatible aggregate queries
+                from one shared scan
+            pager: Page cursors for execute_paged() (defaults to one over db;
+                share it between executors so their tokens are interchangeable)
         """
+        self._db = db
+        self._rewriter = None
+        self._router = None
+        self.rewrite_sql = rewrite_sql
+        self.route_rollups = route_rollups
+        self.use_description_index = use_description_index
+        self._admission = admission
+        self.admission_control = admission_control
+        self.approximate = approximate
+        self._approximator = None
+        self.check_literals = check_literals
+        self.fuse_queries = fuse_queries
+        self._fuser = None
+        self._pager = pager
         self.validator = SQLValidator()
         self.max_retries = max_retries
         self.log_failures = log_failures
@@ -39,11 +103,148 @@ class QueryExecutor:
         if self.log_failures:
             self.log_file.parent.mkdir(exist_ok=True)
     
+    @property
+    def db(self) -> TradeDatabase:
+        """Database used for execution, loaded once per process."""
+        if self._db is None:
+            self._db = TradeDatabase.shared()
+        return self._db
+    
+    @property
+    def admission(self) -> AdmissionController:
+        """Admission controller for this executor's database."""
+        if self._admission is None:
+            self._admission = AdmissionController(self.db)
+        return self._admission
+    
+    @property
+    def pager(self) -> ResultPager:
+        """Open page cursors for this executor's database."""
+        if self._pager is None:
+            self._pager = ResultPager(self.db)
+        return self._pager
+    
+    def _prepare(self, sql: str) -> str:
+        """
+        Rewrite validated SQL into the cheapest equivalent form.
+        
+        Args:
+            sql: Validated SQL
+        
+        Returns:
+            SQL to hand to the database
+        """
+        if self.rewrite_sql:
+            if self._rewriter is None:
+                self._rewriter = SQLRewriter(self.db)
+            sql = self._rewriter.rewrite(sql)
+        
+        if self.route_rollups:
+            if self._router is None:
+                self._router = RollupRouter(self.db)
+            routed_sql = self._router.route(sql)
+            if routed_sql != sql:
+                return routed_sql
+        
+        if self.use_description_index:
+            return DescriptionRewriter(self.db.description_index()).rewrite(sql)
+        return sql
+    
+    def _query_class(self, sql: str) -> str:
+        """
+        Classify prepared SQL for its timeout.
+        
+        Args:
+            sql: SQL about to be executed
+        
+        Returns:
+            Key into QUERY_TIMEOUTS
+        """
+        if re.search(r'\btrade_rollup_', sql, re.IGNORECASE):
+            return "rollup"
+        if re.search(r'\b(SUM|COUNT|COUNT_STAR|AVG|MIN|MAX)\s*\(|\bGROUP\s+BY\b', sql, re.IGNORECASE):
+            return "aggregate"
+        return "rows"
+    
+    def _run(
+        self,
+        sql: str,
+        max_rows: Optional[int] = None,
+        question: Optional[str] = None,
+        approximate: bool = False
+    ) -> pd.DataFrame:
+        """Prepare SQL and execute it under its query-class timeout."""
+        prepared = self._prepare(sql)
+        if approximate and self._query_class(prepared) != "rollup":
+            # Rollup answers are exact and already cheap
+            result = self._run_approximate(prepared, max_rows, question)
+            if result is not None:
+                return result
+        
+        if not self.admission_control:
+            return self._fetch(prepared, max_rows, question)
+        
+        admission = self.admission.review(prepared)
+        with self.admission.admitted(admission) as admitted_sql:
+            result = self._fetch(admitted_sql, max_rows, question)
+        if admission.action == "cap":
+            result.attrs["capped_at"] = self.admission.row_cap
+        return result
+    
+    def _run_approximate(self, sql: str, max_rows: Optional[int], question: Optional[str]) -> Optional[pd.DataFrame]:
+        """
+        Estimate the result of prepared SQL from the stratified sample.
+        
+        Args:
+            sql: Prepared SQL
+            max_rows: Row limit for a preview result
+            question: Original question
+        
+        Returns:
+            Estimates with confidence interval columns, or None if SQL has no estimate
+        """
+        if self._approximator is None:
+            self._approximator = Approximator(self.db)
+        approx_sql = self._approximator.plan(sql)
+        if approx_sql is None:
+            return None
+        
+        result = self._fetch(approx_sql, max_rows, question)
+        result.attrs["approximate"] = {
+            "confidence": self._approximator.confidence,
+            **self.db.sample(),
+        }
+        return result
+    
+    def _fetch(self, sql: str, max_rows: Optional[int], question: Optional[str] = None) -> pd.DataFrame:
+        """Execute SQL under its query-class timeout."""
+        timeout = QUERY_TIMEOUTS[self._query_class(sql)]
+        if max_rows is not None:
+            return self.db.preview_query(sql, max_rows=max_rows, timeout=timeout, question=question)
+        return self.db.execute_query(sql, timeout=timeout, question=question)
+    
+    @staticmethod
+    def _describe_rows(result: pd.DataFrame) -> str:
+        rows = f"{result.attrs.get('total_rows', len(result))} rows"
+        if "capped_at" in result.attrs:
+            rows += f", capped at {result.attrs['capped_at']}"
+        if "approximate" in result.attrs:
+            rows += f", approximate ({result.attrs['approximate']['confidence']:.0%} confidence intervals)"
+        return rows
+    
+    def _unmatched_literals(self, sql: str) -> list:
+        """Filters in sql on values the data does not contain (empty if unchecked)."""
+        if not self.check_literals:
+            return []
+        return self.db.catalog().check(sql)
+    
     def execute(
         self,
         sql: str,
         question: str = "",
-        regenerate_fn: Optional[Callable[[str], str]] = None
+        regenerate_fn: Optional[Callable[[str, str], str]] = None,
+        max_rows: Optional[int] = None,
+        approximate: Optional[bool] = None
     ) -> Tuple[bool, Optional[pd.DataFrame], str]:
         """
         Execute SQL with full error recovery pipeline.
@@ -51,57 +252,225 @@ class QueryExecutor:
         Args:
             sql: SQL query to execute
             question: Original question (for regeneration)
-            regenerate_fn: Function to regenerate SQL on failure
-            
+            regenerate_fn: Function to regenerate SQL on failure, called with
+                the question and the validation or execution error
+            max_rows: Only materialise this many rows; the rest are streamed
+                and counted into result.attrs["total_rows"]
+            approximate: Estimate from the stratified sample (None uses the
+                executor default, False forces exact execution). Estimated
+                results carry result.attrs["approximate"] and <column>_ci_low /
+                <column>_ci_high columns; other queries run exactly.
+        
         Returns:
             (success, dataframe, message)
         """
+        if approximate is None:
+            approximate = self.approximate
+        
         # Validate
         is_valid, error_msg = self.validator.validate(sql)
         if not is_valid:
             if regenerate_fn and question:
-                return self._try_regenerate(question, regenerate_fn, f"Validation error: {error_msg}")
+                return self._try_regenerate(
+                    question, regenerate_fn, f"Validation error: {error_msg}", max_rows, approximate
+                )
             return False, None, f"Validation failed: {error_msg}"
         
         # Extract clean SQL
         clean_sql = self.validator.extract_sql(sql)
         
+        # Filters on values that are not in the data - nothing to run
+        problems = self._unmatched_literals(clean_sql)
+        if problems:
+            reason = "; ".join(problems)
+            if regenerate_fn and question:
+                return self._try_regenerate(
+                    question, regenerate_fn, f"No rows can match: {reason}", max_rows, approximate
+                )
+            return True, pd.DataFrame(), f"No data found ({reason})"
+        
         # Execute with retry
         for attempt in range(self.max_retries + 1):
             try:
-                with TradeDatabase() as db:
-                    result = db.execute_query(clean_sql)
-                    
-                    if result.empty:
-                        return True, result, "No data found"
-                    
-                    return True, result, f"Success: {len(result)} rows"
-                    
+                result = self._run(clean_sql, max_rows, question, approximate)
+                
+                if result.empty:
+                    return True, result, "No data found"
+                
+                return True, result, f"Success: {self._describe_rows(result)}"
+            
             except Exception as e:
                 error_str = str(e)
+                deterministic = isinstance(e, QueryExecutionError) and e.deterministic
                 
-                # Timeout - add LIMIT
-                if "timeout" in error_str.lower() and attempt < self.max_retries:
-                    clean_sql = self._add_limit(clean_sql, 1000)
-                    continue
+                # Timeout - add LIMIT (an already-limited query would just time out again)
+                timed_out = isinstance(e, QueryTimeoutError) or "timeout" in error_str.lower()
+                if timed_out and attempt < self.max_retries:
+                    limited_sql = self._add_limit(clean_sql, 1000)
+                    if limited_sql != clean_sql:
+                        clean_sql = limited_sql
+                        continue
+                    deterministic = True
                 
-                # Syntax error - try regenerate
-                if ("syntax error" in error_str.lower() or "parser error" in error_str.lower()):
+                # Syntax error or rejected plan - try regenerate
+                if (isinstance(e, QueryRejectedError)
+                        or "syntax error" in error_str.lower() or "parser error" in error_str.lower()):
                     if regenerate_fn and question and attempt == 0:
-                        return self._try_regenerate(question, regenerate_fn, error_str)
+                        return self._try_regenerate(question, regenerate_fn, error_str, max_rows, approximate)
                 
-                # Final failure
-                if attempt == self.max_retries:
+                # Final failure - deterministic errors would fail identically on re-run
+                if deterministic or attempt == self.max_retries:
                     self._log_failure(question, clean_sql, error_str)
                     return False, None, f"Execution failed: {error_str}"
         
         return False, None, "Unknown error"
     
+    def execute_many(
+        self,
+        sqls: list,
+        max_rows: Optional[int] = None,
+        approximate: Optional[bool] = None
+    ) -> list:
+        """
+        Execute a batch of SQL queries, sharing scans where possible.
+        
+        Aggregate queries over trade are grouped into batches; each batch scans
+        trade once into a temporary rollup over every column its queries filter
+        or group on, and each query is rewritten to run over that rollup. All
+        other queries (and any batch whose shared scan fails) run through
+        execute().
+        
+        Args:
+            sqls: SQL queries
+            max_rows: Row limit for preview results (see execute)
+            approximate: Estimate from the stratified sample (see execute);
+                approximate batches are not fused
+        
+        Returns:
+            (success, dataframe, message) per query, in order
+        """
+        if approximate is None:
+            approximate = self.approximate
+        
+        results = [None] * len(sqls)
+        if self.fuse_queries and not approximate:
+            for batch in self._fusion_batches(sqls):
+                try:
+                    frames = self._run_fused(batch)
+                except (QueryExecutionError, duckdb.Error):
+                    continue
+                for index, frame in zip(batch.indexes, frames):
+                    if max_rows is not None:
+                        total_rows = len(frame)
+                        frame = frame.head(max_rows)
+                        frame.attrs["total_rows"] = total_rows
+                    message = f"Success: {self._describe_rows(frame)}" if not frame.empty else "No data found"
+                    results[index] = (True, frame, message)
+        
+        return [
+            result if result is not None else self.execute(sql, max_rows=max_rows, approximate=approximate)
+            for sql, result in zip(sqls, results)
+        ]
+    
+    def _fusion_batches(self, sqls: list) -> list:
+        """Batches of fusable queries among valid, possibly matching sqls."""
+        prepared = []
+        for index, sql in enumerate(sqls):
+            if not self.validator.validate(sql)[0]:
+                continue
+            clean_sql = self.validator.extract_sql(sql)
+            try:
+                if self._unmatched_literals(clean_sql):
+                    continue
+                prepared.append((index, self._prepare(clean_sql)))
+            except Exception:
+                # execute() reports the error for this query
+                continue
+        
+        if self._fuser is None:
+            self._fuser = QueryFuser(self.db, FUSION_MAX_QUERIES)
+        return self._fuser.plan(prepared)
+    
+    def _run_fused(self, batch) -> list:
+        """Run a batch's shared scan and each member query over its result."""
+        return self.db.execute_over(
+            batch.shared_sql(), BATCH_TABLE, batch.member_sqls, QUERY_TIMEOUTS["aggregate"]
+        )
+    
+    def execute_paged(
+        self,
+        sql: str,
+        question: str = "",
+        page_size: Optional[int] = None
+    ) -> Tuple[bool, Optional[pd.DataFrame], str]:
+        """
+        Execute SQL and return its first page, keeping a cursor for the rest.
+        
+        Unlike execute(), nothing caps the result: the query is re-run per
+        page from where the previous page ended (keyset pagination on its
+        ORDER BY plus every output column), so only one page is held in
+        memory. Plans are not reviewed by admission control for the same
+        reason.
+        
+        Args:
+            sql: SQL query to execute
+            question: Original question (for the slow-query log)
+            page_size: Rows per page (defaults to PAGE_SIZE)
+        
+        Returns:
+            (success, first page, message); the page's attrs["next_page"] is the
+            token for next_page(), or None when this page is the last
+        """
+        is_valid, error_msg = self.validator.validate(sql)
+        if not is_valid:
+            return False, None, f"Validation failed: {error_msg}"
+        clean_sql = self.validator.extract_sql(sql)
+        
+        problems = self._unmatched_literals(clean_sql)
+        if problems:
+            return True, pd.DataFrame(), f"No data found ({'; '.join(problems)})"
+        
+        try:
+            prepared = self._prepare(clean_sql)
+            page = self.pager.open(
+                prepared, page_size, timeout=QUERY_TIMEOUTS[self._query_class(prepared)], question=question
+            )
+        except Exception as e:
+            self._log_failure(question, clean_sql, str(e))
+            return False, None, f"Execution failed: {e}"
+        return True, page, self._describe_page(page)
+    
+    def next_page(self, token: str) -> Tuple[bool, Optional[pd.DataFrame], str]:
+        """
+        Fetch the page after the one that returned token.
+        
+        Args:
+            token: attrs["next_page"] of the previous page
+        
+        Returns:
+            (success, page, message); fails once the cursor has expired or the
+            data has changed since the first page
+        """
+        try:
+            page = self.pager.next_page(token)
+        except QueryExecutionError as e:
+            return False, None, f"Execution failed: {e}"
+        return True, page, self._describe_page(page)
+    
+    @staticmethod
+    def _describe_page(page: pd.DataFrame) -> str:
+        if page.empty and page.attrs["page"] == 1:
+            return "No data found"
+        more = "more rows follow" if page.attrs["next_page"] else "last page"
+        return f"Success: page {page.attrs['page']}, {len(page)} rows ({more})"
+    
     def _try_regenerate(
         self,
         question: str,
-        regenerate_fn: Callable[[str], str],
-        original_error: str
+        regenerate_fn: Callable[[str, str], str],
+        original_error: str,
+        max_rows: Optional[int] = None,
+        approximate: bool = False
     ) -> Tuple[bool, Optional[pd.DataFrame], str]:
         """
         Attempt to regenerate SQL and execute.
@@ -110,14 +479,16 @@ class QueryExecutor:
             question: Original question
             regenerate_fn: Regeneration function
             original_error: Error from first attempt
-            
+            max_rows: Row limit for a preview result (see execute)
+            approximate: Estimate from the stratified sample (see execute)
+        
         Returns:
             (success, dataframe, message)
         """
         print(f"    → Regenerating SQL (reason: {original_error[:50]}...)")
         
         try:
-            new_sql = regenerate_fn(question)
+            new_sql = regenerate_fn(question, original_error)
             
             # Validate new SQL
             is_valid, error_msg = self.validator.validate(new_sql)
@@ -128,14 +499,17 @@ class QueryExecutor:
             # Execute new SQL (no regeneration on second attempt)
             clean_sql = self.validator.extract_sql(new_sql)
             
-            with TradeDatabase() as db:
-                result = db.execute_query(clean_sql)
-                
-                if result.empty:
-                    return True, result, "Regenerated: No data found"
-                
-                return True, result, f"Regenerated: Success ({len(result)} rows)"
-                
+            problems = self._unmatched_literals(clean_sql)
+            if problems:
+                return True, pd.DataFrame(), f"Regenerated: No data found ({'; '.join(problems)})"
+            
+            result = self._run(clean_sql, max_rows, question, approximate)
+            
+            if result.empty:
+                return True, result, "Regenerated: No data found"
+            
+            return True, result, f"Regenerated: Success ({self._describe_rows(result)})"
+        
         except Exception as e:
             error_str = str(e)
             self._log_failure(question, new_sql if 'new_sql' in locals() else "N/A", f"Regeneration failed: {error_str}")
@@ -148,7 +522,7 @@ class QueryExecutor:
         Args:
             sql: Original SQL
             limit: Row limit
-            
+        
         Returns:
             SQL with LIMIT
         """
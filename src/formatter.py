@@ -2,61 +2,97 @@
 
 import pandas as pd
 import math
+from typing import Optional
 from src.groq_client import GroqClient
 
 
 class ResponseFormatter:
     # Format query results into friendly natural language using Groq
     
-    def __init__(self):
-        self.groq = GroqClient()
+    def __init__(self, groq: Optional[GroqClient] = None):
+        self.groq = groq or GroqClient()
     
     def format_result(self, question: str, sql: str, result: pd.DataFrame) -> str:
         # Format query result into friendly natural language
-        
+        answer = self._direct_answer(result)
+        if answer is not None:
+            return answer
+        response = self.groq.generate(self._prompt(question, result), temperature=0.1, max_tokens=300)
+        return self._label(result, response.strip())
+    
+    async def aformat_result(self, question: str, sql: str, result: pd.DataFrame) -> str:
+        # format_result() without blocking the event loop
+        answer = self._direct_answer(result)
+        if answer is not None:
+            return answer
+        response = await self.groq.agenerate(self._prompt(question, result), temperature=0.1, max_tokens=300)
+        return self._label(result, response.strip())
+    
+    @staticmethod
+    def _direct_answer(result: pd.DataFrame) -> Optional[str]:
+        # Fixed reply for results with nothing to describe (no Groq call needed)
         # Handle empty results
         if result is None or result.empty:
             return "I couldn't find any data matching your query. Please try different filters."
         
         # Check for NaN single value
-        if len(result) == 1 and len(result.columns) == 1:
+        if result.attrs.get("total_rows", len(result)) == 1 and len(result.columns) == 1:
             value = result.iloc[0, 0]
             if pd.isna(value) or (isinstance(value, float) and math.isnan(value)):
                 return "No data found for this query."
-        
+        return None
+    
+    @staticmethod
+    def _label(result: pd.DataFrame, answer: str) -> str:
+        # Answers built from estimates say so, whatever the model wrote
+        approximate = result.attrs.get("approximate")
+        if approximate is None:
+            return answer
+        return f"Approximate ({approximate['confidence']:.0%} confidence, estimated from a sample): {answer}"
+    
+    def _prompt(self, question: str, result: pd.DataFrame) -> str:
         # Format data for prompt
         data_str = self._format_data(result)
+        source = "Here is the actual data from the database:"
+        estimates = ""
+        approximate = result.attrs.get("approximate")
+        if approximate is not None:
+            source = "Here are ESTIMATES computed from a sample of the database:"
+            estimates = (
+                "\n- Say these figures are estimates, and give the range from the <column>_ci_low "
+                f"and <column>_ci_high values ({approximate['confidence']:.0%} confidence interval)"
+            )
         
-        # Use Groq to generate friendly response
+        # Groq turns this into the friendly response
         prompt = f"""You are answering questions about Nepal trade data.
 
 Question: {question}
 
-Here is the actual data from the database:
+{source}
 {data_str}
 
 Instructions:
 - Use ONLY the exact numbers shown above
 - Format currency as Rs with commas
 - Answer the question directly and completely
-- Be friendly and conversational
+- Be friendly and conversational{estimates}
 
 Your answer:"""
-        
-        response = self.groq.generate(prompt, temperature=0.1, max_tokens=300)
-        return response.strip()
+        return prompt
     
     def _format_data(self, result: pd.DataFrame) -> str:
         # Format DataFrame into readable string
+        # (a streamed preview carries the full row count in attrs["total_rows"])
+        total_rows = result.attrs.get("total_rows", len(result))
         
-        if len(result) == 1 and len(result.columns) == 1:
+        if total_rows == 1 and len(result.columns) == 1:
             # Single value
             value = result.iloc[0, 0]
             if isinstance(value, (int, float)) and not pd.isna(value):
                 return f"Result: Rs {int(value):,}"
             return f"Result: {value}"
         
-        if len(result) <= 15:
+        if total_rows <= 15:
             # Multiple rows - show all with clear formatting
             lines = []
             for idx, row in result.iterrows():
@@ -81,4 +117,4 @@ Your answer:"""
                 else:
                     parts.append(f"{col}={val}")
             lines.append(" | ".join(parts))
-        return f"Total: {len(result)} rows\nFirst rows:\n" + "\n".join(lines)
+        return f"Total: {total_rows} rows\nFirst rows:\n" + "\n".join(lines)
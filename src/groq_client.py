@@ -1,7 +1,7 @@
 # Groq API client wrapper
 
 import os
-from groq import Groq
+from groq import AsyncGroq, Groq
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,6 +12,8 @@ class GroqClient:
         if not api_key:
             raise ValueError("GROQ_API_KEY not found in .env file")
         self.client = Groq(api_key=api_key)
+        # Non-blocking client for the asyncio pipeline (same API, awaitable calls)
+        self.async_client = AsyncGroq(api_key=api_key)
         self.model = "llama-3.1-8b-instant"
     
     def generate(self, prompt, temperature=0.7, max_tokens=1024):
@@ -24,6 +26,16 @@ class GroqClient:
         )
         return response.choices[0].message.content.strip()
     
+    async def agenerate(self, prompt, temperature=0.7, max_tokens=1024):
+        # generate() without blocking the event loop
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content.strip()
+    
     def validate_sql(self, question: str, sql: str, result_preview: str) -> tuple[bool, str]:
         # Validate if SQL correctly answers the question based on actual results
         
@@ -70,7 +82,7 @@ Format: YES/NO: reason
 
 Data structure:
 - Table: trade
-- Columns: Year (2077-2082), Month (1-12), Direction (I/E), HS_Code, Description, Country (ISO-2), Value, Quantity, Unit, Revenue
+- Columns: Year (2077-2082), Month (1-12), Direction (I/E), HS_Code, HS2/HS4/HS6 (integer chapter/heading/subheading), Description, Country (ISO-2), Value, Quantity, Unit, Revenue
 - 760K records of Nepal import/export data
 
 Generate diverse questions covering:
@@ -92,6 +104,16 @@ Return ONLY the questions, one per line, no numbering.
         """
         Use Groq to fix broken SQL - reuses Mistral's prompt + error context.
         """
+        fixed_sql = self.generate(self._fix_prompt(question, bad_sql, error_msg), temperature=0.1, max_tokens=300)
+        return self._extract_fixed_sql(fixed_sql)
+    
+    async def afix_sql(self, question: str, bad_sql: str, error_msg: str) -> str:
+        # fix_sql() without blocking the event loop
+        fixed_sql = await self.agenerate(self._fix_prompt(question, bad_sql, error_msg), temperature=0.1, max_tokens=300)
+        return self._extract_fixed_sql(fixed_sql)
+    
+    @staticmethod
+    def _fix_prompt(question: str, bad_sql: str, error_msg: str) -> str:
         # Load Mistral's prompt
         from pathlib import Path
         prompt_path = Path(__file__).parent.parent / "prompts" / "sql_generation.txt"
@@ -111,9 +133,10 @@ Keep it simple and follow ALL the rules above.
 User Question: {question}
 
 SQL:"""
-        
-        fixed_sql = self.generate(fix_prompt, temperature=0.1, max_tokens=300)
-        
+        return fix_prompt
+    
+    @staticmethod
+    def _extract_fixed_sql(fixed_sql: str) -> str:
         # Extract SQL
         if '```sql' in fixed_sql:
             fixed_sql = fixed_sql.split('```sql')[1].split('```')[0].strip()
@@ -0,0 +1,188 @@
+# Incremental ingest: replace one (Year, Month) partition of the trade table
+
+import hashlib
+import os
+import shutil
+import time
+import duckdb
+from datetime import datetime
+from pathlib import Path
+from config.settings import TABLE_NAME, PARQUET_ROW_GROUP_SIZE
+from src.parquet_store import (
+    CURRENT, PARTITION_COLUMNS, SORT_COLUMNS, new_generation, parquet_trade_sql, publish_generation
+)
+from src.schema import read_csv_sql, trade_select_sql, widen_enums
+from src.rollups import ROLLUPS, refresh_rollups
+from src.snapshot import file_checksum, partitions_dir, read_meta, temp_path, write_meta
+
+
+def next_data_version(version: str, partition: dict) -> str:
+    # Data version after swapping in a partition (stable across restarts)
+    key = f"{version}|{partition['year']}-{partition['month']}|{partition['checksum']}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def replace_partition(conn: duckdb.DuckDBPyConnection, csv_path: Path) -> dict:
+    # Swap the rows of the single (Year, Month) in csv_path into the trade table and
+    # recompute the rollup rows for it. Other partitions are not read or rewritten.
+    # The file has done_des.csv's layout; rerunning it replaces the same partition.
+    start = time.perf_counter()
+    staging = f"{TABLE_NAME}_partition"
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE {staging} AS {read_csv_sql(csv_path)}")
+    
+    try:
+        partitions = conn.execute(f"SELECT DISTINCT Year, Month FROM {staging}").fetchall()
+        if len(partitions) != 1 or None in partitions[0]:
+            raise ValueError(f"{csv_path} must hold exactly one (Year, Month) partition, found {sorted(partitions)}")
+        year, month = partitions[0]
+        
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            widened = widen_enums(conn, staging, [TABLE_NAME, *ROLLUPS])
+            deleted = conn.execute(f"DELETE FROM {TABLE_NAME} WHERE Year = ? AND Month = ?", [year, month]).fetchone()[0]
+            inserted = conn.execute(f"""
+                INSERT INTO {TABLE_NAME}
+                {trade_select_sql(staging)}
+            """).fetchone()[0]
+            refresh_rollups(conn, year, month)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute(f"DROP TABLE IF EXISTS {staging}")
+    
+    return {
+        "year": year,
+        "month": month,
+        "deleted": deleted,
+        "inserted": inserted,
+        "widened_enums": widened,
+        "source": str(csv_path),
+        "checksum": file_checksum(csv_path),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def _store_partition(csv_path: Path, snapshot_path: Path, partition: dict) -> Path:
+    # Keep a copy of the month's CSV beside the snapshot for later rebuilds
+    directory = partitions_dir(snapshot_path)
+    directory.mkdir(exist_ok=True)
+    stored = directory / f"{partition['year']}-{partition['month']:02d}.csv"
+    tmp_path = temp_path(stored, '.tmp')
+    shutil.copyfile(csv_path, tmp_path)
+    os.replace(tmp_path, stored)
+    return stored
+
+
+def replay_partitions(conn: duckdb.DuckDBPyConnection, partitions: list) -> list:
+    # Apply the months ingested into an earlier build of the snapshot to a fresh one,
+    # from their stored copies (the latest ingest of each month). They replace the
+    # same months of the CSV; a month whose copy is gone is left as the CSV has it.
+    latest = {(partition["year"], partition["month"]): partition for partition in partitions}
+    replayed = []
+    for partition in latest.values():
+        stored = Path(partition.get("stored", ""))
+        if not stored.is_file():
+            print(f"Ingested partition {partition['year']}-{partition['month']:02d} not replayed: {stored} is missing")
+            continue
+        replayed.append({
+            **replace_partition(conn, stored),
+            "source": partition["source"],
+            "stored": str(stored),
+            "ingested_at": partition["ingested_at"],
+        })
+    return replayed
+
+
+def ingest_partition(csv_path: Path, snapshot_path: Path) -> dict:
+    # Replace one partition of the persistent snapshot and record it in the metadata.
+    # The partition is written into a copy of the snapshot that then replaces it, so
+    # processes with the old file attached keep reading it until they reattach. Run
+    # one ingest at a time: concurrent ones each start from the same copy.
+    # The source CSV's stat is kept, so later starts reuse the updated snapshot, and
+    # a copy of the month is kept so a rebuild from a changed CSV replays it.
+    snapshot_path = Path(snapshot_path)
+    meta = read_meta(snapshot_path)
+    if meta is None:
+        raise FileNotFoundError(f"No snapshot to ingest into: {snapshot_path}")
+    
+    tmp_path = temp_path(snapshot_path, '.ingesting')
+    try:
+        shutil.copyfile(snapshot_path, tmp_path)
+        conn = duckdb.connect(str(tmp_path))
+        try:
+            partition = replace_partition(conn, csv_path)
+            meta["row_count"] = conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0]
+            conn.execute("CHECKPOINT")
+        finally:
+            conn.close()
+        partition["stored"] = str(_store_partition(csv_path, snapshot_path, partition))
+        os.replace(tmp_path, snapshot_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    
+    partition["ingested_at"] = datetime.now().isoformat()
+    meta["data_version"] = next_data_version(meta.get("data_version", meta["checksum"]), partition)
+    meta["partitions"] = meta.get("partitions", []) + [partition]
+    write_meta(snapshot_path, meta)
+    return partition
+
+
+def ingest_parquet_partition(csv_path: Path, dataset_dir: Path) -> dict:
+    # Replace one partition of the Year/Direction-partitioned Parquet dataset. Files
+    # cannot be edited in place, so the month's whole Year directory is rewritten
+    # (and the small rollup files with it) into a new generation, which other years
+    # are hardlinked into; publishing it swaps every file in with one rename.
+    dataset_dir = Path(dataset_dir)
+    meta = read_meta(dataset_dir)
+    if meta is None:
+        raise FileNotFoundError(f"No Parquet dataset to ingest into: {dataset_dir}")
+    
+    current = (dataset_dir / CURRENT).resolve()
+    generation = new_generation(dataset_dir)
+    try:
+        conn = duckdb.connect()
+        try:
+            years = [row[0] for row in conn.execute(f"SELECT DISTINCT Year FROM ({read_csv_sql(csv_path)})").fetchall()]
+            conn.execute(f"""
+                CREATE TABLE {TABLE_NAME} AS
+                SELECT * FROM ({parquet_trade_sql(dataset_dir)})
+                WHERE Year IN ({", ".join(str(int(year)) for year in years if year is not None) or "NULL"})
+            """)
+            for table in ROLLUPS:
+                conn.execute(f"CREATE TABLE {table} AS SELECT * FROM read_parquet('{current / 'rollups' / table}.parquet')")
+            
+            partition = replace_partition(conn, csv_path)
+            conn.execute(f"""
+                COPY (
+                    SELECT * FROM {TABLE_NAME}
+                    ORDER BY {", ".join(PARTITION_COLUMNS + SORT_COLUMNS)}
+                ) TO '{generation / TABLE_NAME}' (
+                    FORMAT PARQUET,
+                    PARTITION_BY ({", ".join(PARTITION_COLUMNS)}),
+                    ROW_GROUP_SIZE {meta.get("row_group_size", PARQUET_ROW_GROUP_SIZE)}
+                )
+            """)
+            for table in ROLLUPS:
+                conn.execute(f"COPY {table} TO '{generation / 'rollups' / table}.parquet' (FORMAT PARQUET)")
+        finally:
+            conn.close()
+        
+        # The other years are unchanged: link their files rather than copy them
+        year_dir = f"Year={partition['year']}"
+        for path in (current / TABLE_NAME).iterdir():
+            if path.name != year_dir:
+                shutil.copytree(path, generation / TABLE_NAME / path.name, copy_function=os.link)
+    except BaseException:
+        shutil.rmtree(generation, ignore_errors=True)
+        raise
+    publish_generation(dataset_dir, generation)
+    
+    partition["ingested_at"] = datetime.now().isoformat()
+    meta["row_count"] = meta.get("row_count", 0) - partition["deleted"] + partition["inserted"]
+    meta["data_version"] = next_data_version(meta.get("data_version", meta["checksum"]), partition)
+    meta["partitions"] = meta.get("partitions", []) + [partition]
+    write_meta(dataset_dir, meta)
+    return partition
@@ -0,0 +1,245 @@
+# Deterministic question -> SQL for the common aggregate intents (totals, imports/exports,
+# top N countries or commodities, per year and per month), so they need no model call.
+# Every word of a routed question has to be accounted for by a slot (see
+# question_templates.question_slots), a keyword phrase or a filler word; questions with
+# words the router does not understand go to the SQL model instead.
+
+import re
+import threading
+from typing import Optional
+from config.settings import INTENT_ROUTER_MIN_CONFIDENCE
+from src.question_templates import commodity_words, question_slots
+from src.schema import HS_LEVELS
+
+TOKEN = re.compile(r"\{\w+\}\w*|[a-z]+|\d+|[^\s\w]")
+
+# Words that do not change the query
+FILLER = {
+    "a", "an", "the", "what", "which", "is", "are", "was", "were", "has", "have", "had", "do", "does",
+    "did", "how", "much", "we", "our", "us", "me", "show", "list", "give", "tell", "get", "find",
+    "of", "in", "for", "to", "from", "with", "on", "at", "during", "and", "or", "all", "overall",
+    "values", "amount", "trade", "traded", "trading", "activity", "data",
+    "database", "nepal", "there", "been", ",",
+}
+
+# (pattern, action, argument), tried in order; a phrase cannot reuse words an earlier
+# phrase took. Slots appear as {COUNTRY}, {YEAR}, {MONTH}, {DIRECTION} and {COMMODITY},
+# upper case so that keywords like "year" do not match them.
+PHRASES = [(re.compile(pattern), action, argument) for pattern, action, argument in (
+    # "Average monthly imports" is the mean month total or the mean row per month
+    (r"\baverage (?:monthly|yearly|annual)\b", "ambiguous", None),
+    (r"\{MONTH\} month\b", "none", None),
+    (r"\bmonth (\d{1,2})\b", "month", None),
+    (r"\bhs code (\d{2}(?:\d{2}){0,3})\b", "hs_code", None),
+    (r"\bfrom \{YEAR\} to \{YEAR\}|\bbetween \{YEAR\} and \{YEAR\}", "between", None),
+    (r"\b(?:by|per|each|every) year\b|\byear by year\b|\byearly\b|\bannual(?:ly)?\b", "group", "Year"),
+    (r"\b(?:by|per|each|every) month\b|\bmonth by month\b|\bmonthly\b", "group", "Month"),
+    (r"\b(?:by|per|each) (?:country|partner)\b", "group", "Country"),
+    (r"\b(?:by|per|each) (?:commodity|product)\b", "group", "Description"),
+    (r"\b(?:by|per) direction\b", "group", "Direction"),
+    (r"\b(?:by|per) hs codes?\b", "group", "HS_Code"),
+    (r"\btrend\b|\bgrowth\b|\bover the years\b", "trend", None),
+    (r"\bby value\b", "none", None),
+    (r"\b(?:total|value|sum)\b", "measured", None),
+    (r"\bper (?:\{DIRECTION\}\w* )?(?:transaction|record|entry|shipment)s?\b|\bper \{DIRECTION\}\w*", "none", None),
+    (r"\b(?:highest|largest|biggest) single\b|\bmaximum\b", "max", None),
+    (r"\btop (\d+)\b|\btop\b", "order", "DESC"),
+    (r"\b(?:least|lowest|smallest|fewest|bottom)\b", "order", "ASC"),
+    (r"\b(?:most|highest|largest|biggest|busiest|leading|main|major)\b", "order", "DESC"),
+    (r"\bhs codes\b", "noun", ("HS_Code", True)),
+    (r"\bhs code\b", "noun", ("HS_Code", False)),
+    (r"\b(?:countries|partners|destinations|sources|markets|suppliers|buyers)\b", "noun", ("Country", True)),
+    (r"\b(?:country|partner|destination|source|market|supplier|buyer)\b", "noun", ("Country", False)),
+    (r"\b(?:commodities|products|goods|items)\b", "noun", ("Description", True)),
+    (r"\b(?:commodity|product|item)\b", "noun", ("Description", False)),
+    (r"\bmonths\b", "noun", ("Month", True)),
+    (r"\bmonth\b", "noun", ("Month", False)),
+    (r"\byears\b", "noun", ("Year", True)),
+    (r"\byear\b", "noun", ("Year", False)),
+    (r"\b(?:quantity|quantities|volume)\b", "measure", "Quantity"),
+    (r"\b(?:revenue|duty|duties)\b", "measure", "Revenue"),
+    (r"\b(?:average|avg|mean)\b", "aggregate", "AVG"),
+    (r"\bhow many\b|\bnumber of\b|\bcount\b", "count", None),
+    (r"\b(?:unique|distinct|different)\b", "distinct", None),
+    (r"\b(?:records|record|rows|entries|transactions)\b", "records", None),
+    (r"\b(?:compare|comparison|vs|versus)\b", "compare", None),
+    (r"\bboth\b", "both", None),
+)]
+
+# Group columns in SELECT / GROUP BY order; time columns also order the result
+GROUP_ORDER = ["Year", "Month", "Country", "Description", "HS_Code", "Direction"]
+TIME_COLUMNS = ("Year", "Month")
+
+
+class IntentRouter:
+    # Parses a question into an aggregate intent and renders its SQL. route() returns
+    # SQL only when the share of the question's words the parse used reaches
+    # min_confidence, else None (the caller asks the SQL model).
+    
+    def __init__(self, catalog=None, min_confidence: float = INTENT_ROUTER_MIN_CONFIDENCE):
+        # Router keywords are never commodity names, whatever the descriptions contain
+        keywords = {word for pattern, _, _ in PHRASES for word in re.findall(r"[a-z]+", pattern.pattern)}
+        self.commodities = commodity_words(catalog) - keywords - FILLER
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self.routed = 0
+        self.fallbacks = 0
+    
+    def route(self, question: str) -> Optional[str]:
+        sql, confidence = self.parse(question)
+        routed = sql is not None and confidence >= self.min_confidence
+        with self._lock:
+            if routed:
+                self.routed += 1
+            else:
+                self.fallbacks += 1
+        return sql if routed else None
+    
+    def parse(self, question: str) -> tuple:
+        # (sql, confidence): sql is None for intents the router cannot express;
+        # confidence is the share of words the parse accounted for
+        template, slots = question_slots(question, self.commodities)
+        template = re.sub(r"\{\w+\}", lambda match: match.group().upper(), template)
+        tokens = [(match.start(), match.end(), match.group()) for match in TOKEN.finditer(template)]
+        used = [False] * len(template)
+        intent = {"groups": [], "nouns": [], "order": None, "limit": None, "measure": "Value",
+                  "aggregate": "SUM", "months": [], "hs_codes": [], "flags": set()}
+        
+        for pattern, action, argument in PHRASES:
+            for match in pattern.finditer(template):
+                if any(used[match.start():match.end()]):
+                    continue
+                used[match.start():match.end()] = [True] * (match.end() - match.start())
+                self._apply(intent, action, argument, match)
+        
+        explained = sum(1 for start, end, text in tokens
+                        if text.startswith("{") or text in FILLER or all(used[start:end]))
+        confidence = explained / len(tokens) if tokens else 0.0
+        values = {kind: [value for slot_kind, value in slots if slot_kind == kind]
+                  for kind in ("country", "year", "month", "direction", "commodity")}
+        values["month"] = values["month"] + intent["months"]
+        return self._render(intent, values), confidence
+    
+    @staticmethod
+    def _apply(intent: dict, action: str, argument, match) -> None:
+        if action in ("group", "noun"):
+            intent[action + "s"].append(argument)
+        elif action in ("measure", "aggregate"):
+            intent[action] = argument
+        elif action == "order":
+            intent["order"] = argument
+            if match.lastindex and match.group(1):
+                intent["limit"] = int(match.group(1))
+        elif action == "month":
+            month = int(match.group(1))
+            if 1 <= month <= 12:
+                intent["months"].append(str(month))
+            else:
+                intent["flags"].add("ambiguous")
+        elif action == "hs_code":
+            intent["hs_codes"].append(match.group(1))
+        elif action != "none":
+            intent["flags"].add(action)
+    
+    def _render(self, intent: dict, values: dict) -> Optional[str]:
+        flags = intent["flags"]
+        if "ambiguous" in flags:
+            return None
+        measure = intent["measure"]
+        if measure == "Revenue" and not values["direction"]:
+            # Revenue is import duty
+            values["direction"] = ["I"]
+        
+        groups = list(dict.fromkeys(intent["groups"]))
+        if "trend" in flags and not any(column in groups for column in TIME_COLUMNS):
+            groups.append("Year")
+        nouns = list(dict.fromkeys(intent["nouns"]))
+        if len(nouns) > 1:
+            return None
+        noun, plural = nouns[0] if nouns else (None, False)
+        
+        # More than one value of a slot compares them, one row each
+        where = []
+        commodities = values["commodity"]
+        if commodities:
+            likes = [f"Description LIKE '%{term}%'" for term in commodities]
+            where.append(likes[0] if len(likes) == 1 else "(" + " OR ".join(likes) + ")")
+        for column, kind in (("Country", "country"), ("Year", "year"), ("Month", "month")):
+            found = list(dict.fromkeys(values[kind]))
+            literals = [f"'{value}'" for value in found] if kind == "country" else found
+            if kind == "year" and "between" in flags and len(found) == 2:
+                low, high = sorted(found)
+                where.append(f"Year BETWEEN {low} AND {high}")
+            elif len(found) == 1:
+                where.append(f"{column} = {literals[0]}")
+            elif found:
+                where.append(f"{column} IN ({', '.join(literals)})")
+                groups.append(column)
+        directions = list(dict.fromkeys(values["direction"]))
+        if len(directions) == 1:
+            where.append(f"Direction = '{directions[0]}'")
+        elif directions and "both" in flags:
+            where.append("Direction IN ('I', 'E')")
+        elif directions:
+            groups.append("Direction")
+        for code in intent["hs_codes"]:
+            # Chapter, heading and subheading codes read the HS columns
+            level = next((name for name, width in HS_LEVELS.items() if width == len(code)), None)
+            where.append(f"{level} = {int(code)}" if level else f"HS_Code = '{code}'")
+        
+        if "records" in flags or ("count" in flags and noun is None):
+            aggregate = "COUNT(*)"
+        elif "max" in flags:
+            aggregate = f"MAX({measure})"
+        else:
+            aggregate = f"{intent['aggregate']}({measure})"
+        
+        order = intent["order"]
+        distinct = False
+        if noun is not None:
+            if any(column not in (noun, "Direction") for column in groups):
+                # "Top countries by year": one row per pair is not what a top N means
+                return None
+            directions_grouped = [column for column in groups if column == "Direction"]
+            if order is not None:
+                groups = [noun] + directions_grouped
+            elif not plural:
+                return None
+            elif "count" in flags or "distinct" in flags:
+                aggregate = f"COUNT(DISTINCT {noun})"
+                groups = directions_grouped
+            elif noun in groups or flags & {"measured", "records"} or intent["measure"] != "Value" \
+                    or intent["aggregate"] != "SUM":
+                groups = [noun] + groups
+            else:
+                # "Countries we export to?"
+                distinct = True
+        elif order is not None and "max" not in flags:
+            if len(set(groups) - {"Direction"}) != 1:
+                return None
+        
+        groups = sorted(dict.fromkeys(groups), key=GROUP_ORDER.index)
+        where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+        if distinct:
+            return f"SELECT DISTINCT {noun} FROM trade{where_sql} ORDER BY {noun};"
+        if not groups:
+            return f"SELECT {aggregate} FROM trade{where_sql};"
+        
+        columns = ", ".join(groups)
+        sql = f"SELECT {columns}, {aggregate} FROM trade{where_sql} GROUP BY {columns}"
+        if order is not None:
+            limit = intent["limit"] or (10 if plural or noun is None else 1)
+            return f"{sql} ORDER BY {aggregate} {order} LIMIT {limit};"
+        time_columns = [column for column in groups if column in TIME_COLUMNS]
+        if time_columns:
+            return f"{sql} ORDER BY {', '.join(time_columns)};"
+        return f"{sql} ORDER BY {aggregate} DESC;"
+    
+    def stats(self) -> dict:
+        with self._lock:
+            questions = self.routed + self.fallbacks
+            return {
+                "routed": self.routed,
+                "fallbacks": self.fallbacks,
+                "routed_rate": self.routed / questions if questions else 0.0,
+            }
@@ -9,8 +9,10 @@ This module handles loading quantized GGUF models for:
 
 from ctransformers import AutoModelForCausalLM
 from pathlib import Path
-from typing import Optional
-from config.settings import SQL_MAX_TOKENS, FORMAT_MAX_TOKENS, TEMPERATURE
+from typing import Iterator, Optional
+from config.settings import SQL_MAX_TOKENS, FORMAT_MAX_TOKENS, TEMPERATURE, SQL_GRAMMAR_MAX_REJECTIONS
+from src.sql_grammar import SQLGrammar, constrained_sql
+from src.streaming import until_statement_end
 
 
 class ModelLoader:
@@ -21,6 +23,9 @@ class ModelLoader:
         self.sql_model = None
         self.formatter_model = None
         self.models_dir = Path("models")
+        # Grammar the SQL model's output is constrained to (None: unconstrained)
+        self.sql_grammar = None
+        self.grammar_stats = {"masked_tokens": 0}
     
     def load_sql_generator(self) -> None:
         """
@@ -87,27 +92,96 @@ class ModelLoader:
         
         Args:
             prompt: Natural language question with schema context.
-            
+        
         Returns:
             Generated SQL query string.
-            
+        
+        Raises:
+            RuntimeError: If SQL model not loaded.
+        """
+        return "".join(self.stream_sql(prompt)).strip()
+    
+    def stream_sql(self, prompt: str) -> Iterator[str]:
+        """
+        Generate SQL from a prompt, yielding text as the model produces it.
+        
+        Generation stops at the end of the first statement (its semicolon),
+        so no tokens are spent on text extract_sql would throw away.
+        
+        The model context is shared and not locked: run one generation at a
+        time (QueryPipeline uses a single inference worker) and drain or
+        close() the stream before the next one. Closing it stops the model.
+        
+        Args:
+            prompt: Natural language question with schema context.
+        
+        Returns:
+            Iterator over generated text chunks.
+        
         Raises:
             RuntimeError: If SQL model not loaded.
         """
         if self.sql_model is None:
             raise RuntimeError("SQL model not loaded. Call load_sql_generator() first")
+        return self._stream_sql(prompt)
+    
+    def _stream_sql(self, prompt: str) -> Iterator[str]:
+        if self.sql_grammar is not None:
+            chunks = constrained_sql(
+                self.sql_model,
+                prompt,
+                self.sql_grammar,
+                max_new_tokens=150,
+                max_rejections=SQL_GRAMMAR_MAX_REJECTIONS,
+                stats=self.grammar_stats,
+                temperature=0.25,
+                top_p=0.85,
+                repetition_penalty=1.15
+            )
+        else:
+            chunks = self.sql_model(
+                prompt,
+                max_new_tokens=150,
+                temperature=0.25,  # Balanced for accuracy and speed
+                top_p=0.85,  # Slightly higher for better quality
+                repetition_penalty=1.15,
+                stop=["\n\nQuestion:", "Q:"],
+                threads=8,
+                stream=True
+            )
+        yield from until_statement_end(chunks)
+    
+    def constrain_sql(self, grammar: Optional[SQLGrammar]) -> None:
+        """
+        Restrict SQL generation to statements a grammar accepts.
         
-        response = self.sql_model(
-            prompt,
-            max_new_tokens=150,
-            temperature=0.25,  # Balanced for accuracy and speed
-            top_p=0.85,  # Slightly higher for better quality
-            repetition_penalty=1.15,
-            stop=["\n\nQuestion:", "Q:"],
-            threads=8
-        )
+        Tokens that would take the output outside the grammar are masked while
+        sampling, so the model cannot produce placeholders, unknown columns or
+        functions, or values missing from the data.
         
-        return response.strip()
+        Args:
+            grammar: SQLGrammar to decode with, or None to generate freely.
+        """
+        self.sql_grammar = grammar
+    
+    def prime_sql_prefix(self, prefix: str) -> int:
+        """
+        Evaluate the fixed part of the SQL prompt ahead of the first question.
+        
+        ctransformers keeps the part of its context a new prompt starts with,
+        so every question after this one only evaluates its own tokens.
+        
+        Args:
+            prefix: Prompt text before the question (SQLPromptBuilder.prefix()).
+        
+        Returns:
+            Number of prefix tokens in the model context.
+        """
+        if self.sql_model is None:
+            raise RuntimeError("SQL model not loaded. Call load_sql_generator() first")
+        tokens = self.sql_model.tokenize(prefix)
+        self.sql_model.eval(self.sql_model.prepare_inputs_for_generation(tokens, reset=True))
+        return len(tokens)
     
     def format_response(self, prompt: str) -> str:
         """
@@ -115,26 +189,43 @@ class ModelLoader:
         
         Args:
             prompt: Results with formatting instructions.
-            
+        
         Returns:
             Formatted natural language response.
-            
+        
+        Raises:
+            RuntimeError: If formatter model not loaded.
+        """
+        return "".join(self.stream_response(prompt)).strip()
+    
+    def stream_response(self, prompt: str) -> Iterator[str]:
+        """
+        Format query results, yielding text as the model produces it.
+        
+        As with stream_sql, drain or close() the stream before the next
+        generation on the formatter model.
+        
+        Args:
+            prompt: Results with formatting instructions.
+        
+        Returns:
+            Iterator over generated text chunks.
+        
         Raises:
             RuntimeError: If formatter model not loaded.
         """
         if self.formatter_model is None:
             raise RuntimeError("Formatter model not loaded. Call load_response_formatter() first")
         
-        response = self.formatter_model(
+        return self.formatter_model(
             prompt,
             max_new_tokens=FORMAT_MAX_TOKENS,
             temperature=TEMPERATURE,
             top_p=0.95,
             repetition_penalty=1.1,
-            stop=["\n\n"]
+            stop=["\n\n"],
+            stream=True
         )
-        
-        return response.strip()
     
     def get_memory_usage(self) -> dict:
         # Get GPU memory usage if available
@@ -149,5 +240,3 @@ class ModelLoader:
             pass
         
         return {"note": "ctransformers manages memory automatically"}
-
-
@@ -0,0 +1,348 @@
+# Server-side result cursors with keyset pagination. A paged query is re-run per page
+# in a total order (its own ORDER BY, then every output column), starting from the key
+# of the last row served, so memory stays bounded by the page size however large the
+# result is. Identical rows are grouped with their count, so every key is unique and
+# duplicates are expanded per page.
+
+import math
+import secrets
+import threading
+import time
+import pandas as pd
+import pyarrow as pa
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+from config.settings import MAX_QUERY_TIMEOUT, PAGE_SIZE, PAGE_CURSOR_IDLE_SECONDS, MAX_PAGE_CURSORS
+from src import sql_ast
+from src.database import QueryExecutionError, arrow_to_pandas
+
+# ORDER BY terms that are not output columns are carried as hidden columns
+HIDDEN_PREFIX = "__page_order_"
+# Number of identical rows behind each row of a page query
+DUPLICATES = "__dups"
+
+
+class PageCursorError(QueryExecutionError):
+    # Raised for an unknown or expired page token, or when the data changed under it
+    
+    def __init__(self, message: str):
+        super().__init__(message, deterministic=True)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _shape(expr: dict) -> str:
+    # Expression identity, ignoring aliases and source positions
+    def strip(item):
+        if isinstance(item, dict):
+            return {key: strip(child) for key, child in item.items() if key not in ("query_location", "alias")}
+        if isinstance(item, list):
+            return [strip(child) for child in item]
+        return item
+    return repr(strip(expr))
+
+
+def _same(a: Any, b: Any) -> bool:
+    # Key equality as ORDER BY sees it (NaN sorts as one value)
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+
+class KeysetQuery:
+    # A SELECT split into a source query without ORDER BY and a total order over its
+    # output columns, rendered as page queries that start at a given key
+    
+    def __init__(self, sql: str, describe: Callable[[str], list]):
+        # describe(sql) -> [(column name, type)] of sql's output
+        node = sql_ast.parse_select(sql)
+        if node is None:
+            raise QueryExecutionError("Only a single SELECT can be paged", deterministic=True)
+        modifiers = node.get("modifiers") or []
+        orders = [order for modifier in modifiers if modifier["type"] == "ORDER_MODIFIER"
+                  for order in modifier["orders"]]
+        limited = any(modifier["type"] == "LIMIT_MODIFIER" for modifier in modifiers)
+        distinct = any(modifier["type"] == "DISTINCT_MODIFIER" for modifier in modifiers)
+        if not limited:
+            # The order is applied per page; sorting the whole result each time is wasted
+            node["modifiers"] = [modifier for modifier in modifiers if modifier["type"] != "ORDER_MODIFIER"]
+        
+        names = [name for name, _ in describe(sql)]
+        select_list = node["select_list"]
+        has_star = any(item.get("class") == "STAR" for item in select_list)
+        keys, hidden = [], []
+        for order in orders:
+            descending = order["type"] == "DESCENDING"
+            nulls_first = order["null_order"] == "NULLS_FIRST"
+            expr = order["expression"]
+            if expr.get("class") == "STAR":
+                # ORDER BY ALL
+                keys.extend((index, descending, nulls_first) for index in range(len(names)))
+                continue
+            index = self._output_index(expr, select_list, names, has_star)
+            if index is None:
+                if distinct:
+                    raise QueryExecutionError("ORDER BY of a DISTINCT query must use its columns", deterministic=True)
+                index = len(names) + len(hidden)
+                hidden.append({**expr, "alias": f"{HIDDEN_PREFIX}{len(hidden)}"})
+            keys.append((index, descending, nulls_first))
+        
+        # Every output column breaks ties, so equal keys mean identical rows
+        ordered = {index for index, _, _ in keys}
+        keys.extend((index, False, False) for index in range(len(names)) if index not in ordered)
+        
+        node["select_list"] = select_list + hidden
+        self.names = names
+        self.source_sql = sql_ast.render(node)
+        self.types = [column_type for _, column_type in describe(self.source_sql)]
+        self.keys = [index for index, _, _ in keys]
+        self._orders = keys
+    
+    @staticmethod
+    def _output_index(expr: dict, select_list: list, names: list, has_star: bool) -> Optional[int]:
+        # Output column an ORDER BY term refers to, or None if it is not one of them
+        if sql_ast.is_constant(expr):
+            position = sql_ast.constant_value(expr)
+            if isinstance(position, int) and 1 <= position <= len(names):
+                return position - 1
+            return None
+        
+        name = sql_ast.column_name(expr)
+        if name and len(expr.get("column_names", [])) == 1:
+            for index, item in enumerate(select_list):
+                if item.get("alias", "").lower() == name.lower():
+                    return index
+        if not has_star:
+            shape = _shape(expr)
+            for index, item in enumerate(select_list):
+                if _shape(item) == shape:
+                    return index
+        elif name:
+            # SELECT *: output columns are named after the table's columns
+            lowered = [column.lower() for column in names]
+            if lowered.count(name.lower()) == 1:
+                return lowered.index(name.lower())
+        return None
+    
+    def page_sql(self, limit: int, start: Optional[list] = None) -> tuple:
+        # (sql, params) for the first limit distinct rows in key order, each with its
+        # number of duplicates, from the row whose key values are start (inclusive) on
+        # when it is given
+        columns = [f"c{index}" for index in range(len(self.types))]
+        names = self.names + [f"{HIDDEN_PREFIX}{n}" for n in range(len(self.types) - len(self.names))]
+        outputs = ", ".join(f"c{index} AS {_quote(name)}" for index, name in enumerate(names))
+        order_by = ", ".join(
+            f"c{index} {'DESC' if descending else 'ASC'} NULLS {'FIRST' if nulls_first else 'LAST'}"
+            for index, descending, nulls_first in self._orders
+        )
+        where, params = "", []
+        if start is not None:
+            where, params = self._from_key(start)
+        return f"""
+            SELECT {outputs}, COUNT(*) AS {DUPLICATES}
+            FROM ({self.source_sql}) AS page_source({", ".join(columns)})
+            {where}
+            GROUP BY ALL
+            ORDER BY {order_by}
+            LIMIT {int(limit)}
+        """, params
+    
+    def _from_key(self, start: list) -> tuple:
+        # WHERE clause keeping rows at or after the key start, in key order
+        params, equal, after = [], [], []
+        for (index, descending, nulls_first), value in zip(self._orders, start):
+            column = f"c{index}"
+            if value is None:
+                equal.append(f"{column} IS NULL")
+                after.append(f"{column} IS NOT NULL" if nulls_first else None)
+                continue
+            params.append(value)
+            param = f"CAST(${len(params)} AS {self.types[index]})"
+            compare = f"{column} {'<' if descending else '>'} {param}"
+            equal.append(f"{column} = {param}")
+            after.append(compare if nulls_first else f"({compare} OR {column} IS NULL)")
+        
+        # Lexicographic: equal on a prefix of the key, then after on the next column
+        terms = [" AND ".join(equal)]
+        for position, term in enumerate(after):
+            if term is not None:
+                terms.append(" AND ".join(equal[:position] + [term]))
+        return "WHERE " + " OR ".join(f"({term})" for term in terms), params
+
+
+class PageCursor:
+    # Position of one paged query: the key of the last row served and how many of the
+    # identical rows with that key were served
+    
+    def __init__(
+        self,
+        query: KeysetQuery,
+        page_size: int,
+        data_version: Any,
+        timeout: Optional[float],
+        question: Optional[str]
+    ):
+        self.query = query
+        self.page_size = page_size
+        self.data_version = data_version
+        self.timeout = timeout
+        self.question = question
+        self.last_key = None
+        self.served_at_key = 0
+        self.pages = 0
+        self.lock = threading.Lock()
+    
+    def fetch(self, run: Callable[[str, list], pa.Table]) -> tuple:
+        # Next page as (frame, more rows follow); run(sql, params) executes a page query.
+        # Each row stands for a group of identical rows, so a page needs at most
+        # page_size + 1 of them after the partly served group it starts with.
+        sql, params = self.query.page_sql(self.page_size + 2, self.last_key)
+        table = run(sql, params)
+        
+        # Exact key values (Arrow, not pandas, so integers and NULLs survive)
+        keys = list(zip(*(table.column(index).to_pylist() for index in self.query.keys)))
+        counts = table.column(DUPLICATES).to_pylist()
+        skip = 0
+        if keys and self.last_key is not None and all(map(_same, keys[0], self.last_key)):
+            skip = self.served_at_key
+        
+        # One row index per remaining duplicate, up to one past the page
+        rows = []
+        for group, count in enumerate(counts):
+            remaining = count - skip if group == 0 else count
+            rows.extend([group] * max(0, min(remaining, self.page_size + 1 - len(rows))))
+            if len(rows) > self.page_size:
+                break
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if rows:
+            last = rows[-1]
+            self.served_at_key = rows.count(last) + (skip if last == 0 else 0)
+            self.last_key = list(keys[last])
+        self.pages += 1
+        
+        page = arrow_to_pandas(table.take(rows).select(range(len(self.query.names))))
+        page.columns = self.query.names
+        return page, more
+
+
+class PageCursors:
+    # Open page cursors by token; cursors idle for idle_seconds expire, and the least
+    # recently used are dropped beyond max_cursors
+    
+    def __init__(self, idle_seconds: float, max_cursors: int):
+        self.idle_seconds = idle_seconds
+        self.max_cursors = max_cursors
+        self._cursors = OrderedDict()
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+    
+    def add(self, cursor: PageCursor) -> str:
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            self._expire()
+            self._cursors[token] = (cursor, time.monotonic())
+            while len(self._cursors) > self.max_cursors:
+                self._cursors.popitem(last=False)
+                self.evicted += 1
+        return token
+    
+    def get(self, token: str) -> PageCursor:
+        with self._lock:
+            self._expire()
+            entry = self._cursors.pop(token, None)
+            if entry is None:
+                raise PageCursorError("Unknown or expired page token; run the query again")
+            self._cursors[token] = (entry[0], time.monotonic())
+            return entry[0]
+    
+    def discard(self, token: str) -> None:
+        with self._lock:
+            self._cursors.pop(token, None)
+    
+    def _expire(self) -> None:
+        # Oldest first (caller holds the lock)
+        deadline = time.monotonic() - self.idle_seconds
+        while self._cursors:
+            token, (_, touched) = next(iter(self._cursors.items()))
+            if touched > deadline:
+                break
+            del self._cursors[token]
+            self.expired += 1
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "open": len(self._cursors),
+                "max_cursors": self.max_cursors,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+class ResultPager:
+    # Pages through large results of a TradeDatabase. open() returns the first page with
+    # a token in attrs["next_page"] (None once the result is exhausted); next_page(token)
+    # returns the following one. Pages carry their 1-based number in attrs["page"].
+    
+    def __init__(
+        self,
+        db,
+        page_size: int = PAGE_SIZE,
+        idle_seconds: float = PAGE_CURSOR_IDLE_SECONDS,
+        max_cursors: int = MAX_PAGE_CURSORS
+    ):
+        self.db = db
+        self.page_size = page_size
+        self.cursors = PageCursors(idle_seconds, max_cursors)
+    
+    def open(
+        self,
+        sql: str,
+        page_size: Optional[int] = None,
+        timeout: Optional[float] = MAX_QUERY_TIMEOUT,
+        question: Optional[str] = None
+    ) -> pd.DataFrame:
+        query = KeysetQuery(sql.strip().rstrip(';'), self._describe)
+        cursor = PageCursor(query, page_size or self.page_size, self.db.data_version, timeout, question)
+        return self._page(cursor, None)
+    
+    def next_page(self, token: str) -> pd.DataFrame:
+        # Following page, under the timeout the cursor was opened with
+        cursor = self.cursors.get(token)
+        if cursor.data_version != self.db.data_version:
+            self.cursors.discard(token)
+            raise PageCursorError("The data changed since the first page; run the query again")
+        return self._page(cursor, token)
+    
+    def close(self, token: str) -> None:
+        # Forget a cursor before it expires
+        self.cursors.discard(token)
+    
+    def _describe(self, sql: str) -> list:
+        cursor = self.db.cursor()
+        try:
+            return [row[:2] for row in cursor.execute(f"DESCRIBE {sql}").fetchall()]
+        except Exception as e:
+            raise QueryExecutionError(str(e), deterministic=True) from e
+        finally:
+            cursor.close()
+    
+    def _page(self, cursor: PageCursor, token: Optional[str]) -> pd.DataFrame:
+        def run(sql, params):
+            return self.db.execute_page(sql, params, timeout=cursor.timeout, question=cursor.question)
+        
+        # One page at a time per cursor: a page starts where the previous one ended
+        with cursor.lock:
+            page, more = cursor.fetch(run)
+            number = cursor.pages
+        if more and token is None:
+            token = self.cursors.add(cursor)
+        elif not more and token is not None:
+            self.cursors.discard(token)
+        page.attrs["page"] = number
+        page.attrs["next_page"] = token if more else None
+        return page
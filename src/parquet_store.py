@@ -0,0 +1,138 @@
+# Parquet dataset of done_des.csv partitioned by Year/Direction, rebuilt only when the CSV changes
+
+import os
+import shutil
+import time
+import duckdb
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from config.settings import TABLE_NAME, PARQUET_ROW_GROUP_SIZE
+from src.schema import SCHEMA_VERSION, TRADE_COLUMNS, create_trade_table
+from src.rollups import ROLLUPS, build_rollups
+from src.snapshot import ensure_built, file_checksum, read_meta, source_stat, temp_path, write_meta
+
+# Hive directories (trade/Year=2080/Direction=I/...); nearly every query filters on these
+PARTITION_COLUMNS = ("Year", "Direction")
+# Row order inside each partition, so row-group min/max statistics are narrow
+SORT_COLUMNS = ("Country", "HS_Code")
+
+# Each build or ingest writes a complete generation directory (trade/ and rollups/)
+# inside the dataset directory; this symlink names the one queries read
+CURRENT = "current"
+
+
+def new_generation(dataset_dir: Path) -> Path:
+    # Empty generation directory; nothing reads it until it is published
+    generation = Path(dataset_dir) / f"gen-{time.time_ns():016x}-{os.getpid()}"
+    (generation / "rollups").mkdir(parents=True)
+    return generation
+
+
+def publish_generation(dataset_dir: Path, generation: Path) -> None:
+    # Point current at generation with a single rename, so a query reads either the
+    # old files or the new ones, never a mix. The generation it replaces is kept for
+    # queries already reading it; older ones are removed.
+    dataset_dir = Path(dataset_dir)
+    link = dataset_dir / CURRENT
+    previous = os.readlink(link) if link.is_symlink() else None
+    tmp_link = temp_path(link, '.link')
+    os.symlink(generation.name, tmp_link)
+    os.replace(tmp_link, link)
+    
+    for child in dataset_dir.iterdir():
+        if child.name.startswith("gen-") and previous is not None and child.name < previous:
+            shutil.rmtree(child, ignore_errors=True)
+    for legacy in (TABLE_NAME, "rollups"):
+        # Written before datasets had generations
+        if (dataset_dir / legacy).is_dir() and not (dataset_dir / legacy).is_symlink():
+            shutil.rmtree(dataset_dir / legacy, ignore_errors=True)
+
+
+def build_parquet(
+    csv_path: Path,
+    dataset_dir: Path,
+    checksum: Optional[str] = None,
+    row_group_size: int = PARQUET_ROW_GROUP_SIZE
+) -> dict:
+    # Write the trade table and its rollups as Parquet and record the source checksum
+    csv_path = Path(csv_path)
+    dataset_dir = Path(dataset_dir)
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    
+    checksum = checksum or file_checksum(csv_path)
+    
+    # Build a new generation and publish it when complete
+    generation = new_generation(dataset_dir)
+    try:
+        conn = duckdb.connect()
+        try:
+            create_trade_table(conn, csv_path)
+            build_rollups(conn)
+            conn.execute(f"""
+                COPY (
+                    SELECT * FROM {TABLE_NAME}
+                    ORDER BY {", ".join(PARTITION_COLUMNS + SORT_COLUMNS)}
+                ) TO '{generation / TABLE_NAME}' (
+                    FORMAT PARQUET,
+                    PARTITION_BY ({", ".join(PARTITION_COLUMNS)}),
+                    ROW_GROUP_SIZE {row_group_size}
+                )
+            """)
+            for table in ROLLUPS:
+                conn.execute(f"COPY {table} TO '{generation / 'rollups' / table}.parquet' (FORMAT PARQUET)")
+            row_count = conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0]
+        finally:
+            conn.close()
+    except BaseException:
+        shutil.rmtree(generation, ignore_errors=True)
+        raise
+    publish_generation(dataset_dir, generation)
+    
+    meta = {
+        "source": str(csv_path),
+        "checksum": checksum,
+        "schema_version": SCHEMA_VERSION,
+        "row_count": row_count,
+        "row_group_size": row_group_size,
+        "built_at": datetime.now().isoformat(),
+        **source_stat(csv_path),
+    }
+    write_meta(dataset_dir, meta)
+    return meta
+
+
+def ensure_parquet(csv_path: Path, dataset_dir: Path) -> dict:
+    # Return dataset metadata, rebuilding only if the CSV checksum changed
+    dataset_dir = Path(dataset_dir)
+    if read_meta(dataset_dir) is not None and not (dataset_dir / CURRENT).exists() and Path(csv_path).exists():
+        # Written before datasets had generations
+        return build_parquet(csv_path, dataset_dir)
+    return ensure_built(csv_path, dataset_dir, build_parquet)
+
+
+def parquet_trade_sql(dataset_dir: Path) -> str:
+    # SELECT of the dataset's trade rows in trade table column order
+    hive_types = "{" + ", ".join(f"'{column}': '{'SMALLINT' if column == 'Year' else 'VARCHAR'}'"
+                                 for column in PARTITION_COLUMNS) + "}"
+    return f"""
+        SELECT {", ".join(TRADE_COLUMNS)}
+        FROM read_parquet(
+            '{Path(dataset_dir) / CURRENT / TABLE_NAME}/*/*/*.parquet',
+            hive_partitioning = true,
+            hive_types = {hive_types}
+        )
+    """
+
+
+def attach_parquet(conn: duckdb.DuckDBPyConnection, dataset_dir: Path) -> None:
+    # Expose the dataset as views named like the snapshot tables. Filters on Year and
+    # Direction prune whole directories; other filters skip row groups by statistics.
+    # The views read through the current link, so they follow each published generation.
+    dataset_dir = Path(dataset_dir)
+    conn.execute(f"CREATE OR REPLACE VIEW {TABLE_NAME} AS {parquet_trade_sql(dataset_dir)}")
+    for table in ROLLUPS:
+        conn.execute(f"""
+            CREATE OR REPLACE VIEW {table} AS
+            SELECT * FROM read_parquet('{dataset_dir / CURRENT / 'rollups' / table}.parquet')
+        """)
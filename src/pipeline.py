@@ -0,0 +1,162 @@
+# Question -> SQL (local model) -> execution (Groq fixes failures) -> Groq-formatted answer,
+# as a blocking call and as an asyncio API for many concurrent questions
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from config.settings import (
+    PREVIEW_ROWS, PIPELINE_INFERENCE_WORKERS, PIPELINE_QUERY_WORKERS, PIPELINE_MAX_IN_FLIGHT,
+    GROQ_MAX_CONCURRENCY, CONSTRAINED_SQL_DECODING, QUESTION_TEMPLATES, INTENT_ROUTER
+)
+from src.executor import QueryExecutor
+from src.formatter import ResponseFormatter
+from src.groq_client import GroqClient
+from src.intent_router import IntentRouter
+from src.prompt_builder import SQLPromptBuilder
+from src.question_templates import QuestionTemplates
+from src.sql_grammar import SQLGrammar
+
+def _answer(question, sql, success, result, message, answer) -> dict:
+    return {
+        "question": question,
+        "sql": sql,
+        "success": success,
+        "regenerated": message.startswith("Regenerated"),
+        "result": result,
+        "message": message,
+        "answer": answer,
+    }
+
+
+class QueryPipeline:
+    # Blocking pipeline; components default to the shared database and the local models
+    
+    def __init__(
+        self,
+        model=None,
+        executor: Optional[QueryExecutor] = None,
+        groq: Optional[GroqClient] = None,
+        builder: Optional[SQLPromptBuilder] = None,
+        formatter: Optional[ResponseFormatter] = None,
+        max_rows: int = PREVIEW_ROWS,
+        use_templates: bool = QUESTION_TEMPLATES,
+        use_router: bool = INTENT_ROUTER
+    ):
+        loaded = model is None
+        if loaded:
+            # Imported here so the pipeline works without ctransformers when a model is passed in
+            from src.models import ModelLoader
+            model = ModelLoader()
+            model.load_sql_generator()
+        self.model = model
+        self.executor = executor or QueryExecutor()
+        self.groq = groq or GroqClient()
+        self.builder = builder or SQLPromptBuilder(self.executor.db.catalog())
+        if loaded:
+            # Evaluate the fixed prompt prefix now rather than on the first question
+            model.prime_sql_prefix(self.builder.prefix())
+            if CONSTRAINED_SQL_DECODING:
+                model.constrain_sql(SQLGrammar(self.builder.catalog))
+        self.formatter = formatter or ResponseFormatter(self.groq)
+        self.max_rows = max_rows
+        self.templates = QuestionTemplates(self.builder.catalog) if use_templates else None
+        self.router = IntentRouter(self.builder.catalog) if use_router else None
+    
+    def generate_sql(self, question: str) -> str:
+        return self.fast_sql(question) or self.model_sql(question)
+    
+    def fast_sql(self, question: str) -> Optional[str]:
+        # SQL without the model: from the intent router, or an answered question of the
+        # same shape with this question's slot values
+        if self.router is not None:
+            sql = self.router.route(question)
+            if sql is not None:
+                return sql
+        if self.templates is None:
+            return None
+        return self.templates.sql_for(question)
+    
+    def model_sql(self, question: str) -> str:
+        return self.builder.extract_sql(self.model.generate_sql(self.builder.build_prompt(question)))
+    
+    def record(self, question: str, sql: str, success: bool, message: str) -> None:
+        # SQL that ran first time becomes its question's template; a template whose SQL
+        # needed fixing is dropped
+        if self.templates is not None:
+            self.templates.record(question, sql, success and message.startswith("Success"))
+    
+    def execute(self, sql: str, question: str, regenerate_fn) -> tuple:
+        return self.executor.execute(sql, question, regenerate_fn, max_rows=self.max_rows)
+    
+    def answer(self, question: str) -> dict:
+        # Answer one question, blocking until done
+        sql = self.generate_sql(question)
+        success, result, message = self.execute(
+            sql, question, lambda q, error: self.groq.fix_sql(q, sql, error)
+        )
+        self.record(question, sql, success, message)
+        answer = self.formatter.format_result(question, sql, result) if success else message
+        return _answer(question, sql, success, result, message, answer)
+
+
+class AsyncQueryPipeline:
+    # asyncio front end for a QueryPipeline. Local model inference and DuckDB run in
+    # bounded thread pools, Groq calls use the non-blocking client, and at most
+    # max_in_flight questions are worked on at once (the rest wait their turn).
+    
+    def __init__(
+        self,
+        pipeline: Optional[QueryPipeline] = None,
+        inference_workers: int = PIPELINE_INFERENCE_WORKERS,
+        query_workers: int = PIPELINE_QUERY_WORKERS,
+        max_in_flight: int = PIPELINE_MAX_IN_FLIGHT,
+        groq_concurrency: int = GROQ_MAX_CONCURRENCY
+    ):
+        self.pipeline = pipeline or QueryPipeline()
+        self._inference = ThreadPoolExecutor(inference_workers, thread_name_prefix="pipeline-inference")
+        self._queries = ThreadPoolExecutor(query_workers, thread_name_prefix="pipeline-query")
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._groq_slots = asyncio.Semaphore(groq_concurrency)
+    
+    async def _groq(self, call):
+        async with self._groq_slots:
+            return await call
+    
+    async def answer(self, question: str) -> dict:
+        # Answer one question without blocking the event loop
+        pipeline = self.pipeline
+        loop = asyncio.get_running_loop()
+        async with self._in_flight:
+            # Routed and template questions skip the queue for the model
+            sql = pipeline.fast_sql(question)
+            if sql is None:
+                sql = await loop.run_in_executor(self._inference, pipeline.model_sql, question)
+            
+            def regenerate(q, error):
+                # Called on a query thread, which waits while the fix request runs on the loop
+                fix = self._groq(pipeline.groq.afix_sql(q, sql, error))
+                return asyncio.run_coroutine_threadsafe(fix, loop).result()
+            
+            success, result, message = await loop.run_in_executor(
+                self._queries, pipeline.execute, sql, question, regenerate
+            )
+            pipeline.record(question, sql, success, message)
+            if success:
+                answer = await self._groq(pipeline.formatter.aformat_result(question, sql, result))
+            else:
+                answer = message
+        return _answer(question, sql, success, result, message, answer)
+    
+    async def answer_many(self, questions: list) -> list:
+        # Answers in question order; a failing question raises like answer() would
+        return await asyncio.gather(*(self.answer(question) for question in questions))
+    
+    def close(self) -> None:
+        self._inference.shutdown(wait=True)
+        self._queries.shutdown(wait=True)
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,148 @@
+# Per-query DuckDB profiles (JSON profiler) and the slow-query log they feed
+
+import json
+import os
+import tempfile
+import threading
+import time
+import duckdb
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+from src.result_cache import fingerprint
+
+# Plan details worth keeping per operator (the rest is noise for tuning)
+EXTRA_INFO_KEYS = ("Function", "Table", "Filters", "File Filters", "Scanning Files", "Groups", "Aggregates",
+                   "Join Type", "Conditions", "Order By")
+
+
+def _operators(node: dict, depth: int = 0) -> Iterator[dict]:
+    # Flatten the profile tree (pre-order), one entry per physical operator
+    for child in node.get("children", []):
+        info = child.get("extra_info") or {}
+        yield {
+            "operator": child.get("operator_type") or child.get("operator_name", "").strip(),
+            "depth": depth,
+            "seconds": child.get("operator_timing", 0.0),
+            "rows_scanned": child.get("operator_rows_scanned", 0),
+            "rows_out": child.get("operator_cardinality", 0),
+            **{key: info[key] for key in EXTRA_INFO_KEYS if key in info},
+        }
+        yield from _operators(child, depth + 1)
+
+
+def summarize(profile: dict) -> dict:
+    # Query-level totals plus per-operator timings from a JSON profile
+    return {
+        "latency": profile.get("latency"),
+        "cpu_time": profile.get("cpu_time"),
+        "rows_scanned": profile.get("cumulative_rows_scanned"),
+        "rows_returned": profile.get("rows_returned"),
+        "operators": list(_operators(profile)),
+    }
+
+
+class MemorySampler:
+    # Polls DuckDB's buffer manager on its own cursor while a query runs. The 1.1
+    # profiler does not report peak memory, so this is the highest sampled value.
+    
+    def __init__(self, conn: duckdb.DuckDBPyConnection, interval: float = 0.01):
+        self.conn = conn
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _sample(self, cursor: duckdb.DuckDBPyConnection) -> None:
+        used = cursor.execute("SELECT SUM(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0]
+        self.peak_bytes = max(self.peak_bytes, int(used or 0))
+    
+    def _run(self, cursor: duckdb.DuckDBPyConnection) -> None:
+        try:
+            while not self._stop.wait(self.interval):
+                self._sample(cursor)
+        finally:
+            cursor.close()
+    
+    def __enter__(self) -> "MemorySampler":
+        cursor = self.conn.cursor()
+        self._sample(cursor)
+        self._thread = threading.Thread(target=self._run, args=(cursor,), name="duckdb-memory", daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+
+
+@contextmanager
+def profiled(cursor: duckdb.DuckDBPyConnection) -> Iterator[dict]:
+    # Enable the JSON profiler on cursor for the block; the yielded dict receives
+    # the raw profile once the block exits
+    fd, path = tempfile.mkstemp(prefix="duckdb-profile-", suffix=".json")
+    os.close(fd)
+    capture = {}
+    try:
+        cursor.execute(f"PRAGMA profiling_output = '{path}'")
+        cursor.execute("PRAGMA enable_profiling = 'json'")
+        try:
+            yield capture
+        finally:
+            # Pooled cursors are reused, so always switch the profiler back off
+            cursor.execute("PRAGMA disable_profiling")
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        if text:
+            capture.update(json.loads(text))
+    finally:
+        os.unlink(path)
+
+
+class SlowQueryLog:
+    # JSON-lines log of profiled queries that ran longer than a threshold
+    
+    def __init__(self, path: Path, threshold: float):
+        self.path = Path(path)
+        self.threshold = threshold
+        self._lock = threading.Lock()
+    
+    def run(
+        self,
+        conn: duckdb.DuckDBPyConnection,
+        cursor: duckdb.DuckDBPyConnection,
+        sql: str,
+        fn: Callable[[duckdb.DuckDBPyConnection], Any],
+        question: Optional[str] = None
+    ) -> Any:
+        # Run fn(cursor) under the profiler and log it if it was slow
+        with MemorySampler(conn) as memory:
+            start = time.perf_counter()
+            with profiled(cursor) as profile:
+                result = fn(cursor)
+            elapsed = time.perf_counter() - start
+        
+        if elapsed >= self.threshold:
+            self.record({
+                "timestamp": datetime.now().isoformat(),
+                "question": question,
+                "fingerprint": fingerprint(sql),
+                "sql": sql,
+                "elapsed_time": round(elapsed, 4),
+                "peak_memory_bytes": memory.peak_bytes,
+                **summarize(profile),
+            })
+        return result
+    
+    def record(self, entry: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, default=str) + '\n')
+    
+    def read(self) -> list:
+        if not self.path.exists():
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
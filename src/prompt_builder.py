@@ -1,16 +1,59 @@
 # SQL prompt builder for question-to-SQL conversion
 
 from pathlib import Path
+from config.settings import CATALOG_TOP_COUNTRIES, CATALOG_TOP_TERMS
+
+# Starts the per-question part of the prompt; everything before it is the same for every
+# question, so the SQL model keeps it evaluated (see ModelLoader.generate_sql)
+QUESTION_MARKER = "User Question: "
 
 class SQLPromptBuilder:
-    def __init__(self):
-        prompt_path = Path(__file__).parent.parent / "prompts" / "sql_generation.txt"
-        with open(prompt_path, 'r', encoding='utf-8') as f:
-            self.base_prompt = f.read()
+    def __init__(self, catalog=None):
+        self.prompt_path = Path(__file__).parent.parent / "prompts" / "sql_generation.txt"
+        self._prompt_mtime = None
+        self._load_prompt()
+        # Optional ValueCatalog: lists real values in the prompt and checks literals
+        self.catalog = catalog
+        self.values_section = self._values_section() if catalog else ""
+    
+    def _load_prompt(self):
+        # (Re)read the prompt file when it changed since it was last read
+        mtime = self.prompt_path.stat().st_mtime_ns
+        if mtime != self._prompt_mtime:
+            with open(self.prompt_path, 'r', encoding='utf-8') as f:
+                self.base_prompt = f.read()
+            self._prompt_mtime = mtime
+    
+    def _values_section(self):
+        # Compact list of values present in the data, most frequent first
+        years = sorted(self.catalog.values.get("year", {}), key=int)
+        units = self.catalog.common("Unit")
+        countries = self.catalog.common("Country", CATALOG_TOP_COUNTRIES)
+        terms = [term for term, _ in self.catalog.top_terms(CATALOG_TOP_TERMS)]
+        return (
+            "VALUES IN DATA:\n"
+            f"Years: {', '.join(years)}\n"
+            f"Units: {', '.join(units)}\n"
+            f"Top countries: {', '.join(countries)}\n"
+            f"Common description words: {', '.join(terms)}"
+        )
+    
+    def prefix(self):
+        # Prompt text before the question (picks up edits to the prompt file)
+        self._load_prompt()
+        if self.values_section:
+            return f"{self.base_prompt}\n\n{self.values_section}\n\n"
+        return f"{self.base_prompt}\n\n"
     
     def build_prompt(self, question):
         # Build complete prompt with user question
-        return f"{self.base_prompt}\n\nUser Question: {question}\n\nSQL:"
+        return f"{self.prefix()}{QUESTION_MARKER}{question}\n\nSQL:"
+    
+    def check_literals(self, sql):
+        # Filters in sql on values the data does not contain (needs a catalog)
+        if self.catalog is None:
+            return []
+        return self.catalog.check(sql)
     
     def extract_sql(self, response):
         # Extract SQL from model response
@@ -41,4 +84,3 @@ class SQLPromptBuilder:
             sql += ';'
         
         return sql
-
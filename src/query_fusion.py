@@ -0,0 +1,180 @@
+# Answer a batch of aggregate queries over trade from one shared scan. The scan groups
+# the rows any query wants by every column the queries filter or group on (a rollup
+# built just for the batch); each query is then rewritten onto that small table, with
+# its WHERE clause acting as a filter over the pre-aggregated groups.
+
+import json
+import duckdb
+from config.settings import TABLE_NAME
+from src import sql_ast
+from src.rollups import AGGREGATES, MEASURES, NotRoutable, reads_trade_table, rollup_rewrite, rollup_sql
+from src.schema import TRADE_COLUMNS
+
+# Temporary table holding the batch rollup while the batch runs
+BATCH_TABLE = "trade_batch"
+
+COLUMN_NAMES = {column.lower(): column for column in TRADE_COLUMNS}
+MEASURE_NAMES = {measure.lower(): measure for measure in MEASURES}
+
+
+class NotFusable(Exception):
+    pass
+
+
+def _is_aggregate(expr: dict) -> bool:
+    return expr.get("class") == "FUNCTION" and expr["function_name"].lower() in AGGREGATES
+
+
+def _shape(value) -> str:
+    # Expression identity, ignoring source positions
+    def strip(item):
+        if isinstance(item, dict):
+            return {key: strip(child) for key, child in item.items() if key != "query_location"}
+        if isinstance(item, list):
+            return [strip(child) for child in item]
+        return item
+    return json.dumps(strip(value), sort_keys=True)
+
+
+class FusionMember:
+    # One query of a batch: the columns it needs as dimensions and the measures it aggregates
+    
+    def __init__(self, index: int, sql: str):
+        self.index = index
+        self.sql = sql
+        node = sql_ast.parse_select(sql)
+        if node is None or not reads_trade_table(node) or node["from_table"].get("alias"):
+            raise NotFusable()
+        self.node = node
+        self.dimensions, self.measures = set(), set()
+        self._collect([node["select_list"], node.get("where_clause"), node.get("group_expressions"),
+                       node.get("having"), node.get("modifiers")])
+        if not any(_is_aggregate(expr) for expr in sql_ast.walk(node["select_list"])):
+            # Row listings and DISTINCT projections need the base rows
+            raise NotFusable()
+        self.routed_sql = None
+    
+    def _collect(self, value) -> None:
+        def visit(expr):
+            if _is_aggregate(expr):
+                for inner in sql_ast.walk([expr.get("children"), expr.get("filter")]):
+                    name = (sql_ast.column_name(inner) or "").lower()
+                    if name in MEASURE_NAMES:
+                        self.measures.add(MEASURE_NAMES[name])
+                    elif name in COLUMN_NAMES:
+                        self.dimensions.add(COLUMN_NAMES[name])
+                return expr
+            if expr.get("class") in ("SUBQUERY", "WINDOW"):
+                raise NotFusable()
+            name = (sql_ast.column_name(expr) or "").lower()
+            if name in MEASURE_NAMES:
+                # Filters and keys on measures would make every row its own group
+                raise NotFusable()
+            if name in COLUMN_NAMES:
+                self.dimensions.add(COLUMN_NAMES[name])
+            return None
+        sql_ast.transform(value, visit)
+    
+    @property
+    def where(self) -> list:
+        return sql_ast.conjuncts(self.node.get("where_clause"))
+
+
+class FusedBatch:
+    # Queries answered together from one rollup over the union of their dimensions
+    
+    def __init__(self, member: FusionMember):
+        self.members = [member]
+        self.dimensions = set(member.dimensions)
+    
+    @property
+    def indexes(self) -> list:
+        return [member.index for member in self.members]
+    
+    @property
+    def member_sqls(self) -> list:
+        return [member.routed_sql for member in self.members]
+    
+    def shared_sql(self) -> str:
+        # The batch rollup, restricted to rows at least one member keeps. Conditions
+        # every member has are applied as they are; the rest are OR-ed together.
+        measures = tuple(m for m in MEASURES if any(m in member.measures for member in self.members))
+        node = sql_ast.parse_select(rollup_sql(tuple(sorted(self.dimensions)), TABLE_NAME, "", measures))
+        
+        shapes = [{_shape(term): term for term in member.where} for member in self.members]
+        common = [term for key, term in shapes[0].items() if all(key in other for other in shapes[1:])]
+        residuals = [
+            sql_ast.make_and([term for key, term in member.items() if key not in {_shape(c) for c in common}])
+            for member in shapes
+        ]
+        terms = list(common)
+        if all(residual is not None for residual in residuals):
+            terms.append({"class": "CONJUNCTION", "type": "CONJUNCTION_OR", "alias": "", "children": residuals}
+                         if len(residuals) > 1 else residuals[0])
+        node["where_clause"] = sql_ast.make_and(terms)
+        return sql_ast.render(node)
+
+
+class QueryFuser:
+    # Groups prepared SQL into batches that can share one scan of trade
+    
+    def __init__(self, db, max_queries: int = 16):
+        self.db = db
+        self.max_queries = max_queries
+    
+    def plan(self, queries: list) -> list:
+        # queries: (index, prepared sql) pairs. Returns batches of two or more verified
+        # queries; anything else is left to run on its own.
+        members = []
+        for index, sql in queries:
+            try:
+                members.append(FusionMember(index, sql))
+            except NotFusable:
+                continue
+        
+        # Widest dimension sets first, so narrower queries can join a batch that covers them
+        batches = []
+        for member in sorted(members, key=lambda m: -len(m.dimensions)):
+            batch = next((b for b in batches
+                          if member.dimensions <= b.dimensions and len(b.members) < self.max_queries), None)
+            if batch is None:
+                batches.append(FusedBatch(member))
+            else:
+                batch.members.append(member)
+        
+        verified = []
+        for batch in batches:
+            if len(batch.members) < 2:
+                continue
+            batch.members = self._verified(batch)
+            if len(batch.members) >= 2:
+                batch.members.sort(key=lambda m: m.index)
+                verified.append(batch)
+        return verified
+    
+    def _verified(self, batch: FusedBatch) -> list:
+        # Members whose query over the batch rollup binds to the same columns and types
+        dimensions = tuple(sorted(batch.dimensions))
+        cursor = self.db.cursor()
+        try:
+            cursor.execute(f"CREATE TEMP VIEW {BATCH_TABLE} AS {batch.shared_sql()}")
+            kept = []
+            for member in batch.members:
+                try:
+                    rewritten = rollup_rewrite(member.node, BATCH_TABLE, dimensions)
+                    original = cursor.execute(f"DESCRIBE {member.sql.rstrip().rstrip(';')}").fetchall()
+                    for item, (name, *_rest) in zip(rewritten["select_list"], original):
+                        if not item.get("alias"):
+                            item["alias"] = name
+                    routed_sql = sql_ast.render(rewritten)
+                    routed = cursor.execute(f"DESCRIBE {routed_sql}").fetchall()
+                except (NotRoutable, duckdb.Error):
+                    continue
+                if [row[:2] for row in routed] == [row[:2] for row in original]:
+                    member.routed_sql = routed_sql
+                    kept.append(member)
+            return kept
+        except duckdb.Error:
+            return []
+        finally:
+            cursor.close()
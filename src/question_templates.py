@@ -0,0 +1,231 @@
+# Question-template cache in front of the SQL model. Questions that differ only in their
+# entity slots (country, year, Nepali month, trade direction, commodity word), such as
+# "Imports from India in 2080?" and "Imports from China in 2081?", share a template; once
+# SQL generated for one of them has run successfully, the others get that SQL with their
+# own slot values in place of its literals, without a model call.
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+from config.settings import QUESTION_TEMPLATE_MAX
+from config.country_codes import COUNTRY_MAPPINGS
+from src.catalog import STOP_WORDS
+
+# Nepali (Bikram Sambat) month names and common spellings -> Month
+NEPALI_MONTHS = {
+    'baishakh': 1, 'baisakh': 1, 'baishak': 1,
+    'jestha': 2, 'jeth': 2,
+    'asar': 3, 'ashadh': 3, 'asadh': 3,
+    'shrawan': 4, 'saun': 4, 'sawan': 4, 'srawan': 4,
+    'bhadra': 5, 'bhadau': 5,
+    'ashoj': 6, 'asoj': 6, 'ashwin': 6,
+    'kartik': 7,
+    'mangsir': 8, 'mangshir': 8,
+    'poush': 9, 'paush': 9,
+    'magh': 10,
+    'falgun': 11, 'phagun': 11,
+    'chaitra': 12, 'chait': 12,
+}
+
+# Column whose literals each slot kind fills
+SLOT_COLUMNS = {
+    "country": "country",
+    "year": "year",
+    "month": "month",
+    "direction": "direction",
+    "commodity": "description",
+}
+
+COUNTRY_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(name) for name in sorted(COUNTRY_MAPPINGS, key=len, reverse=True)) + r")\b"
+)
+MONTH_PATTERN = re.compile(r"\b(" + "|".join(sorted(NEPALI_MONTHS, key=len, reverse=True)) + r")\b")
+YEAR_PATTERN = re.compile(r"\b(20\d\d)\b")
+# Only the stem is a slot, so "imports" and "imported" keep distinct templates
+DIRECTION_PATTERN = re.compile(r"\b(import|export)(?:s|ed|ing|ers?)?\b")
+WORD_PATTERN = re.compile(r"\b[a-z]+\b")
+
+# (kind, pattern, slot value of the matched word)
+SLOT_PATTERNS = (
+    ("country", COUNTRY_PATTERN, COUNTRY_MAPPINGS.get),
+    ("month", MONTH_PATTERN, lambda word: str(NEPALI_MONTHS[word])),
+    ("year", YEAR_PATTERN, str),
+    ("direction", DIRECTION_PATTERN, lambda word: word[0].upper()),
+)
+
+SQL_TOKEN = re.compile(r"'(?:[^']|'')*'|\d+(?:\.\d+)?|[A-Za-z_][A-Za-z_0-9]*|<>|!=|<=|>=|\S")
+# Tokens between a column and the literals compared with it
+COMPARISON_TOKENS = {"=", "<>", "!=", "<", ">", "<=", ">=", "(", ")", ",",
+                     "in", "not", "between", "and", "like", "ilike"}
+
+
+def commodity_words(catalog) -> set:
+    # Description words a question can name a commodity by (none without a catalog)
+    if catalog is None:
+        return set()
+    return {word for word in catalog.terms if word.isalpha() and len(word) > 2 and word not in STOP_WORDS}
+
+
+def question_slots(question: str, commodities: set) -> tuple:
+    # (template, [(kind, value)]) with slots numbered in question order
+    text = question.lower()
+    found = []
+    
+    def free(start, end):
+        return not any(start < other_end and other_start < end for other_start, other_end, _, _ in found)
+    
+    for kind, pattern, value in SLOT_PATTERNS:
+        for match in pattern.finditer(text):
+            if free(*match.span(1)):
+                found.append((*match.span(1), kind, value(match.group(1))))
+    for match in WORD_PATTERN.finditer(text):
+        if match.group() in commodities and free(*match.span()):
+            found.append((*match.span(), "commodity", match.group()))
+    
+    found.sort()
+    parts, position = [], 0
+    for start, end, kind, _ in found:
+        parts.append(text[position:start])
+        parts.append("{" + kind + "}")
+        position = end
+    parts.append(text[position:])
+    template = " ".join("".join(parts).split()).rstrip("?.! ")
+    return template, [(kind, value) for _, _, kind, value in found]
+
+
+def _column_before(tokens: list, index: int) -> Optional[str]:
+    # Column a literal at tokens[index] is compared with: the nearest name before it,
+    # skipping operators, brackets and the other literals of an IN list or BETWEEN
+    for position in range(index - 1, -1, -1):
+        token = tokens[position]
+        lowered = token.lower()
+        if lowered in COMPARISON_TOKENS or token[0] == "'" or token[0].isdigit():
+            continue
+        return lowered if token[0].isalpha() or token[0] == "_" else None
+    return None
+
+
+class QuestionTemplates:
+    # LRU map of question template -> SQL skeleton. A skeleton is the learned SQL split
+    # at the literals its slots filled; slots that matched no literal must have the
+    # learned value for the skeleton to apply. Direction, country, year and month fill
+    # exact literals; a commodity word fills its place inside a LIKE pattern.
+    
+    def __init__(self, catalog=None, max_templates: int = QUESTION_TEMPLATE_MAX):
+        self.commodities = commodity_words(catalog)
+        self.max_templates = max_templates
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self.dropped = 0
+    
+    def template(self, question: str) -> tuple:
+        # (template, [(kind, value)]) of question
+        return question_slots(question, self.commodities)
+    
+    def sql_for(self, question: str) -> Optional[str]:
+        # SQL for question from its template's skeleton, or None
+        template, slots = self.template(question)
+        with self._lock:
+            entry = self._templates.get(template)
+            sql = self._render(entry, slots) if entry is not None else None
+            if sql is None:
+                self.misses += 1
+                return None
+            self._templates.move_to_end(template)
+            self.hits += 1
+            return sql
+    
+    def learn(self, question: str, sql: str) -> bool:
+        # Keep sql as the skeleton of question's template; False if its literals do not
+        # map unambiguously onto the question's slots
+        template, slots = self.template(question)
+        skeleton = self._skeleton(sql, slots)
+        if skeleton is None:
+            return False
+        with self._lock:
+            if self._templates.get(template) != skeleton:
+                self.learned += 1
+            self._templates[template] = skeleton
+            self._templates.move_to_end(template)
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+        return True
+    
+    def record(self, question: str, sql: str, validated: bool) -> None:
+        # Outcome of running sql for question: validated SQL becomes the template's
+        # skeleton; a skeleton whose SQL did not validate is dropped
+        if validated:
+            self.learn(question, sql)
+            return
+        template, slots = self.template(question)
+        with self._lock:
+            entry = self._templates.get(template)
+            if entry is not None and self._render(entry, slots) == sql:
+                del self._templates[template]
+                self.dropped += 1
+    
+    def _skeleton(self, sql: str, slots: list) -> Optional[tuple]:
+        # (pieces, fixed): SQL text pieces and (slot, before, after) literal holes, and
+        # the values of slots no literal took
+        tokens, spans = [], []
+        for match in SQL_TOKEN.finditer(sql):
+            tokens.append(match.group())
+            spans.append(match.span())
+        
+        holes = []
+        for index, token in enumerate(tokens):
+            if token[0] != "'" and not token.isdigit():
+                continue
+            column = _column_before(tokens, index)
+            literal = token[1:-1].lower() if token[0] == "'" else token
+            owners = []
+            for slot, (kind, value) in enumerate(slots):
+                if SLOT_COLUMNS[kind] != column:
+                    continue
+                if kind == "commodity":
+                    at = literal.find(value)
+                    if at >= 0:
+                        owners.append((slot, token[:1 + at], token[1 + at + len(value):]))
+                elif literal == value.lower():
+                    quote = "'" if token[0] == "'" else ""
+                    owners.append((slot, quote, quote))
+            if len(owners) > 1:
+                # Two slots with the same value: which one the literal came from is unknown
+                return None
+            if owners:
+                holes.append((spans[index], owners[0]))
+        
+        pieces, position = [], 0
+        for (start, end), hole in holes:
+            pieces.append(sql[position:start])
+            pieces.append(hole)
+            position = end
+        pieces.append(sql[position:])
+        taken = {hole[0] for _, hole in holes}
+        fixed = tuple((slot, value) for slot, (_, value) in enumerate(slots) if slot not in taken)
+        return tuple(pieces), fixed
+    
+    @staticmethod
+    def _render(entry: tuple, slots: list) -> Optional[str]:
+        pieces, fixed = entry
+        if any(slots[slot][1] != value for slot, value in fixed):
+            return None
+        return "".join(piece if isinstance(piece, str) else piece[1] + slots[piece[0]][1] + piece[2]
+                       for piece in pieces)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "templates": len(self._templates),
+                "max_templates": self.max_templates,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "learned": self.learned,
+                "dropped": self.dropped,
+            }
@@ -0,0 +1,146 @@
+# Query result cache keyed on a normalised SQL fingerprint
+
+import hashlib
+import json
+import threading
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Optional
+from src import sql_ast
+from src.rollups import VOLATILE_FUNCTIONS
+
+# Results that depend on when the query runs, not only on the data
+TIME_FUNCTIONS = {"now", "today", "current_date", "current_time", "current_timestamp",
+                  "get_current_time", "get_current_timestamp", "transaction_timestamp"}
+
+
+def _normalise(value: Any) -> Any:
+    # Drop source positions and put IN-list literals in a canonical order
+    if isinstance(value, dict):
+        node = {key: _normalise(child) for key, child in value.items() if key != "query_location"}
+        if node.get("type") in ("COMPARE_IN", "COMPARE_NOT_IN") and node.get("children"):
+            first, rest = node["children"][0], node["children"][1:]
+            if all(sql_ast.is_constant(child) for child in rest):
+                rest = sorted(rest, key=lambda child: json.dumps(child, sort_keys=True))
+                node["children"] = [first] + rest
+        return node
+    if isinstance(value, list):
+        return [_normalise(child) for child in value]
+    return value
+
+
+def _unseeded_sample(value: Any) -> bool:
+    # USING SAMPLE without REPEATABLE draws different rows on every run
+    if isinstance(value, dict):
+        sample = value.get("sample")
+        if isinstance(sample, dict) and sample.get("seed", -1) == -1:
+            return True
+        return any(_unseeded_sample(child) for child in value.values())
+    if isinstance(value, list):
+        return any(_unseeded_sample(child) for child in value)
+    return False
+
+
+def _volatile(statements: list) -> bool:
+    if _unseeded_sample(statements):
+        return True
+    for expr in sql_ast.walk(statements):
+        if expr.get("class") == "FUNCTION":
+            name = expr["function_name"].lower()
+        elif expr.get("class") == "COLUMN_REF":
+            name = sql_ast.column_name(expr).lower()
+        else:
+            continue
+        if name in VOLATILE_FUNCTIONS or name in TIME_FUNCTIONS:
+            return True
+    return False
+
+
+def fingerprint(sql: str) -> Optional[str]:
+    # Hash of the parsed statement, so whitespace, keyword case, comments, trailing
+    # semicolons and IN-list order do not matter. None if the SQL does not parse
+    # or its result can change without the data changing (random(), now(),
+    # unseeded samples, ...).
+    statements = sql_ast.parse_statements(sql)
+    if not statements or _volatile(statements):
+        return None
+    canonical = json.dumps(_normalise(statements), sort_keys=True)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def frame_size(frame: pd.DataFrame) -> int:
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+class ResultCache:
+    # LRU cache of query results within a memory budget, dropped when the data version changes
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.version = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, key: Optional[str], version: Any) -> Optional[pd.DataFrame]:
+        # Cached result (a copy) for key under the current data version
+        if key is None:
+            return None
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0].copy()
+    
+    def put(self, key: Optional[str], version: Any, frame: pd.DataFrame) -> None:
+        if key is None:
+            return
+        size = frame_size(frame)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (frame.copy(), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def _check_version(self, version: Any) -> None:
+        # Results computed from other data are stale (caller holds the lock)
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self.version = version
+    
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,322 @@
+# Pre-aggregated rollups of the trade table and a router that answers queries from them
+
+import duckdb
+import threading
+from collections import OrderedDict
+from typing import Optional
+from config.settings import TABLE_NAME
+from src import sql_ast
+from src.schema import hs_prefix_level
+
+# Rollup table -> grouping dimensions
+ROLLUPS = {
+    "trade_rollup_hs": ("HS2", "HS4", "Year", "Direction"),
+    "trade_rollup_ymdc": ("Year", "Month", "Direction", "Country"),
+}
+
+# Measures pre-aggregated in every rollup
+MEASURES = ("Value", "Quantity", "Revenue")
+
+TRADE_COLUMNS = {"year", "month", "direction", "hs_code", "hs2", "hs4", "hs6", "description", "country",
+                 "value", "quantity", "unit", "revenue"}
+
+# Expressions that give a different answer per base row than per rollup row
+VOLATILE_FUNCTIONS = {"random", "uuid", "gen_random_uuid", "setseed", "nextval"}
+
+AGGREGATES = {
+    "sum", "count", "count_star", "avg", "mean", "min", "max", "first", "last",
+    "any_value", "arg_min", "arg_max", "median", "mode", "quantile", "quantile_cont",
+    "quantile_disc", "stddev", "stddev_pop", "stddev_samp", "variance", "var_pop",
+    "var_samp", "string_agg", "group_concat", "list", "array_agg", "histogram",
+    "approx_count_distinct", "bool_and", "bool_or", "product", "fsum", "sumkahan",
+    "kahan_sum", "bit_and", "bit_or", "bit_xor", "entropy", "kurtosis", "skewness",
+}
+
+
+def rollup_sql(dimensions: tuple, source: str, where: str = "", measures: tuple = MEASURES) -> str:
+    # Rollup of source over dimensions: row_count plus sum/count/min/max per measure
+    measure_sql = []
+    for measure in measures:
+        name = measure.lower()
+        measure_sql.append(
+            f"SUM({measure}) AS {name}_sum, COUNT({measure}) AS {name}_count, "
+            f"MIN({measure}) AS {name}_min, MAX({measure}) AS {name}_max"
+        )
+    columns = [*dimensions, "COUNT(*) AS row_count", *measure_sql]
+    return f"""
+        SELECT {", ".join(columns)}
+        FROM {source}
+        {where}
+        GROUP BY ALL
+    """
+
+
+def build_rollups(conn: duckdb.DuckDBPyConnection, source: str = TABLE_NAME) -> None:
+    # (Re)create every rollup table from the trade table
+    for table, dimensions in ROLLUPS.items():
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"CREATE TABLE {table} AS {rollup_sql(dimensions, source)}")
+
+
+def refresh_rollups(conn: duckdb.DuckDBPyConnection, year: int, month: int, source: str = TABLE_NAME) -> None:
+    # Recompute only the rollup rows fed by one (Year, Month) partition. Rollups
+    # without a Month dimension redo that whole year, which is still a small slice.
+    for table, dimensions in ROLLUPS.items():
+        keys = {"Year": year, "Month": month}
+        keys = {column: keys[column] for column in ("Year", "Month") if column in dimensions}
+        where = " AND ".join(f"{column} = {int(value)}" for column, value in keys.items())
+        where = f"WHERE {where}" if where else ""
+        conn.execute(f"DELETE FROM {table} {where}")
+        conn.execute(f"INSERT INTO {table} {rollup_sql(dimensions, source, where)}")
+
+
+class NotRoutable(Exception):
+    # Query needs base rows that the rollup does not keep
+    pass
+
+
+def reads_trade_table(node: dict) -> bool:
+    # Plain single-table SELECT over trade (no CTEs, sampling, QUALIFY or grouping sets)
+    from_table = node.get("from_table") or {}
+    return (
+        from_table.get("type") == "BASE_TABLE"
+        and from_table.get("table_name", "").lower() == TABLE_NAME
+        and not from_table.get("schema_name")
+        and not from_table.get("catalog_name")
+        and not from_table.get("sample")
+        and not node.get("cte_map", {}).get("map")
+        and node.get("sample") is None
+        and node.get("qualify") is None
+        and len(node.get("group_sets") or []) <= 1
+    )
+
+
+def rollup_rewrite(node: dict, table: str, dimensions: tuple) -> dict:
+    # node rewritten to read table, a rollup over dimensions (raises NotRoutable)
+    return _RollupRewrite(node, table, dimensions).run()
+
+
+class RollupRouter:
+    # Rewrites aggregate queries over trade to an equivalent rollup query
+    
+    def __init__(self, db, cache_size: int = 512):
+        self.db = db
+        self._order = None
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+    
+    def _rollup_order(self) -> list:
+        # Smallest rollup first, skipping any that are not loaded
+        if self._order is None:
+            cursor = self.db.cursor()
+            try:
+                sizes = []
+                for table in ROLLUPS:
+                    try:
+                        count = cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    except duckdb.Error:
+                        continue
+                    sizes.append((count, table))
+                self._order = [table for _, table in sorted(sizes)]
+            finally:
+                cursor.close()
+        return self._order
+    
+    def route(self, sql: str) -> str:
+        # Return SQL that reads a rollup instead of the base table, or sql unchanged
+        with self._lock:
+            if sql in self._cache:
+                self._cache.move_to_end(sql)
+                return self._cache[sql]
+        
+        routed_sql = self._route(sql)
+        
+        with self._lock:
+            self._cache[sql] = routed_sql
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return routed_sql
+    
+    def _route(self, sql: str) -> str:
+        node = sql_ast.parse_select(sql)
+        if node is None or not reads_trade_table(node):
+            return sql
+        
+        for table in self._rollup_order():
+            try:
+                rewritten = _RollupRewrite(node, table, ROLLUPS[table]).run()
+            except NotRoutable:
+                continue
+            routed_sql = self._verified(sql, node, sql_ast.render(rewritten), rewritten)
+            if routed_sql:
+                return routed_sql
+        return sql
+    
+    def _verified(self, sql: str, node: dict, routed_sql: str, rewritten: dict) -> Optional[str]:
+        # Keep output names, and only accept the rewrite if it binds to the same columns and types
+        cursor = self.db.cursor()
+        try:
+            original = cursor.execute(f"DESCRIBE {sql.rstrip().rstrip(';')}").fetchall()
+            for item, (name, *_rest) in zip(rewritten["select_list"], original):
+                if not item.get("alias"):
+                    item["alias"] = name
+            routed_sql = sql_ast.render(rewritten)
+            routed = cursor.execute(f"DESCRIBE {routed_sql}").fetchall()
+        except duckdb.Error:
+            return None
+        finally:
+            cursor.close()
+        
+        if [row[:2] for row in routed] != [row[:2] for row in original]:
+            return None
+        return routed_sql
+
+
+class _RollupRewrite:
+    # One attempt at mapping a query onto one rollup table
+    
+    def __init__(self, node: dict, table: str, dimensions: tuple):
+        self.node = node
+        self.table = table
+        self.dimensions = {d.lower() for d in dimensions}
+        self.aliases = {
+            item["alias"].lower() for item in node["select_list"] if item.get("alias")
+        }
+    
+    def run(self) -> dict:
+        node = self.node
+        has_aggregate = any(self._is_aggregate(e) for e in sql_ast.walk(node["select_list"]))
+        has_distinct = any(m["type"] == "DISTINCT_MODIFIER" for m in node.get("modifiers", []))
+        if not node.get("group_expressions") and not has_aggregate and not has_distinct:
+            # Plain row projection - one output row per base row
+            raise NotRoutable()
+        
+        rewritten = dict(node)
+        rewritten["where_clause"] = sql_ast.make_and([
+            self._hs_prefix(term) or self._map(term, allow_aggregates=False)
+            for term in sql_ast.conjuncts(node.get("where_clause"))
+        ])
+        rewritten["group_expressions"] = [
+            self._map(expr, allow_aggregates=False) for expr in node.get("group_expressions", [])
+        ]
+        rewritten["select_list"] = [self._map(expr) for expr in node["select_list"]]
+        rewritten["having"] = self._map(node.get("having"))
+        rewritten["modifiers"] = [self._map(m) for m in node.get("modifiers", [])]
+        
+        from_table = dict(node["from_table"])
+        from_table["table_name"] = self.table
+        from_table["alias"] = from_table.get("alias") or TABLE_NAME
+        rewritten["from_table"] = from_table
+        return rewritten
+    
+    def _map(self, value, allow_aggregates: bool = True):
+        def visit(expr):
+            return self._visit(expr, allow_aggregates)
+        return sql_ast.transform(value, visit)
+    
+    @staticmethod
+    def _is_aggregate(expr: dict) -> bool:
+        return expr.get("class") == "FUNCTION" and expr["function_name"].lower() in AGGREGATES
+    
+    def _visit(self, expr: dict, allow_aggregates: bool) -> Optional[dict]:
+        expr_class = expr.get("class")
+        if expr_class in ("SUBQUERY", "WINDOW", "STAR", "LAMBDA", "PARAMETER", "COLUMNS"):
+            raise NotRoutable()
+        if expr_class == "COLUMN_REF":
+            return self._column(expr)
+        if expr_class == "FUNCTION":
+            name = expr["function_name"].lower()
+            if name in VOLATILE_FUNCTIONS:
+                raise NotRoutable()
+            if name in AGGREGATES:
+                if not allow_aggregates:
+                    raise NotRoutable()
+                return self._aggregate(expr)
+            if name == "~~" and self._hs_prefix(expr) is not None:
+                # NULL where the LIKE is false (codes like 'TOTAL') - only a WHERE
+                # conjunct filters both out alike
+                raise NotRoutable()
+        return None
+    
+    def _column(self, expr: dict) -> dict:
+        name = sql_ast.column_name(expr).lower()
+        if name in self.dimensions:
+            return expr
+        if name not in TRADE_COLUMNS and name in self.aliases:
+            return expr
+        raise NotRoutable()
+    
+    def _hs_prefix(self, expr: dict) -> Optional[dict]:
+        # HS_Code LIKE '27%' filters the same rows as HS2 = 27 (and '2709%' as HS4 = 2709)
+        if expr.get("class") != "FUNCTION" or expr["function_name"].lower() != "~~":
+            return None
+        column, pattern = expr["children"][:2]
+        if sql_ast.column_name(column) is None or sql_ast.column_name(column).lower() != "hs_code":
+            return None
+        if len(expr["children"]) != 2:
+            raise NotRoutable()
+        try:
+            prefix = sql_ast.constant_value(pattern)
+        except KeyError:
+            raise NotRoutable()
+        level = hs_prefix_level(prefix) if isinstance(prefix, str) else None
+        if level is None or level[0].lower() not in self.dimensions:
+            raise NotRoutable()
+        return sql_ast.parse_expression(f"{level[0]} = {level[1]}")
+    
+    def _dimension_only(self, value) -> bool:
+        try:
+            self._map(value, allow_aggregates=False)
+            return True
+        except NotRoutable:
+            return False
+    
+    def _aggregate(self, expr: dict) -> dict:
+        name = expr["function_name"].lower()
+        children = expr.get("children", [])
+        if expr.get("order_bys", {}).get("orders"):
+            raise NotRoutable()
+        filter_expr = self._map(expr.get("filter"), allow_aggregates=False)
+        
+        # Duplicate-insensitive aggregates over dimensions see the same values per group
+        if (expr.get("distinct") or name in ("min", "max")) and children and self._dimension_only(children):
+            mapped = dict(expr)
+            mapped["children"] = self._map(children, allow_aggregates=False)
+            mapped["filter"] = filter_expr
+            return mapped
+        
+        if expr.get("distinct"):
+            raise NotRoutable()
+        
+        if name == "count_star" or (name == "count" and not children):
+            return self._with_filter("CAST(COALESCE(SUM(row_count), 0) AS BIGINT)", filter_expr)
+        
+        if len(children) != 1 or children[0].get("class") != "COLUMN_REF":
+            raise NotRoutable()
+        column = sql_ast.column_name(children[0])
+        measure = next((m for m in MEASURES if m.lower() == column.lower()), None)
+        if measure is None:
+            raise NotRoutable()
+        prefix = measure.lower()
+        
+        if name == "sum":
+            return self._with_filter(f"SUM({prefix}_sum)", filter_expr)
+        if name == "count":
+            return self._with_filter(f"CAST(COALESCE(SUM({prefix}_count), 0) AS BIGINT)", filter_expr)
+        if name in ("avg", "mean"):
+            return self._with_filter(f"SUM({prefix}_sum) / NULLIF(SUM({prefix}_count), 0)", filter_expr)
+        if name == "min":
+            return self._with_filter(f"MIN({prefix}_min)", filter_expr)
+        if name == "max":
+            return self._with_filter(f"MAX({prefix}_max)", filter_expr)
+        raise NotRoutable()
+    
+    @staticmethod
+    def _with_filter(expression_sql: str, filter_expr: Optional[dict]) -> dict:
+        mapped = sql_ast.parse_expression(expression_sql)
+        if filter_expr is not None:
+            for inner in sql_ast.walk(mapped):
+                if inner.get("class") == "FUNCTION" and inner["function_name"].lower() in AGGREGATES:
+                    inner["filter"] = filter_expr
+        return mapped
@@ -0,0 +1,162 @@
+# Declared schema for the trade table (replaces read_csv_auto type sniffing)
+
+import re
+import duckdb
+from pathlib import Path
+from typing import Optional
+from config.settings import TABLE_NAME
+
+# Bump when the table layout changes so persisted snapshots are rebuilt
+SCHEMA_VERSION = 5
+
+# Column order and storage types of the trade table
+TRADE_COLUMNS = {
+    'Year': 'SMALLINT',
+    'Month': 'SMALLINT',
+    'Direction': 'direction_t',
+    'HS_Code': 'VARCHAR',
+    'HS2': 'UTINYINT',
+    'HS4': 'USMALLINT',
+    'HS6': 'UINTEGER',
+    'Description': 'VARCHAR',
+    'Country': 'country_t',
+    'Value': 'DOUBLE',
+    'Quantity': 'DOUBLE',
+    'Unit': 'unit_t',
+    'Revenue': 'DOUBLE',
+}
+
+# HS hierarchy columns derived from HS_Code: chapter, heading, subheading.
+# HSn is the first n characters of HS_Code as an integer, NULL unless they are
+# all digits, so HSn = 27 holds exactly when HS_Code LIKE '27%'.
+HS_LEVELS = {'HS2': 2, 'HS4': 4, 'HS6': 6}
+
+# Row order of the stored table - chapter/heading filters read a contiguous range
+TABLE_ORDER = ('HS2', 'HS4', 'HS6', 'Year', 'Month')
+
+# Low-cardinality columns stored as ENUMs built from the values present
+ENUM_COLUMNS = {
+    'Direction': 'direction_t',
+    'Country': 'country_t',
+    'Unit': 'unit_t',
+}
+
+# Types used while parsing the CSV - HS_Code stays text so leading zeros survive
+CSV_TYPES = {
+    column: ('VARCHAR' if column in ENUM_COLUMNS else sql_type)
+    for column, sql_type in TRADE_COLUMNS.items()
+    if column not in HS_LEVELS
+}
+
+# 8-digit codes that lost their leading zero in Excel (7 digits) get it back; other
+# lengths are kept as they are
+HS_CODE_SQL = (
+    "CASE WHEN regexp_full_match(HS_Code, '[0-9]{7}') "
+    "THEN '0' || HS_Code ELSE HS_Code END"
+)
+
+
+def _csv_types_literal() -> str:
+    return "{" + ", ".join(f"'{col}': '{sql_type}'" for col, sql_type in CSV_TYPES.items()) + "}"
+
+
+def read_csv_sql(csv_path: Path) -> str:
+    # SELECT over a CSV in done_des.csv layout with the declared parse types
+    return f"SELECT * FROM read_csv('{csv_path}', header = true, types = {_csv_types_literal()})"
+
+
+def hs_prefix_level(pattern: str) -> Optional[tuple]:
+    # (HS column, value) equivalent to HS_Code LIKE pattern, e.g. '2709%' -> ('HS4', 2709)
+    match = re.fullmatch(r'([0-9]+)%', pattern)
+    if not match:
+        return None
+    digits = match.group(1)
+    column = next((name for name, width in HS_LEVELS.items() if width == len(digits)), None)
+    return (column, int(digits)) if column else None
+
+
+def trade_select_sql(source: str) -> str:
+    # Rows of a parsed done_des.csv-layout table in trade table column order, with
+    # HS_Code normalised and the HS levels derived from it
+    levels = {
+        column: f"CASE WHEN regexp_matches(HS_Code, '^[0-9]{{{width}}}') "
+                f"THEN CAST(left(HS_Code, {width}) AS {TRADE_COLUMNS[column]}) END"
+        for column, width in HS_LEVELS.items()
+    }
+    columns = ", ".join(f"{levels[column]} AS {column}" if column in levels else column for column in TRADE_COLUMNS)
+    return f"""
+        SELECT {columns}
+        FROM (SELECT * REPLACE ({HS_CODE_SQL} AS HS_Code) FROM {source})
+    """
+
+
+def create_trade_table(conn: duckdb.DuckDBPyConnection, csv_path: Path, table: str = TABLE_NAME) -> None:
+    # Parse the CSV with explicit types, then store low-cardinality columns as ENUMs,
+    # derive the HS levels and sort by them
+    staging = f"{table}_staging"
+    
+    conn.execute(f"""
+        CREATE TEMP TABLE {staging} AS
+        {read_csv_sql(csv_path)}
+    """)
+    
+    try:
+        for column, type_name in ENUM_COLUMNS.items():
+            conn.execute(f"DROP TYPE IF EXISTS {type_name}")
+            conn.execute(f"""
+                CREATE TYPE {type_name} AS ENUM (
+                    SELECT DISTINCT {column} FROM {staging}
+                    WHERE {column} IS NOT NULL ORDER BY {column}
+                )
+            """)
+        
+        column_defs = ", ".join(f"{col} {sql_type}" for col, sql_type in TRADE_COLUMNS.items())
+        conn.execute(f"CREATE TABLE {table} ({column_defs})")
+        conn.execute(f"""
+            INSERT INTO {table}
+            {trade_select_sql(staging)}
+            ORDER BY {", ".join(TABLE_ORDER)}
+        """)
+    finally:
+        conn.execute(f"DROP TABLE IF EXISTS {staging}")
+
+
+def _enum_values(conn: duckdb.DuckDBPyConnection, table: str, column: str) -> Optional[list]:
+    # Current members of an ENUM column, None if the column is not an ENUM
+    row = conn.execute("""
+        SELECT data_type FROM duckdb_columns()
+        WHERE table_name = ? AND column_name = ? AND data_type LIKE 'ENUM(%'
+    """, [table, column]).fetchone()
+    if row is None:
+        return None
+    return conn.execute(f"SELECT enum_range(NULL::{row[0]})").fetchone()[0]
+
+
+def widen_enums(conn: duckdb.DuckDBPyConnection, staging: str, tables: list) -> list:
+    # Add values in staging that the ENUM columns of tables do not have yet.
+    # DuckDB cannot add members to a type, so the columns are recast to an
+    # inline ENUM over the sorted union (a rewrite of those columns only).
+    widened = []
+    for column in ENUM_COLUMNS:
+        current = _enum_values(conn, tables[0], column)
+        if current is None:
+            continue
+        incoming = [row[0] for row in conn.execute(f"""
+            SELECT DISTINCT CAST({column} AS VARCHAR) FROM {staging}
+            WHERE {column} IS NOT NULL
+        """).fetchall()]
+        if set(incoming) <= set(current):
+            continue
+        
+        members = ", ".join("'" + value.replace("'", "''") + "'" for value in sorted(set(current) | set(incoming)))
+        for table in tables:
+            if _enum_values(conn, table, column) is not None:
+                conn.execute(f"ALTER TABLE {table} ALTER {column} TYPE ENUM({members})")
+        widened.append(column)
+    return widened
+
+
+def memory_usage_bytes(conn: duckdb.DuckDBPyConnection) -> int:
+    # Bytes currently held by DuckDB's buffer manager
+    result = conn.execute("SELECT SUM(memory_usage_bytes) FROM duckdb_memory()").fetchone()
+    return int(result[0] or 0)
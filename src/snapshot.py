@@ -0,0 +1,154 @@
+# Persistent DuckDB snapshot of done_des.csv, rebuilt only when the CSV changes
+
+import hashlib
+import json
+import os
+import uuid
+import duckdb
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+from config.settings import TABLE_NAME
+from src.schema import SCHEMA_VERSION, create_trade_table
+from src.rollups import build_rollups
+
+
+def file_checksum(path: Path, chunk_size: int = 1 << 20) -> str:
+    # SHA-256 of a file, streamed in chunks
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def temp_path(path: Path, suffix: str) -> Path:
+    # Unique scratch name beside path, so concurrent writers never share one
+    path = Path(path)
+    return path.with_name(f"{path.name}.{os.getpid()}-{uuid.uuid4().hex[:8]}{suffix}")
+
+
+def partitions_dir(snapshot_path: Path) -> Path:
+    # Copies of the month CSVs ingested into a snapshot, replayed when it is rebuilt
+    return Path(snapshot_path).with_suffix('.partitions')
+
+
+def meta_path(snapshot_path: Path) -> Path:
+    # Sidecar JSON describing which CSV the snapshot was built from
+    return Path(snapshot_path).with_suffix('.json')
+
+
+def read_meta(snapshot_path: Path) -> Optional[dict]:
+    # Load snapshot metadata, None if missing or unreadable
+    path = meta_path(snapshot_path)
+    if not path.exists() or not Path(snapshot_path).exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_meta(snapshot_path: Path, meta: dict) -> None:
+    # Replace the metadata sidecar atomically
+    path = meta_path(snapshot_path)
+    tmp_path = temp_path(path, '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def source_stat(csv_path: Path) -> dict:
+    stat = Path(csv_path).stat()
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+
+def build_snapshot(csv_path: Path, snapshot_path: Path, checksum: Optional[str] = None) -> dict:
+    # Convert the CSV into a DuckDB database file and record its source checksum
+    csv_path = Path(csv_path)
+    snapshot_path = Path(snapshot_path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    checksum = checksum or file_checksum(csv_path)
+    previous = read_meta(snapshot_path) or {}
+    
+    # Build beside the target and swap in atomically so readers never see a partial file.
+    # Workers that all found the snapshot stale each build their own file; the last
+    # rename wins, and every build is of the same CSV.
+    tmp_path = temp_path(snapshot_path, '.building')
+    try:
+        conn = duckdb.connect(str(tmp_path))
+        try:
+            create_trade_table(conn, csv_path)
+            build_rollups(conn)
+            partitions = []
+            data_version = checksum
+            if previous.get("partitions"):
+                # Months ingested into the old snapshot stay in the new one.
+                # Imported here: src.ingest builds on this module.
+                from src.ingest import next_data_version, replay_partitions
+                partitions = replay_partitions(conn, previous["partitions"])
+                for partition in partitions:
+                    data_version = next_data_version(data_version, partition)
+            row_count = conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0]
+            conn.execute("CHECKPOINT")
+        finally:
+            conn.close()
+        os.replace(tmp_path, snapshot_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    
+    meta = {
+        "source": str(csv_path),
+        "checksum": checksum,
+        "schema_version": SCHEMA_VERSION,
+        "row_count": row_count,
+        "built_at": datetime.now().isoformat(),
+        **source_stat(csv_path),
+    }
+    if partitions:
+        meta["data_version"] = data_version
+        meta["partitions"] = partitions
+    write_meta(snapshot_path, meta)
+    return meta
+
+
+def ensure_built(csv_path: Path, target: Path, build: Callable[..., dict]) -> dict:
+    # Return metadata of a file (or dataset) derived from the CSV, calling
+    # build(csv_path, target[, checksum]) only if the CSV checksum changed
+    csv_path = Path(csv_path)
+    meta = read_meta(target)
+    
+    if not csv_path.exists():
+        if meta is None:
+            raise FileNotFoundError(f"Trade data not found: {csv_path}")
+        # Deployed with the derived copy only
+        return meta
+    
+    if meta is not None and meta.get("schema_version") != SCHEMA_VERSION:
+        # Built with an older table layout
+        return build(csv_path, target)
+    
+    if meta is not None:
+        # Unchanged size and mtime - skip hashing the CSV
+        stat = source_stat(csv_path)
+        if all(meta.get(key) == value for key, value in stat.items()):
+            return meta
+        
+        checksum = file_checksum(csv_path)
+        if meta.get("checksum") == checksum:
+            # Touched but identical - remember the new stat for next start
+            meta.update(stat)
+            write_meta(target, meta)
+            return meta
+        
+        return build(csv_path, target, checksum)
+    
+    return build(csv_path, target)
+
+
+def ensure_snapshot(csv_path: Path, snapshot_path: Path) -> dict:
+    # Return snapshot metadata, rebuilding only if the CSV checksum changed
+    return ensure_built(csv_path, snapshot_path, build_snapshot)
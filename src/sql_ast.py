@@ -0,0 +1,136 @@
+# SQL syntax trees via DuckDB's own parser (json_serialize_sql / json_deserialize_sql)
+
+import copy
+import json
+import threading
+import duckdb
+from functools import lru_cache
+from typing import Any, Callable, Iterator, Optional
+
+_local = threading.local()
+
+
+def _parser() -> duckdb.DuckDBPyConnection:
+    # Per-thread connection used only for parsing and rendering (no data)
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = duckdb.connect()
+        _local.conn = conn
+    return conn
+
+
+def parse_statements(sql: str) -> Optional[list]:
+    # Parse SQL into DuckDB statement trees, None if it does not parse
+    try:
+        result = _parser().execute("SELECT json_serialize_sql(?::VARCHAR)", [sql]).fetchone()[0]
+    except duckdb.Error:
+        return None
+    tree = json.loads(result)
+    if tree.get("error"):
+        return None
+    return [statement["node"] for statement in tree["statements"]]
+
+
+def parse_select(sql: str) -> Optional[dict]:
+    # Parse a single plain SELECT statement, None for anything else
+    statements = parse_statements(sql)
+    if not statements or len(statements) != 1:
+        return None
+    node = statements[0]
+    if node.get("type") != "SELECT_NODE":
+        return None
+    return node
+
+
+def render(node: dict) -> str:
+    # Turn a statement tree back into SQL text
+    tree = {"error": False, "statements": [{"node": node}]}
+    return _parser().execute("SELECT json_deserialize_sql(json(?))", [json.dumps(tree)]).fetchone()[0]
+
+
+@lru_cache(maxsize=256)
+def _expression_template(expression_sql: str) -> str:
+    node = parse_select(f"SELECT {expression_sql}")
+    if node is None:
+        raise ValueError(f"Cannot parse expression: {expression_sql}")
+    return json.dumps(node["select_list"][0])
+
+
+def parse_expression(expression_sql: str) -> dict:
+    # Expression tree for a SQL snippet (fresh copy each call)
+    return json.loads(_expression_template(expression_sql))
+
+
+def is_expression(value: Any) -> bool:
+    return isinstance(value, dict) and "class" in value
+
+
+def walk(value: Any) -> Iterator[dict]:
+    # Yield every expression node below value (pre-order), including nested queries
+    if is_expression(value):
+        yield value
+    if isinstance(value, dict):
+        for child in value.values():
+            yield from walk(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from walk(child)
+
+
+def transform(value: Any, fn: Callable[[dict], Optional[dict]]) -> Any:
+    # Copy value, replacing each expression for which fn returns a node.
+    # fn returns None to keep descending into the expression's children.
+    if is_expression(value):
+        replacement = fn(value)
+        if replacement is not None:
+            return replacement
+    if isinstance(value, dict):
+        return {key: transform(child, fn) for key, child in value.items()}
+    if isinstance(value, list):
+        return [transform(child, fn) for child in value]
+    return copy.deepcopy(value)
+
+
+def column_name(expr: dict) -> Optional[str]:
+    # Unqualified column name of a column reference
+    if expr.get("class") != "COLUMN_REF":
+        return None
+    return expr["column_names"][-1]
+
+
+def constant_value(expr: dict) -> Any:
+    # Python value of a constant expression (raises KeyError for non-constants)
+    if expr.get("class") != "CONSTANT":
+        raise KeyError("not a constant")
+    value = expr["value"]
+    return None if value.get("is_null") else value.get("value")
+
+
+def is_constant(expr: dict) -> bool:
+    return expr.get("class") == "CONSTANT"
+
+
+def conjuncts(expr: Optional[dict]) -> list:
+    # Flatten an AND tree into its terms
+    if expr is None:
+        return []
+    if expr.get("class") == "CONJUNCTION" and expr.get("type") == "CONJUNCTION_AND":
+        terms = []
+        for child in expr["children"]:
+            terms.extend(conjuncts(child))
+        return terms
+    return [expr]
+
+
+def make_and(terms: list) -> Optional[dict]:
+    # Combine terms with AND (None for no terms)
+    if not terms:
+        return None
+    if len(terms) == 1:
+        return terms[0]
+    return {
+        "class": "CONJUNCTION",
+        "type": "CONJUNCTION_AND",
+        "alias": "",
+        "children": terms,
+    }
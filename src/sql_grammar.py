@@ -0,0 +1,719 @@
+# Grammar-constrained SQL decoding. SQLGrammar decides whether generated text can still
+# be completed into one valid SELECT over the trade table: known columns, whitelisted
+# functions, no comments or placeholders, aggregates only where DuckDB allows them and
+# Direction/Country/Unit literals from the value catalog. constrained_sql() samples
+# from the model as usual but masks the logit of every token that would break that.
+
+import re
+from typing import Iterator, Optional
+from config.settings import TABLE_NAME
+from src.schema import ENUM_COLUMNS, TRADE_COLUMNS
+
+COLUMNS = {column.lower() for column in TRADE_COLUMNS}
+NUMERIC_COLUMNS = {
+    column.lower() for column, sql_type in TRADE_COLUMNS.items()
+    if column not in ENUM_COLUMNS and sql_type != "VARCHAR"
+}
+
+AGGREGATES = {
+    "sum", "avg", "count", "min", "max", "median", "mode", "stddev", "stddev_samp", "stddev_pop",
+    "variance", "var_samp", "var_pop", "quantile_cont", "quantile_disc", "approx_count_distinct",
+    "approx_quantile", "any_value", "arg_max", "arg_min", "string_agg", "first", "last",
+}
+WINDOW_FUNCTIONS = {
+    "row_number", "rank", "dense_rank", "percent_rank", "cume_dist", "ntile", "lag", "lead",
+    "first_value", "last_value",
+}
+SCALAR_FUNCTIONS = {
+    "round", "abs", "ceil", "floor", "sqrt", "power", "ln", "log", "log10", "exp", "sign",
+    "coalesce", "nullif", "greatest", "least", "lower", "upper", "length", "trim", "substring",
+    "substr", "left", "right", "concat", "replace", "contains", "starts_with", "random",
+}
+FUNCTIONS = AGGREGATES | WINDOW_FUNCTIONS | SCALAR_FUNCTIONS
+
+TYPES = {
+    "integer", "int", "bigint", "smallint", "double", "float", "real", "decimal", "numeric",
+    "varchar", "text", "hugeint",
+}
+
+# Words that cannot name a column or an alias
+RESERVED = {
+    "select", "from", "where", "group", "by", "having", "order", "limit", "offset", "union",
+    "all", "except", "intersect", "join", "inner", "left", "right", "full", "outer", "cross",
+    "on", "using", "as", "and", "or", "not", "in", "is", "null", "like", "ilike", "between",
+    "case", "when", "then", "else", "end", "distinct", "asc", "desc", "nulls", "over",
+    "partition", "true", "false", "cast", "window", "qualify", "with",
+}
+
+# Clauses that can follow a table reference (a partial word there is not an alias)
+AFTER_TABLE = {
+    "where", "group", "having", "order", "limit", "union", "intersect", "except", "join",
+    "inner", "left", "right", "full", "cross", "on", "using",
+}
+
+# Words an expression can start with besides names and functions
+EXPRESSION_WORDS = {"not", "null", "true", "false", "case", "cast"}
+
+COMPARISONS = {"=", "<>", "!=", "<", ">", "<=", ">="}
+OPERATORS = COMPARISONS | {"+", "-", "*", "/", "%", "||", "::", "(", ")", ",", ".", ";"}
+
+WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+NUMBER = re.compile(r"[0-9]+(\.[0-9]*)?|\.[0-9]+")
+NUMERIC_TEXT = re.compile(r"\s*[-+]?([0-9]+(\.[0-9]*)?|\.[0-9]+)\s*")
+NUMERIC_START = re.compile(r"\s*[-+]?[0-9]*(\.[0-9]*)?")
+
+
+class _Values:
+    # The strings a literal compared with a column can be: one of a set of values or,
+    # for a numeric column (values None), a number
+    
+    def __init__(self, values: Optional[set] = None):
+        self.values = values
+    
+    def allows(self, text: str, partial: bool) -> bool:
+        if self.values is None:
+            return (NUMERIC_START if partial else NUMERIC_TEXT).fullmatch(text) is not None
+        if partial:
+            return any(value.startswith(text) for value in self.values)
+        return text in self.values
+
+
+NUMBERS = _Values()
+
+
+class _Incomplete(Exception):
+    # The text ended where the statement could go on: a valid prefix
+    pass
+
+
+class _Invalid(Exception):
+    pass
+
+
+class _Token:
+    __slots__ = ("kind", "text", "partial")
+    
+    def __init__(self, kind: str, text: str, partial: bool = False):
+        self.kind = kind  # "word", "name" (double-quoted), "number", "string" or "op"
+        self.text = text
+        self.partial = partial  # at the end of the text and may still grow
+    
+    @property
+    def lower(self) -> str:
+        return self.text.lower()
+
+
+def _lex(text: str, prefix: bool) -> Optional[list]:
+    # Tokens of text, or None if it cannot be SQL of the kind allowed (comments, stray
+    # characters). With prefix, the last token may be cut off and is marked partial.
+    tokens, pos, size = [], 0, len(text)
+    while pos < size:
+        char = text[pos]
+        if char.isspace():
+            pos += 1
+            continue
+        if char in "'\"":
+            end, value = pos + 1, []
+            while True:
+                close = text.find(char, end)
+                if close < 0:
+                    if not prefix:
+                        return None
+                    value.append(text[end:])
+                    tokens.append(_Token("string" if char == "'" else "name", "".join(value), True))
+                    return tokens
+                value.append(text[end:close])
+                if text.startswith(char, close + 1):
+                    # Doubled quote inside the literal
+                    value.append(char)
+                    end = close + 2
+                    continue
+                break
+            tokens.append(_Token("string" if char == "'" else "name", "".join(value)))
+            pos = close + 1
+            continue
+        match = WORD.match(text, pos) or NUMBER.match(text, pos)
+        if match:
+            kind = "word" if match.re is WORD else "number"
+            pos = match.end()
+            tokens.append(_Token(kind, match.group(), prefix and pos == size))
+            continue
+        if text.startswith(("--", "/*"), pos):
+            return None
+        pair = text[pos:pos + 2]
+        if pair in OPERATORS:
+            tokens.append(_Token("op", pair))
+            pos += 2
+        elif char in OPERATORS:
+            # "<" may become "<=" or "<>", "-" a comment, ":" and "|" need their pair
+            tokens.append(_Token("op", char, prefix and pos + 1 == size and char in "<>-/"))
+            pos += 1
+        elif prefix and pos + 1 == size and char in "!|:":
+            tokens.append(_Token("op", char, True))
+            pos += 1
+        else:
+            return None
+    return tokens
+
+
+class _Parser:
+    # Recursive descent over the token list. Running out of tokens raises _Incomplete in
+    # prefix mode (the text so far is fine) and reads as end of input otherwise; anything
+    # the grammar does not allow raises _Invalid. Names must be declared before they are
+    # used, except that a select list may name table aliases its FROM clause declares and
+    # columns of a subquery its FROM clause starts with (checked once those are parsed).
+    
+    def __init__(self, tokens: list, prefix: bool, domains: dict):
+        self.tokens = tokens
+        self.prefix = prefix
+        self.domains = domains
+        self.index = 0
+        self.tables = {TABLE_NAME.lower()}
+        self.aliases = set()
+        self.select_list = False
+        # (kind, name) used in a select list ahead of the FROM clause declaring them
+        self.pending = []
+        # Trade columns the select list uses outside aggregates (innermost call last),
+        # and whether it aggregates
+        self.bare = [set()]
+        self.aggregated = False
+    
+    # Token access
+    
+    def peek(self) -> Optional[_Token]:
+        if self.index < len(self.tokens):
+            return self.tokens[self.index]
+        if self.prefix:
+            raise _Incomplete()
+        return None
+    
+    def following(self) -> Optional[_Token]:
+        return self.tokens[self.index + 1] if self.index + 1 < len(self.tokens) else None
+    
+    def accept(self, *texts: str) -> Optional[str]:
+        # Consume the next token if it is one of texts (keywords or operators)
+        token = self.peek()
+        if token is None or token.kind not in ("word", "op"):
+            return None
+        if token.partial:
+            if any(text.startswith(token.lower) for text in texts):
+                raise _Incomplete()
+            return None
+        if token.lower in texts:
+            self.index += 1
+            return token.lower
+        return None
+    
+    def expect(self, *texts: str) -> str:
+        found = self.accept(*texts)
+        if found is None:
+            raise _Invalid()
+        return found
+    
+    # Statements
+    
+    def statement(self) -> None:
+        self.select_statement()
+        self.accept(";")
+        if self.peek() is not None:
+            raise _Invalid()
+    
+    def select_statement(self) -> None:
+        self.select_core()
+        while self.accept("union", "intersect", "except"):
+            self.accept("all", "distinct")
+            self.select_core()
+        if self.accept("order"):
+            self.expect("by")
+            self.order_items()
+        if self.accept("limit"):
+            self.count()
+            if self.accept("offset"):
+                self.count()
+    
+    def select_core(self) -> None:
+        self.expect("select")
+        self.accept("distinct")
+        outer = (self.select_list, self.bare, self.aggregated)
+        self.select_list, self.bare, self.aggregated = True, [set()], False
+        pending = len(self.pending)
+        self.select_item()
+        while self.accept(","):
+            self.select_item()
+        self.select_list = False
+        bare, aggregated = self.bare[0], self.aggregated
+        
+        self.expect("from")
+        columns = [name for kind, name in self.pending[pending:] if kind == "column"]
+        if columns and self.peek() is not None and self.peek().text != "(":
+            # Only a subquery can declare them
+            raise _Invalid()
+        self.table_ref(columns)
+        self.joins()
+        if any(kind == "table" and name not in self.tables for kind, name in self.pending[pending:]):
+            raise _Invalid()
+        del self.pending[pending:]
+        if self.accept("where"):
+            self.expression(aggregates=False)
+        if self.accept("group"):
+            self.expect("by")
+            if not self.accept("all"):
+                grouped = {self.group_item()}
+                while self.accept(","):
+                    grouped.add(self.group_item())
+                if None not in grouped and not bare <= grouped:
+                    # A selected column is neither grouped nor aggregated
+                    raise _Invalid()
+        elif aggregated and bare:
+            raise _Invalid()
+        if self.accept("having"):
+            self.expression()
+        self.select_list, self.bare, self.aggregated = outer
+    
+    def group_item(self) -> Optional[str]:
+        # The trade column a GROUP BY item names, "" for any other expression and None
+        # for an alias or a position (which may stand for any column)
+        start = self.index
+        self.expression(aggregates=False)
+        span = self.tokens[start:self.index]
+        if len(span) == 1 or len(span) == 3 and span[1].text == ".":
+            if span[-1].kind == "number" or span[-1].lower not in COLUMNS:
+                return None
+            return span[-1].lower
+        return ""
+    
+    def select_item(self) -> None:
+        if self.accept("*"):
+            return
+        self.expression()
+        if self.accept("as"):
+            self.declare(self.aliases)
+    
+    def declare(self, names: set) -> None:
+        # A new alias name
+        token = self.peek()
+        if token is None or token.kind not in ("word", "name"):
+            raise _Invalid()
+        if token.partial:
+            raise _Incomplete()
+        if token.kind == "word" and token.lower in RESERVED:
+            raise _Invalid()
+        self.index += 1
+        names.add(token.lower)
+    
+    def table_ref(self, columns: tuple = ()) -> None:
+        if self.accept("("):
+            self.select_statement()
+            self.expect(")")
+            if any(name not in self.aliases for name in columns):
+                raise _Invalid()
+        else:
+            self.expect(TABLE_NAME.lower())
+        if self.accept("as"):
+            self.declare(self.tables)
+            return
+        token = self.peek()
+        if token is None or token.kind == "op" or token.kind == "word" and token.lower in RESERVED:
+            return
+        if token.partial and any(word.startswith(token.lower) for word in AFTER_TABLE):
+            # The start of the next clause rather than an alias
+            return
+        self.declare(self.tables)
+    
+    def joins(self) -> None:
+        while True:
+            if self.accept(","):
+                self.table_ref()
+                continue
+            kind = self.accept("join", "inner", "left", "right", "full", "cross")
+            if kind is None:
+                return
+            if kind in ("left", "right", "full"):
+                self.accept("outer")
+            if kind != "join":
+                self.expect("join")
+            self.table_ref()
+            if kind == "cross":
+                continue
+            if self.accept("using"):
+                self.expect("(")
+                self.column_name()
+                while self.accept(","):
+                    self.column_name()
+                self.expect(")")
+            else:
+                self.expect("on")
+                self.expression(aggregates=False)
+    
+    def order_items(self) -> None:
+        while True:
+            self.expression()
+            self.accept("asc", "desc")
+            if self.accept("nulls"):
+                self.expect("first", "last")
+            if not self.accept(","):
+                return
+    
+    def count(self) -> None:
+        # LIMIT / OFFSET: a number or a scalar subquery
+        if self.accept("("):
+            self.select_statement()
+            self.expect(")")
+        else:
+            self.integer()
+    
+    def integer(self) -> None:
+        token = self.peek()
+        if token is None or token.kind != "number":
+            raise _Invalid()
+        if token.partial:
+            raise _Incomplete()
+        if not token.text.isdigit():
+            raise _Invalid()
+        self.index += 1
+    
+    # Expressions (aggregates: whether aggregate and window functions are allowed here;
+    # domain: the values a string literal may take)
+    
+    def expression(self, aggregates: bool = True) -> None:
+        self.conjunction(aggregates)
+        while self.accept("or"):
+            self.conjunction(aggregates)
+    
+    def conjunction(self, aggregates: bool) -> None:
+        self.negation(aggregates)
+        while self.accept("and"):
+            self.negation(aggregates)
+    
+    def negation(self, aggregates: bool) -> None:
+        if self.accept("not"):
+            self.negation(aggregates)
+            return
+        self.predicate(aggregates)
+    
+    def predicate(self, aggregates: bool) -> None:
+        column = self.additive(aggregates)
+        # Strings compared with a numeric column must cast to a number; those equal to a
+        # catalogued column should be one of its values
+        numbers = NUMBERS if column in NUMERIC_COLUMNS else None
+        values = self.domains.get(column)
+        negated = self.accept("not")
+        if self.accept("in"):
+            self.expect("(")
+            if self.starts_select():
+                self.select_statement()
+                self.expect(")")
+                return
+            # Like ValueCatalog.check, a list needs one value present in the data
+            known = self.list_item(aggregates, numbers, values)
+            while self.accept(","):
+                known = self.list_item(aggregates, numbers, values) or known
+            self.expect(")")
+            if not known:
+                raise _Invalid()
+        elif self.accept("between"):
+            self.additive(aggregates, numbers)
+            self.expect("and")
+            self.additive(aggregates, numbers)
+        elif self.accept("like", "ilike"):
+            self.additive(aggregates)
+        elif negated:
+            raise _Invalid()
+        elif self.accept("is"):
+            self.accept("not")
+            self.expect("null")
+        else:
+            operator = self.accept(*COMPARISONS)
+            if operator is not None:
+                # Only equality with a value the data lacks can never match
+                self.additive(aggregates, (values or numbers) if operator == "=" else numbers)
+    
+    def list_item(self, aggregates: bool, numbers: Optional[_Values], values: Optional[_Values]) -> bool:
+        # Whether the item is one of values (or there are none to check)
+        start = self.index
+        self.additive(aggregates, numbers)
+        token = self.tokens[start]
+        if values is None:
+            return True
+        return self.index == start + 1 and token.kind == "string" and values.allows(token.text, False)
+    
+    def starts_select(self) -> bool:
+        # Whether a subquery follows "(" (a partial word may start SELECT or a name)
+        token = self.peek()
+        if token is None or token.kind != "word":
+            return False
+        if token.partial and "select".startswith(token.lower):
+            raise _Incomplete()
+        return token.lower == "select"
+    
+    def additive(self, aggregates: bool, domain: Optional[_Values] = None) -> Optional[str]:
+        # Returns the column name when the operand is a bare trade column
+        column = self.term(aggregates, domain)
+        while self.accept("+", "-", "||"):
+            self.term(aggregates)
+            column = None
+        return column
+    
+    def term(self, aggregates: bool, domain: Optional[_Values] = None) -> Optional[str]:
+        column = self.unary(aggregates, domain)
+        while self.accept("*", "/", "%"):
+            self.unary(aggregates)
+            column = None
+        return column
+    
+    def unary(self, aggregates: bool, domain: Optional[_Values] = None) -> Optional[str]:
+        if self.accept("-", "+"):
+            self.unary(aggregates)
+            return None
+        column = self.primary(aggregates, domain)
+        while self.accept("::"):
+            self.type_name()
+            column = None
+        return column
+    
+    def primary(self, aggregates: bool, domain: Optional[_Values]) -> Optional[str]:
+        token = self.peek()
+        if token is None:
+            raise _Invalid()
+        if token.kind == "number":
+            if token.partial:
+                raise _Incomplete()
+            self.index += 1
+            return None
+        if token.kind == "string":
+            self.literal(token, domain)
+            return None
+        if token.kind == "op":
+            self.expect("(")
+            if self.starts_select():
+                self.select_statement()
+            else:
+                self.expression(aggregates)
+            self.expect(")")
+            return None
+        if token.kind == "name":
+            return self.name()
+        
+        word = token.lower
+        if token.partial:
+            # Some completion must be a keyword, function, column, alias or table
+            names = EXPRESSION_WORDS | FUNCTIONS | COLUMNS | self.aliases | self.tables
+            if self.select_list or any(name.startswith(word) for name in names):
+                raise _Incomplete()
+            raise _Invalid()
+        if self.accept("null", "true", "false"):
+            return None
+        if self.accept("case"):
+            self.case(aggregates)
+            return None
+        if self.accept("cast"):
+            self.expect("(")
+            self.expression(aggregates)
+            self.expect("as")
+            self.type_name()
+            self.expect(")")
+            return None
+        following = self.following()
+        if following is not None and following.text == "(" and following.kind == "op":
+            self.function(aggregates)
+            return None
+        return self.name()
+    
+    def literal(self, token: _Token, domain: Optional[_Values]) -> None:
+        if domain is not None and not domain.allows(token.text, token.partial):
+            raise _Invalid()
+        if token.partial:
+            raise _Incomplete()
+        self.index += 1
+    
+    def name(self) -> Optional[str]:
+        # [table.]column
+        token = self.peek()
+        following = self.following()
+        if not token.partial and following is not None and following.text == "." and following.kind == "op":
+            if token.kind == "word" and token.lower in RESERVED:
+                raise _Invalid()
+            if token.lower not in self.tables:
+                if not self.select_list:
+                    raise _Invalid()
+                self.pending.append(("table", token.lower))
+            self.index += 2
+        return self.column_name()
+    
+    def column_name(self) -> Optional[str]:
+        # A trade column (returned) or an alias declared earlier
+        token = self.peek()
+        if token is None or token.kind not in ("word", "name"):
+            raise _Invalid()
+        name = token.lower
+        if token.partial:
+            if self.select_list or any(candidate.startswith(name) for candidate in COLUMNS | self.aliases | self.tables):
+                raise _Incomplete()
+            raise _Invalid()
+        if token.kind == "word" and name in RESERVED:
+            raise _Invalid()
+        self.index += 1
+        if name in COLUMNS:
+            if self.select_list:
+                self.bare[-1].add(name)
+            return name
+        if name not in self.aliases:
+            if not self.select_list:
+                raise _Invalid()
+            self.pending.append(("column", name))
+        return None
+    
+    def function(self, aggregates: bool) -> None:
+        name = self.tokens[self.index].lower
+        if name not in FUNCTIONS:
+            raise _Invalid()
+        if not aggregates and (name in AGGREGATES or name in WINDOW_FUNCTIONS):
+            raise _Invalid()
+        self.index += 2
+        self.bare.append(set())
+        if not self.accept(")"):
+            if name != "count" or not self.accept("*"):
+                self.accept("distinct")
+                # Aggregate calls cannot be nested
+                inner = aggregates and name not in AGGREGATES
+                self.expression(inner)
+                while self.accept(","):
+                    self.expression(inner)
+            self.expect(")")
+        window = name in WINDOW_FUNCTIONS
+        if window:
+            self.expect("over")
+            self.window()
+        elif name in AGGREGATES:
+            window = self.accept("over") is not None
+            if window:
+                self.window()
+        columns = self.bare.pop()
+        if name in AGGREGATES and not window:
+            self.aggregated = self.aggregated or self.select_list
+        else:
+            # Window functions run after grouping, over grouped columns
+            self.bare[-1] |= columns
+    
+    def window(self) -> None:
+        self.expect("(")
+        if self.accept("partition"):
+            self.expect("by")
+            self.expression()
+            while self.accept(","):
+                self.expression()
+        if self.accept("order"):
+            self.expect("by")
+            self.order_items()
+        self.expect(")")
+    
+    def case(self, aggregates: bool) -> None:
+        if not self.accept("when"):
+            self.expression(aggregates)
+            self.expect("when")
+        while True:
+            self.expression(aggregates)
+            self.expect("then")
+            self.expression(aggregates)
+            if not self.accept("when"):
+                break
+        if self.accept("else"):
+            self.expression(aggregates)
+        self.expect("end")
+    
+    def type_name(self) -> None:
+        token = self.peek()
+        if token is None or token.kind != "word":
+            raise _Invalid()
+        if token.partial:
+            if any(name.startswith(token.lower) for name in TYPES):
+                raise _Incomplete()
+            raise _Invalid()
+        if token.lower not in TYPES:
+            raise _Invalid()
+        self.index += 1
+        if self.accept("("):
+            self.integer()
+            if self.accept(","):
+                self.integer()
+            self.expect(")")
+
+
+class SQLGrammar:
+    # Valid SQL for the trade table. With a ValueCatalog, string literals Direction,
+    # Country or Unit are compared to with = are limited to the values present in the
+    # data, and IN lists must hold at least one (otherwise no row can match).
+    
+    def __init__(self, catalog=None):
+        self.domains = {}
+        if catalog is not None:
+            self.domains = {
+                column.lower(): _Values(set(catalog.values.get(column.lower(), {})))
+                for column in ENUM_COLUMNS
+            }
+    
+    def accepts(self, text: str) -> bool:
+        # True if text is the start of (or all of) a valid statement
+        tokens = _lex(text, prefix=True)
+        if tokens is None:
+            return False
+        if not tokens:
+            return True
+        try:
+            _Parser(tokens, True, self.domains).statement()
+        except _Incomplete:
+            return True
+        except (_Invalid, RecursionError):
+            return False
+        return True
+    
+    def complete(self, text: str) -> bool:
+        # True if text is a whole valid statement
+        tokens = _lex(text, prefix=False)
+        if not tokens:
+            return False
+        try:
+            _Parser(tokens, False, self.domains).statement()
+        except (_Invalid, RecursionError):
+            return False
+        return True
+
+
+def constrained_sql(
+    llm,
+    prompt: str,
+    grammar: SQLGrammar,
+    max_new_tokens: int,
+    max_rejections: int = 512,
+    stats: Optional[dict] = None,
+    **sampling
+) -> Iterator[str]:
+    # Generate from a ctransformers LLM, yielding each token's text. Tokens are sampled
+    # with the usual settings; one that would make the text invalid has its logit set to
+    # -inf and the step is sampled again, which is sampling from the masked distribution.
+    # End of text is only allowed once the statement is complete, and generation stops at
+    # its semicolon. Gives up (ends early) after max_rejections masked tokens in one step.
+    tokens = llm.prepare_inputs_for_generation(llm.tokenize(prompt), reset=True)
+    llm.eval(tokens)
+    text = ""
+    for _ in range(max_new_tokens):
+        logits = llm.logits
+        for _ in range(max_rejections):
+            token = llm.sample(**sampling)
+            if llm.is_eos_token(token):
+                if grammar.complete(text):
+                    return
+            else:
+                piece = llm.detokenize([token])
+                if piece and grammar.accepts(text + piece):
+                    break
+            logits[token] = float("-inf")
+            if stats is not None:
+                stats["masked_tokens"] += 1
+        else:
+            return
+        llm.eval([token])
+        text += piece
+        yield piece
+        if text.rstrip().endswith(";"):
+            return
@@ -0,0 +1,354 @@
+# Rule-based, equivalence-preserving rewrites of wasteful generated SQL
+
+import copy
+import operator
+import threading
+import duckdb
+from collections import OrderedDict
+from typing import Optional
+from config.settings import TABLE_NAME, REWRITE_RULES
+from src import sql_ast
+from src.rollups import AGGREGATES, VOLATILE_FUNCTIONS
+from src.schema import hs_prefix_level
+
+# Low-cardinality columns whose full value set is looked up per data version
+DOMAIN_COLUMNS = ("Year", "Month", "Direction")
+
+COMPARISONS = {
+    "COMPARE_EQUAL": operator.eq,
+    "COMPARE_NOTEQUAL": operator.ne,
+    "COMPARE_LESSTHAN": operator.lt,
+    "COMPARE_GREATERTHAN": operator.gt,
+    "COMPARE_LESSTHANOREQUALTO": operator.le,
+    "COMPARE_GREATERTHANOREQUALTO": operator.ge,
+}
+
+# Functions testing a string prefix, besides LIKE 'prefix%'
+PREFIX_FUNCTIONS = {"prefix", "starts_with"}
+SUBSTRING_FUNCTIONS = {"substr", "substring"}
+
+SAMPLE_TEMPLATE = "SELECT * FROM (SELECT 1) AS sampled USING SAMPLE reservoir(1 ROWS)"
+
+
+def _is_trade_scan(node: dict) -> bool:
+    from_table = node.get("from_table") or {}
+    return (
+        from_table.get("type") == "BASE_TABLE"
+        and from_table.get("table_name", "").lower() == TABLE_NAME
+        and not from_table.get("schema_name")
+        and not from_table.get("catalog_name")
+    )
+
+
+def _column_key(expr: dict) -> tuple:
+    return tuple(name.lower() for name in expr["column_names"])
+
+
+def sample_random_limit(node: dict, domains: dict) -> Optional[dict]:
+    # ORDER BY random() LIMIT n picks n rows uniformly at random; a reservoir
+    # sample of the unordered result does the same without a random key per row
+    modifiers = node.get("modifiers", [])
+    orders = [m for m in modifiers if m["type"] == "ORDER_MODIFIER"]
+    limits = [m for m in modifiers if m["type"] == "LIMIT_MODIFIER"]
+    if len(orders) != 1 or len(limits) != 1 or node.get("sample") is not None:
+        return None
+    
+    keys = orders[0]["orders"]
+    if len(keys) != 1:
+        return None
+    key = keys[0]["expression"]
+    if key.get("class") != "FUNCTION" or key["function_name"].lower() != "random" or key.get("children"):
+        return None
+    
+    limit = limits[0]
+    if limit.get("offset") is not None or limit.get("limit") is None:
+        return None
+    try:
+        rows = sql_ast.constant_value(limit["limit"])
+    except KeyError:
+        return None
+    if not isinstance(rows, int) or isinstance(rows, bool) or rows < 0:
+        return None
+    
+    inner = dict(node)
+    inner["modifiers"] = [m for m in modifiers if m["type"] not in ("ORDER_MODIFIER", "LIMIT_MODIFIER")]
+    sampled = sql_ast.parse_select(SAMPLE_TEMPLATE)
+    sampled["from_table"]["subquery"]["node"] = inner
+    sampled["sample"]["sample_size"]["value"] = rows
+    return sampled
+
+
+def _always_true(term: dict, domains: dict) -> bool:
+    # Whether term holds for every value its column takes in the data
+    term_class = term.get("class")
+    if term_class == "OPERATOR" and term.get("type") == "COMPARE_IN":
+        column, values = term["children"][0], term["children"][1:]
+        check = lambda value, constants: value in constants
+    elif term_class == "BETWEEN":
+        column, values = term["input"], [term["lower"], term["upper"]]
+        check = lambda value, constants: constants[0] <= value <= constants[1]
+    elif term_class == "COMPARISON" and term.get("type") in COMPARISONS:
+        column, values = term["left"], [term["right"]]
+        compare = COMPARISONS[term["type"]]
+        check = lambda value, constants: compare(value, constants[0])
+    else:
+        return False
+    
+    if column.get("class") != "COLUMN_REF" or not all(sql_ast.is_constant(v) for v in values):
+        return False
+    domain = domains.get(sql_ast.column_name(column).lower())
+    constants = [sql_ast.constant_value(v) for v in values]
+    if domain is None or any(c is None for c in constants):
+        return False
+    try:
+        return all(check(value, constants) for value in domain)
+    except TypeError:
+        # e.g. a string literal against an integer column - leave it to DuckDB
+        return False
+
+
+def drop_tautologies(node: dict, domains: dict) -> Optional[dict]:
+    # Drop WHERE terms every row satisfies, such as Year IN (...all years...)
+    if not _is_trade_scan(node):
+        return None
+    alias = (node["from_table"].get("alias") or TABLE_NAME).lower()
+    
+    terms = sql_ast.conjuncts(node.get("where_clause"))
+    kept = []
+    for term in terms:
+        qualifiers = {
+            _column_key(expr)[:-1] for expr in sql_ast.walk(term) if expr.get("class") == "COLUMN_REF"
+        }
+        if qualifiers <= {(), (alias,)} and _always_true(term, domains):
+            continue
+        kept.append(term)
+    
+    if len(kept) == len(terms):
+        return None
+    rewritten = dict(node)
+    rewritten["where_clause"] = sql_ast.make_and(kept)
+    return rewritten
+
+
+def _row_level(term: dict, grouped: set, aliases: set) -> bool:
+    # Whether a HAVING term only reads grouping columns, so it can filter rows instead
+    for expr in sql_ast.walk(term):
+        expr_class = expr.get("class")
+        if expr_class in ("SUBQUERY", "WINDOW", "STAR", "LAMBDA", "PARAMETER", "COLUMNS"):
+            return False
+        if expr_class == "FUNCTION":
+            name = expr["function_name"].lower()
+            if name in AGGREGATES or name in VOLATILE_FUNCTIONS:
+                return False
+        if expr_class == "COLUMN_REF":
+            if _column_key(expr) not in grouped or _column_key(expr)[-1] in aliases:
+                return False
+    return True
+
+
+def having_to_where(node: dict, domains: dict) -> Optional[dict]:
+    # HAVING Year = 2080 in a query grouped by Year filters whole groups by a
+    # grouping column, which is the same as filtering rows before grouping
+    if (node.get("having") is None or not node.get("group_expressions")
+            or len(node.get("group_sets") or []) > 1
+            or node.get("aggregate_handling") != "STANDARD_HANDLING"):
+        return None
+    
+    grouped = {
+        _column_key(expr) for expr in node["group_expressions"] if expr.get("class") == "COLUMN_REF"
+    }
+    aliases = {item["alias"].lower() for item in node["select_list"] if item.get("alias")}
+    
+    moved, kept = [], []
+    for term in sql_ast.conjuncts(node["having"]):
+        (moved if _row_level(term, grouped, aliases) else kept).append(term)
+    if not moved:
+        return None
+    
+    rewritten = dict(node)
+    rewritten["where_clause"] = sql_ast.make_and(sql_ast.conjuncts(node.get("where_clause")) + moved)
+    rewritten["having"] = sql_ast.make_and(kept)
+    return rewritten
+
+
+def _is_hs_code(expr: dict, alias: str) -> bool:
+    if expr.get("class") != "COLUMN_REF":
+        return False
+    return _column_key(expr)[-1] == "hs_code" and _column_key(expr)[:-1] in ((), (alias,))
+
+
+def _string_constant(expr: dict) -> Optional[str]:
+    try:
+        value = sql_ast.constant_value(expr)
+    except KeyError:
+        return None
+    return value if isinstance(value, str) else None
+
+
+def _hs_prefix_pattern(expr: dict, alias: str) -> Optional[str]:
+    # LIKE pattern equivalent to a prefix test on HS_Code, None for other expressions
+    if expr.get("class") == "FUNCTION" and len(expr.get("children", [])) == 2:
+        name = expr["function_name"].lower()
+        column, pattern = expr["children"]
+        if not _is_hs_code(column, alias) or _string_constant(pattern) is None:
+            return None
+        if name == "~~":
+            return _string_constant(pattern)
+        if name in PREFIX_FUNCTIONS and "%" not in _string_constant(pattern):
+            return _string_constant(pattern) + "%"
+        return None
+    
+    if expr.get("class") == "COMPARISON" and expr.get("type") == "COMPARE_EQUAL":
+        # left(HS_Code, 2) = '27', substr(HS_Code, 1, 2) = '27'
+        for call, constant in ((expr["left"], expr["right"]), (expr["right"], expr["left"])):
+            prefix = _string_constant(constant)
+            if prefix is None or "%" in prefix or call.get("class") != "FUNCTION":
+                continue
+            name = call["function_name"].lower()
+            arguments = call.get("children", [])
+            if not arguments or not _is_hs_code(arguments[0], alias):
+                continue
+            try:
+                bounds = [sql_ast.constant_value(arg) for arg in arguments[1:]]
+            except KeyError:
+                continue
+            if ((name == "left" and bounds == [len(prefix)])
+                    or (name in SUBSTRING_FUNCTIONS and bounds == [1, len(prefix)])):
+                return prefix + "%"
+    return None
+
+
+def hs_prefix(node: dict, domains: dict) -> Optional[dict]:
+    # HS_Code LIKE '27%' (or left(HS_Code, 2) = '27') reads and matches every code
+    # string; the integer HS2/HS4/HS6 columns hold the same prefixes, sorted.
+    # HSn is NULL where the prefix test is false for codes like 'TOTAL', so only tests
+    # reached from WHERE through AND/OR are rewritten - both filter out NULL and FALSE
+    # alike - never under NOT, IS [NOT] TRUE, CASE or COALESCE.
+    if not _is_trade_scan(node) or node.get("where_clause") is None:
+        return None
+    alias = (node["from_table"].get("alias") or TABLE_NAME).lower()
+    changed = []
+    
+    def visit(expr):
+        if expr.get("class") == "CONJUNCTION":
+            rewritten = dict(expr)
+            rewritten["children"] = [visit(child) for child in expr["children"]]
+            return rewritten
+        pattern = _hs_prefix_pattern(expr, alias)
+        level = hs_prefix_level(pattern) if pattern is not None else None
+        if level is None:
+            return expr
+        changed.append(level)
+        return sql_ast.parse_expression(f"{level[0]} = {level[1]}")
+    
+    where = visit(node["where_clause"])
+    if not changed:
+        return None
+    rewritten = dict(node)
+    rewritten["where_clause"] = where
+    return rewritten
+
+
+# Rule name -> rule, applied in REWRITE_RULES order to every SELECT in a query
+RULES = {
+    "sample_random_limit": sample_random_limit,
+    "drop_tautologies": drop_tautologies,
+    "having_to_where": having_to_where,
+    "hs_prefix": hs_prefix,
+}
+
+
+class SQLRewriter:
+    # Applies the enabled rules to validated SQL, keeping only rewrites that bind
+    # to the same output columns and types as the original
+    
+    def __init__(self, db, rules: tuple = REWRITE_RULES, cache_size: int = 512):
+        unknown = [name for name in rules if name not in RULES]
+        if unknown:
+            raise ValueError(f"Unknown rewrite rules: {unknown}")
+        self.db = db
+        self.rules = [(name, RULES[name]) for name in rules]
+        self._domains = None
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+    
+    def domains(self) -> dict:
+        # Distinct values of each NULL-free domain column under the current data
+        version = self.db.data_version
+        if self._domains is not None and self._domains[0] == version:
+            return self._domains[1]
+        
+        domains = {}
+        with self.db.pool.checkout() as cursor:
+            for column in DOMAIN_COLUMNS:
+                try:
+                    values, nulls = cursor.execute(
+                        f"SELECT list(DISTINCT {column}), COUNT(*) - COUNT({column}) FROM {TABLE_NAME}"
+                    ).fetchone()
+                except duckdb.Error:
+                    continue
+                if not nulls and values:
+                    domains[column.lower()] = values
+        self._domains = (version, domains)
+        return domains
+    
+    def rewrite(self, sql: str) -> str:
+        # Return an equivalent, cheaper form of sql, or sql unchanged
+        return self.explain(sql)[0]
+    
+    def explain(self, sql: str) -> tuple:
+        # (rewritten SQL, names of the rules that fired)
+        key = (self.db.data_version, sql)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        
+        result = self._rewrite(sql)
+        
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+    
+    def _rewrite(self, sql: str) -> tuple:
+        node = sql_ast.parse_select(sql)
+        if node is None:
+            return sql, []
+        
+        applied = []
+        rewritten = self._apply(copy.deepcopy(node), self.domains(), applied)
+        if not applied:
+            return sql, []
+        rewritten_sql = sql_ast.render(rewritten)
+        if not self._same_shape(sql, rewritten_sql):
+            return sql, []
+        return rewritten_sql, applied
+    
+    def _apply(self, value, domains: dict, applied: list):
+        # Rewrite nested queries first, then this one
+        if isinstance(value, list):
+            return [self._apply(child, domains, applied) for child in value]
+        if not isinstance(value, dict):
+            return value
+        value = {key: self._apply(child, domains, applied) for key, child in value.items()}
+        if value.get("type") != "SELECT_NODE":
+            return value
+        
+        for name, rule in self.rules:
+            rewritten = rule(value, domains)
+            if rewritten is not None:
+                value = rewritten
+                applied.append(name)
+        return value
+    
+    def _same_shape(self, sql: str, rewritten_sql: str) -> bool:
+        with self.db.pool.checkout() as cursor:
+            try:
+                original = cursor.execute(f"DESCRIBE {sql.rstrip().rstrip(';')}").fetchall()
+                rewritten = cursor.execute(f"DESCRIBE {rewritten_sql}").fetchall()
+            except duckdb.Error:
+                return False
+        return [row[:2] for row in rewritten] == [row[:2] for row in original]
@@ -0,0 +1,70 @@
+# Streamed SQL generation: find where the generated statement ends while tokens are still
+# arriving, so generation stops at its semicolon instead of running on to a stop string
+# or the token limit (SQLPromptBuilder.extract_sql drops everything after it anyway)
+
+import re
+from typing import Iterable, Iterator, Optional
+
+STATEMENT_START = re.compile(r"\b(SELECT|WITH)\b", re.IGNORECASE)
+
+
+class StatementEnd:
+    # Incremental scanner over generated text. The statement starts at the first SELECT
+    # or WITH and ends at the first semicolon outside quotes and comments, or at a blank
+    # line (extract_sql cuts there too).
+    
+    def __init__(self):
+        self.text = ""
+        self.start = None
+        self._scanned = 0
+        self._quote = None
+        self._comment = False
+    
+    def feed(self, chunk: str) -> Optional[int]:
+        # How much of chunk belongs to the statement if it ends in chunk, else None
+        offset = len(self.text)
+        self.text += chunk
+        if self.start is None:
+            # Keywords can arrive split across chunks: rescan a keyword's length back
+            match = STATEMENT_START.search(self.text, max(0, offset - 6))
+            if match is None:
+                return None
+            self.start = self._scanned = match.start()
+        
+        text = self.text
+        for index in range(max(self._scanned, offset), len(text)):
+            char = text[index]
+            if self._comment:
+                self._comment = char != "\n"
+            elif self._quote:
+                if char == self._quote:
+                    self._quote = None
+            elif char in ("'", '"'):
+                self._quote = char
+            elif char == "-" and text[index - 1] == "-" and index - 1 >= self.start:
+                self._comment = True
+            elif char == ";":
+                return index + 1 - offset
+            elif char == "\n" and text[index - 1] == "\n" and index - 1 > self.start:
+                return max(index - 1 - offset, 0)
+        self._scanned = len(text)
+        return None
+
+
+def until_statement_end(chunks: Iterable[str]) -> Iterator[str]:
+    # Pass chunks through up to the end of the first statement, then stop the source
+    end = StatementEnd()
+    try:
+        for chunk in chunks:
+            stop = end.feed(chunk)
+            if stop is None:
+                yield chunk
+                continue
+            if stop:
+                yield chunk[:stop]
+            return
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            # Closing the model's generator stops it evaluating further tokens
+            close()
@@ -0,0 +1,79 @@
+# Synthetic trade data with the same shape as done_des.csv for database tests
+
+import csv
+import random
+from pathlib import Path
+
+COLUMNS = ['Year', 'Month', 'Direction', 'HS_Code', 'Description', 'Country',
+           'Value', 'Quantity', 'Unit', 'Revenue']
+
+YEARS = [2077, 2078, 2079, 2080, 2081, 2082]
+
+COUNTRIES = ['IN', 'CN', 'US', 'JP', 'DE', 'TH', 'MY', 'BD', 'AE', 'KR',
+             'SG', 'VN', 'FR', 'IT', 'PK', 'QA', 'SA', 'ID', 'CA', 'NL']
+
+# (HS_Code, Description, Unit) - leading zeros kept on purpose
+COMMODITIES = [
+    ('10019100', 'wheat and meslin seed', 'kg'),
+    ('10019900', 'other wheat', 'kg'),
+    ('10063000', 'semi-milled or wholly milled rice', 'kg'),
+    ('10064000', 'broken rice', 'kg'),
+    ('17019900', 'refined cane sugar', 'kg'),
+    ('15071000', 'crude soya-bean oil', 'ltr'),
+    ('15119000', 'palm oil and its fractions', 'ltr'),
+    ('27101930', 'diesel oil', 'ltr'),
+    ('27111900', 'liquefied petroleum gas', 'kg'),
+    ('71081200', 'gold in unwrought forms', 'gm'),
+    ('72083900', 'flat-rolled iron or non-alloy steel', 'kg'),
+    ('74031100', 'refined copper cathodes', 'kg'),
+    ('09024000', 'black tea fermented', 'kg'),
+    ('52081100', 'cotton textile fabrics', 'mtr'),
+    ('01012100', 'pure-bred breeding horses', 'pcs'),
+    ('03028900', 'fresh fish', 'kg'),
+    ('85171200', 'mobile telephones', 'pcs'),
+    ('87032391', 'motor cars', 'pcs'),
+    ('30049099', 'other medicaments', 'kg'),
+    ('04029900', 'milk and cream concentrated', 'ltr'),
+]
+
+
+def generate_rows(n_rows: int = 20000, seed: int = 7) -> list:
+    # Deterministic rows covering every year, month, direction and commodity
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        hs_code, description, unit = COMMODITIES[i % len(COMMODITIES)]
+        direction = 'I' if rng.random() < 0.7 else 'E'
+        value = round(rng.lognormvariate(12, 2), 2)
+        quantity = 0.0 if rng.random() < 0.05 else round(rng.uniform(1, 50000), 2)
+        revenue = round(value * rng.uniform(0.0, 0.3), 2) if direction == 'I' else ''
+        rows.append({
+            'Year': YEARS[i % len(YEARS)],
+            'Month': 1 + (i // len(YEARS)) % 12,
+            'Direction': direction,
+            'HS_Code': hs_code,
+            'Description': description,
+            'Country': rng.choice(COUNTRIES),
+            'Value': value,
+            'Quantity': quantity,
+            'Unit': unit,
+            'Revenue': revenue,
+        })
+    return rows
+
+
+# A summary line with a non-numeric HS_Code, as customs exports sometimes contain
+TOTAL_ROW = {'Year': 2080, 'Month': 1, 'Direction': 'I', 'HS_Code': 'TOTAL', 'Description': 'total',
+             'Country': 'IN', 'Value': 1000.0, 'Quantity': 1.0, 'Unit': 'kg', 'Revenue': 10.0}
+
+
+def write_synthetic_csv(path: Path, n_rows: int = 20000, seed: int = 7, extra_rows: tuple = ()) -> Path:
+    # Write synthetic rows (then extra_rows) to a CSV with the done_des.csv header
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(generate_rows(n_rows, seed))
+        writer.writerows(extra_rows)
+    return path
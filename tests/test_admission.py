@@ -0,0 +1,104 @@
+# Admission control tests over EXPLAIN plans (synthetic data, no models needed)
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.admission import AdmissionController, QueryRejectedError
+from src.database import TradeDatabase, QueryExecutionError
+from src.executor import QueryExecutor
+from tests.synthetic_data import write_synthetic_csv
+from tests.test_data import TEST_CASES
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    csv_path = write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=20000)
+    database = TradeDatabase(csv_path, use_snapshot=False)
+    database.load_data()
+    yield database
+    database.close()
+
+
+def test_test_cases_are_admitted(db):
+    controller = AdmissionController(db)
+    for case in TEST_CASES:
+        admission = controller.review(case["expected_sql"])
+        assert admission.action == "allow", (case["expected_sql"], admission.reasons)
+
+
+def test_cross_product_rejected(db):
+    controller = AdmissionController(db)
+    admission = controller.review("SELECT COUNT(*) FROM trade a, trade b WHERE a.Value + b.Value < 0")
+    assert admission.action == "reject"
+    assert "cross_product" in admission.reasons[0]
+    
+    with pytest.raises(QueryRejectedError):
+        with controller.admitted(admission):
+            pass
+    
+    executor = QueryExecutor(log_failures=False, db=db, admission=controller)
+    success, result, msg = executor.execute("SELECT a.Year FROM trade a, trade b;")
+    assert not success
+    assert "rejected by admission control" in msg
+
+
+def test_unbounded_sort_capped(db):
+    controller = AdmissionController(db, thresholds={"unbounded_sort": 1000, "huge_result": 1000}, row_cap=50)
+    executor = QueryExecutor(log_failures=False, db=db, admission=controller)
+    
+    success, result, msg = executor.execute("SELECT * FROM trade WHERE Direction = 'I' ORDER BY Value DESC;")
+    
+    assert success
+    assert len(result) == 50
+    assert "capped at 50" in msg
+    expected = db.execute_query("SELECT Value FROM trade WHERE Direction = 'I' ORDER BY Value DESC LIMIT 50")
+    assert result["Value"].tolist() == expected["Value"].tolist()
+    
+    # Small sorts and limited sorts are left alone
+    assert controller.review("SELECT * FROM trade ORDER BY Value LIMIT 10").action == "allow"
+    # LIMIT inside a subquery or a string does not limit the result
+    for sql in [
+        "SELECT * FROM trade WHERE Description NOT LIKE '%limit%' ORDER BY Value",
+        "SELECT * FROM trade WHERE Country IN (SELECT Country FROM trade LIMIT 5) ORDER BY Value",
+    ]:
+        admission = controller.review(sql)
+        assert admission.action == "cap" and admission.sql.endswith("LIMIT 50"), sql
+    assert controller.review("SELECT Year, SUM(Value) FROM trade GROUP BY Year ORDER BY Year").action == "allow"
+
+
+def test_plan_errors_fail_before_execution(db):
+    executor = QueryExecutor(max_retries=2, log_failures=False, db=db)
+    success, result, msg = executor.execute("SELECT SUM(Missing_Column) FROM trade;")
+    assert not success
+    assert "Binder Error" in msg
+
+
+def test_heavy_queries_queue_for_a_slot(db):
+    controller = AdmissionController(
+        db, policy={"huge_join": "queue"}, thresholds={"huge_join": 1000}, queue_timeout=0.1
+    )
+    sql = "SELECT COUNT(*) FROM trade a JOIN trade b ON a.Country = b.Country AND a.Month = b.Month"
+    admission = controller.review(sql)
+    assert admission.action == "queue"
+    
+    with controller.admitted(admission):
+        # The only heavy slot is taken, so a second heavy query waits and gives up
+        with pytest.raises(QueryExecutionError, match="queued"):
+            with controller.admitted(admission):
+                pass
+        
+        # Cheap queries are not held up
+        with controller.admitted(controller.review("SELECT COUNT(*) FROM trade")) as cheap_sql:
+            assert db.execute_query(cheap_sql).iloc[0, 0] == 20000
+        
+        # The executor does not retry a query that gave up waiting
+        executor = QueryExecutor(max_retries=2, log_failures=False, db=db, admission=controller)
+        start = time.perf_counter()
+        success, result, msg = executor.execute(sql)
+        assert not success and "queued" in msg
+        assert time.perf_counter() - start < 0.25
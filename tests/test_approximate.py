@@ -0,0 +1,117 @@
+# Approximate answers from the stratified sample (synthetic data, no models needed)
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.approximate import Approximator, SAMPLE_TABLE
+from src.database import TradeDatabase
+from src.executor import QueryExecutor
+from src.formatter import ResponseFormatter
+from tests.synthetic_data import write_synthetic_csv
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    csv_path = write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=20000)
+    database = TradeDatabase(csv_path, use_snapshot=False)
+    database.load_data()
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def executor(db):
+    return QueryExecutor(log_failures=False, db=db, route_rollups=False, approximate=True)
+
+
+def test_sample_is_stratified_and_weighted(db):
+    sample = db.sample()
+    assert sample["population_rows"] == 20000
+    assert sample["take_all_rows"] > 0
+    assert sample["sample_rows"] < sample["population_rows"] / 2
+    
+    # Every (Year, Direction, Country) cell is represented and the weights add up per cell
+    cells = db.execute_query(f"""
+        SELECT t.Year, t.Direction, t.Country, t.n, s.weight
+        FROM (SELECT Year, Direction, Country, COUNT(*) AS n FROM trade GROUP BY ALL) t
+        LEFT JOIN (
+            SELECT Year, Direction, Country, SUM(stratum_rows / stratum_sampled) AS weight
+            FROM {SAMPLE_TABLE} GROUP BY ALL
+        ) s USING (Year, Direction, Country)
+    """)
+    assert (cells["weight"] - cells["n"]).abs().max() < 1e-6
+
+
+def test_grouped_sum_estimated_with_intervals(db, executor):
+    sql = "SELECT Year, SUM(Value) AS total FROM trade WHERE Direction = 'I' GROUP BY Year ORDER BY Year;"
+    success, result, msg = executor.execute(sql)
+    exact = db.execute_query(sql)
+    
+    assert success
+    assert "approximate (95% confidence intervals)" in msg
+    assert result.attrs["approximate"]["sample_rows"] == db.sample()["sample_rows"]
+    assert list(result.columns) == ["Year", "total", "total_ci_low", "total_ci_high"]
+    assert result["Year"].tolist() == exact["Year"].tolist()
+    assert ((result["total_ci_low"] <= result["total"]) & (result["total"] <= result["total_ci_high"])).all()
+    assert ((result["total"] - exact["total"]).abs() / exact["total"]).max() < 0.25
+
+
+def test_counts_and_averages(db, executor):
+    sql = "SELECT COUNT(*), AVG(Value) FROM trade WHERE Year = 2080;"
+    success, result, msg = executor.execute(sql)
+    exact = db.execute_query(sql)
+    
+    assert success
+    assert result.columns[:2].tolist() == exact.columns.tolist()
+    assert abs(result.iloc[0, 0] - exact.iloc[0, 0]) / exact.iloc[0, 0] < 0.1
+    assert abs(result.iloc[0, 1] - exact.iloc[0, 1]) / exact.iloc[0, 1] < 0.25
+    
+    # Unfiltered counts are exact: the weights of each stratum add up to its size
+    success, result, msg = executor.execute("SELECT COUNT(*) FROM trade;")
+    assert result.iloc[0, 0] == 20000
+
+
+def test_exact_on_request_and_for_other_queries(db, executor):
+    sql = "SELECT Country, SUM(Value) FROM trade GROUP BY Country ORDER BY SUM(Value) DESC LIMIT 5;"
+    assert Approximator(db).plan(sql) is not None
+    
+    success, result, msg = executor.execute(sql, approximate=False)
+    assert success
+    assert "approximate" not in msg and "approximate" not in result.attrs
+    assert result.equals(db.execute_query(sql))
+    
+    for sql in ("SELECT COUNT(DISTINCT Country) FROM trade;",
+                "SELECT MAX(Value) FROM trade WHERE Direction = 'I';",
+                "SELECT Country, SUM(Value) FROM trade GROUP BY Country HAVING SUM(Value) > 0;"):
+        success, result, msg = executor.execute(sql)
+        assert success and "approximate" not in result.attrs, sql
+        assert result.equals(db.execute_query(sql))
+
+
+class RecordingGroq:
+    def __init__(self):
+        self.prompts = []
+    
+    def generate(self, prompt, temperature=0.7, max_tokens=1024):
+        self.prompts.append(prompt)
+        return "Imports were about Rs 1,000."
+
+
+def test_approximate_answers_are_labelled(executor):
+    groq = RecordingGroq()
+    formatter = ResponseFormatter(groq)
+    sql = "SELECT Year, SUM(Value) AS total FROM trade WHERE Direction = 'I' GROUP BY Year ORDER BY Year;"
+    
+    success, result, msg = executor.execute(sql)
+    answer = formatter.format_result("Imports by year?", sql, result)
+    assert answer == "Approximate (95% confidence, estimated from a sample): Imports were about Rs 1,000."
+    assert "ESTIMATES" in groq.prompts[-1] and "total_ci_low=" in groq.prompts[-1]
+    assert "95% confidence interval" in groq.prompts[-1]
+    
+    success, result, msg = executor.execute(sql, approximate=False)
+    assert formatter.format_result("Imports by year?", sql, result) == "Imports were about Rs 1,000."
+    assert "ESTIMATES" not in groq.prompts[-1] and "actual data" in groq.prompts[-1]
@@ -0,0 +1,145 @@
+# Value catalog tests: literal checks, persistence and executor short-circuit (synthetic data, no models needed)
+
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+import pytest
+
+from src.catalog import ValueCatalog
+from src.database import TradeDatabase
+from src.executor import QueryExecutor
+from src.prompt_builder import SQLPromptBuilder
+from tests.synthetic_data import write_synthetic_csv
+from tests.test_data import TEST_CASES
+
+
+class CountingDatabase(TradeDatabase):
+    # Counts queries that reach DuckDB
+    
+    def __init__(self, csv_path):
+        super().__init__(csv_path, use_snapshot=False)
+        self.calls = 0
+    
+    def execute_query(self, sql, timeout=None, question=None):
+        self.calls += 1
+        return super().execute_query(sql, timeout=timeout, question=question)
+
+
+@pytest.fixture(scope="module")
+def csv_path(tmp_path_factory):
+    return write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=3000)
+
+
+@pytest.fixture(scope="module")
+def db(csv_path):
+    database = TradeDatabase(csv_path, use_snapshot=False)
+    database.load_data()
+    yield database
+    database.close()
+
+
+@pytest.mark.parametrize("sql, problem", [
+    ("SELECT SUM(Value) FROM trade WHERE Country = 'ZZ';", "Country 'ZZ'"),
+    ("SELECT SUM(Value) FROM trade WHERE 'ZZ' = Country AND Year = 2080;", "Country 'ZZ'"),
+    ("SELECT SUM(Value) FROM trade WHERE Country IN ('ZZ', 'QQ');", "Country 'ZZ', 'QQ'"),
+    ("SELECT SUM(Value) FROM trade WHERE Year = 2099;", "Year 2099"),
+    ("SELECT SUM(Value) FROM trade WHERE Unit = 'KG';", "closest: kg"),
+    ("SELECT SUM(Value) FROM trade WHERE Description LIKE '%unobtainium%';", "'unobtainium'"),
+])
+def test_unmatched_literals_reported(db, sql, problem):
+    problems = db.catalog().check(sql)
+    assert len(problems) == 1 and problem in problems[0]
+    assert pd.isna(db.execute_query(sql).iloc[0, 0])
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT SUM(Value) FROM trade WHERE Country IN ('ZZ', 'IN');",
+    "SELECT SUM(Value) FROM trade WHERE Country = 'ZZ' OR Year = 2080;",
+    "SELECT SUM(Value) FROM trade WHERE Description LIKE '%ric%';",
+    "SELECT SUM(Value) FROM trade WHERE Description LIKE '%r_ce%';",
+    "SELECT SUM(Value) FROM trade WHERE Year = '2099';",
+    "SELECT COUNT(*) FROM (SELECT * FROM trade WHERE Country = 'ZZ');",
+])
+def test_checks_are_conservative(db, sql):
+    assert db.catalog().check(sql) == []
+
+
+def test_flagged_test_cases_return_nothing(db):
+    # Every flagged query really has no matching rows
+    catalog = db.catalog()
+    for case in TEST_CASES:
+        if catalog.check(case["expected_sql"]):
+            result = db.execute_query(case["expected_sql"])
+            assert result.dropna(how="all").empty or (result.fillna(0) == 0).all().all(), case["expected_sql"]
+
+
+def test_catalog_saved_beside_snapshot(csv_path, tmp_path):
+    snapshot_path = tmp_path / "trade.duckdb"
+    with TradeDatabase(csv_path, snapshot_path=snapshot_path) as first:
+        first.load_data()
+        catalog_path = snapshot_path.with_suffix(".catalog.json")
+        assert catalog_path.exists()
+        assert ValueCatalog.load(catalog_path, first.data_version).values == first.catalog().values
+        assert ValueCatalog.load(catalog_path, "other version") is None
+        saved_at = catalog_path.stat().st_mtime_ns
+    
+    with TradeDatabase(csv_path, snapshot_path=snapshot_path) as second:
+        second.load_data()
+        assert catalog_path.stat().st_mtime_ns == saved_at
+        assert second.catalog().values == ValueCatalog.load(catalog_path, second.data_version).values
+
+
+def test_concurrent_saves_do_not_clobber(db, tmp_path):
+    catalog = db.catalog()
+    catalog_path = tmp_path / "trade.catalog.json"
+    workers = [threading.Thread(target=catalog.save, args=(catalog_path,)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    
+    assert ValueCatalog.load(catalog_path, db.data_version).values == catalog.values
+    assert [p.name for p in tmp_path.iterdir()] == ["trade.catalog.json"]
+    
+    # A save that cannot happen is skipped; the catalog is rebuilt next time
+    catalog.save(tmp_path / "missing" / "trade.catalog.json")
+    assert not (tmp_path / "missing").exists()
+
+
+def test_executor_skips_unmatchable_query(csv_path):
+    db = CountingDatabase(csv_path)
+    executor = QueryExecutor(log_failures=False, db=db)
+    
+    success, result, message = executor.execute("SELECT SUM(Value) FROM trade WHERE Country = 'ZZ';")
+    assert success and result.empty and "Country 'ZZ'" in message
+    assert db.calls == 0
+    
+    regenerated = []
+    def regenerate(question, error):
+        regenerated.append(error)
+        return "SELECT SUM(Value) FROM trade WHERE Country = 'IN';"
+    
+    success, result, message = executor.execute(
+        "SELECT SUM(Value) FROM trade WHERE Country = 'India';", "Imports from India?", regenerate
+    )
+    assert success and message.startswith("Regenerated: Success")
+    assert len(regenerated) == 1 and regenerated[0].startswith("No rows can match") and "India" in regenerated[0]
+    assert db.calls == 1
+    
+    unchecked = QueryExecutor(log_failures=False, db=db, check_literals=False)
+    unchecked.execute("SELECT SUM(Value) FROM trade WHERE Country = 'ZZ';")
+    assert db.calls == 2
+    db.close()
+
+
+def test_prompt_lists_catalog_values(db):
+    builder = SQLPromptBuilder(db.catalog())
+    prompt = builder.build_prompt("Rice imports?")
+    assert "Units: kg" in prompt and "Top countries:" in prompt
+    assert prompt.endswith("User Question: Rice imports?\n\nSQL:")
+    assert builder.check_literals("SELECT * FROM trade WHERE Direction = 'X';")
+    assert SQLPromptBuilder().check_literals("SELECT * FROM trade WHERE Direction = 'X';") == []
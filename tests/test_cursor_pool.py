@@ -0,0 +1,73 @@
+# Concurrent query tests over one pooled database (synthetic data, no models needed)
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+import pytest
+
+from src.cursor_pool import PoolTimeoutError
+from src.database import TradeDatabase
+from src.executor import QueryExecutor
+from tests.synthetic_data import write_synthetic_csv
+from tests.test_data import TEST_CASES
+
+THREADS = 32
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    csv_path = write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=5000)
+    # No result cache, so every query really runs concurrently
+    database = TradeDatabase(csv_path, use_snapshot=False, result_cache_bytes=0, pool_size=8)
+    database.load_data()
+    yield database
+    database.close()
+
+
+def test_concurrent_test_cases_match_serial_results(db):
+    queries = [case["expected_sql"] for case in TEST_CASES]
+    expected = {sql: db.execute_query(sql) for sql in queries}
+    executor = QueryExecutor(log_failures=False, db=db)
+    
+    in_flight = []
+    peak = [0]
+    lock = threading.Lock()
+    
+    def run(sql):
+        with lock:
+            in_flight.append(sql)
+            peak[0] = max(peak[0], len(in_flight))
+        try:
+            success, result, msg = executor.execute(sql)
+        finally:
+            with lock:
+                in_flight.remove(sql)
+        return sql, success, result, msg
+    
+    with ThreadPoolExecutor(max_workers=THREADS) as workers:
+        outcomes = list(workers.map(run, queries * 2))
+    
+    assert peak[0] > db.pool.size
+    assert db.pool.stats()["created"] <= db.pool.size
+    for sql, success, result, msg in outcomes:
+        assert success, f"{sql}: {msg}"
+        pd.testing.assert_frame_equal(
+            result.reset_index(drop=True), expected[sql].reset_index(drop=True),
+            check_exact=False, rtol=1e-9
+        )
+
+
+def test_checkout_times_out_when_pool_exhausted(tmp_path):
+    csv_path = write_synthetic_csv(tmp_path / "done_des.csv", n_rows=100)
+    with TradeDatabase(csv_path, use_snapshot=False, pool_size=1) as db:
+        with db.pool.checkout():
+            with pytest.raises(PoolTimeoutError):
+                db.pool.acquire(timeout=0.1)
+        
+        # The slot is free again once released
+        assert db.get_row_count() == 100
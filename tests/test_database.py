@@ -0,0 +1,177 @@
+# Shared database and executor fail-fast tests (synthetic data, no models needed)
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pyarrow as pa
+import pytest
+
+import src.database as database
+from src.database import TradeDatabase, QueryExecutionError, QueryTimeoutError, arrow_to_pandas
+from src.executor import QueryExecutor
+from tests.synthetic_data import write_synthetic_csv
+
+
+class CountingDatabase(TradeDatabase):
+    # Counts execute_query calls to observe retries
+    
+    def __init__(self, csv_path):
+        super().__init__(csv_path)
+        self.calls = 0
+    
+    def execute_query(self, sql, timeout=None, question=None):
+        self.calls += 1
+        return super().execute_query(sql, timeout=timeout, question=question)
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    return write_synthetic_csv(tmp_path / "done_des.csv", n_rows=2000)
+
+
+def test_shared_database_loads_once(csv_path, monkeypatch):
+    monkeypatch.setattr(database, "DATA_CSV_PATH", csv_path)
+    monkeypatch.setattr(database, "SNAPSHOT_PATH", csv_path.with_suffix(".duckdb"))
+    TradeDatabase.reset_shared()
+    try:
+        first = TradeDatabase.shared()
+        second = TradeDatabase.shared()
+        assert first is second
+        assert first.get_row_count() == 2000
+        
+        # Default executors all reuse the same loaded instance
+        assert QueryExecutor(log_failures=False).db is first
+        assert QueryExecutor(log_failures=False).db is first
+    finally:
+        TradeDatabase.reset_shared()
+
+
+def test_executor_uses_injected_database(csv_path):
+    db = CountingDatabase(csv_path)
+    executor = QueryExecutor(log_failures=False, db=db)
+    
+    for _ in range(3):
+        success, result, msg = executor.execute("SELECT COUNT(*) FROM trade;")
+        assert success
+        assert result.iloc[0, 0] == 2000
+    
+    assert db.calls == 3
+    db.close()
+
+
+def test_deterministic_error_fails_fast(csv_path):
+    db = CountingDatabase(csv_path)
+    executor = QueryExecutor(max_retries=2, log_failures=False, db=db, admission_control=False)
+    
+    success, result, msg = executor.execute("SELECT SUM(Missing_Column) FROM trade;")
+    
+    assert not success
+    assert "Binder Error" in msg
+    assert db.calls == 1
+    db.close()
+
+
+def test_execution_error_is_classified(csv_path):
+    with TradeDatabase(csv_path) as db:
+        with pytest.raises(QueryExecutionError) as exc_info:
+            db.execute_query("SELECT FROM WHERE trade")
+        assert exc_info.value.deterministic
+        assert str(exc_info.value).startswith("Query execution failed:")
+
+
+def test_long_query_is_interrupted(csv_path):
+    with TradeDatabase(csv_path) as db:
+        start = time.perf_counter()
+        with pytest.raises(QueryTimeoutError) as exc_info:
+            db.execute_query("SELECT SUM(hash(range)) FROM range(100000000000)", timeout=0.2)
+        assert time.perf_counter() - start < 0.2 + database.QUERY_TIMEOUT_GRACE + 1
+        assert not exc_info.value.deterministic
+        
+        # The database stays usable after an interrupt
+        assert db.get_row_count() == 2000
+
+
+def test_timed_out_limited_query_not_rerun(csv_path, monkeypatch):
+    import src.executor as executor_module
+    monkeypatch.setitem(executor_module.QUERY_TIMEOUTS, "rows", 0.2)
+    db = CountingDatabase(csv_path)
+    # Admission control would reject this cross product before it could time out
+    executor = QueryExecutor(max_retries=2, log_failures=False, db=db, admission_control=False)
+    
+    success, result, msg = executor.execute(
+        "SELECT Year FROM trade, range(100000000) ORDER BY random() LIMIT 5;"
+    )
+    
+    assert not success
+    assert "timeout" in msg.lower()
+    assert db.calls == 1
+    db.close()
+
+
+def test_stream_query_yields_bounded_batches(csv_path):
+    sql = "SELECT * FROM trade WHERE Value > 1000 ORDER BY Value"
+    with TradeDatabase(csv_path) as db:
+        expected = db.execute_query(sql)
+        batches = list(db.stream_query(sql, batch_size=256))
+        
+        assert all(batch.num_rows <= 256 for batch in batches)
+        assert sum(batch.num_rows for batch in batches) == len(expected)
+        streamed = arrow_to_pandas(pa.Table.from_batches(batches))
+        assert list(streamed.dtypes) == list(expected.dtypes)
+        assert streamed["Value"].tolist() == expected["Value"].tolist()
+        
+        # Abandoning a stream early releases its cursor
+        stream = db.stream_query(sql, batch_size=10)
+        assert next(stream).num_rows == 10
+        stream.close()
+        assert db.get_row_count() == 2000
+
+
+def test_preview_counts_without_materialising(csv_path):
+    sql = "SELECT * FROM trade WHERE Value > 1000 ORDER BY Value"
+    with TradeDatabase(csv_path) as db:
+        expected = db.execute_query(sql)
+        preview = db.preview_query(sql, max_rows=15, batch_size=100)
+        
+        assert len(preview) == 15
+        assert preview.attrs["total_rows"] == len(expected)
+        assert list(preview.columns) == list(expected.columns)
+        assert list(preview.dtypes) == list(expected.dtypes)
+        assert preview["Value"].tolist() == expected["Value"].head(15).tolist()
+        
+        executor = QueryExecutor(log_failures=False, db=db)
+        success, result, msg = executor.execute(sql, max_rows=15)
+        assert success and len(result) == 15
+        assert msg == f"Success: {len(expected)} rows"
+
+
+def test_hs_levels_derived_and_sorted(csv_path):
+    with open(csv_path, 'a', encoding='utf-8') as f:
+        f.write("2082,1,I,9024000,black tea lost its zero,IN,10.0,1.0,kg,1.0\n")
+        f.write("2082,1,I,27AB,malformed code,IN,10.0,1.0,kg,1.0\n")
+        f.write("2082,1,I,10121,five digit code,IN,10.0,1.0,kg,1.0\n")
+    
+    with TradeDatabase(csv_path, use_snapshot=False) as db:
+        rows = db.execute_query("""
+            SELECT HS_Code, HS2, HS4, HS6 FROM trade
+            WHERE Description IN ('black tea lost its zero', 'malformed code', 'five digit code')
+            ORDER BY HS_Code
+        """)
+        assert rows.values.tolist()[0] == ["09024000", 9, 902, 90240]
+        # Only 7-digit codes are padded
+        short = rows.iloc[1]
+        assert short["HS_Code"] == "10121" and (short["HS2"], short["HS4"]) == (10, 1012)
+        assert short[["HS6"]].isna().all()
+        malformed = rows.iloc[2]
+        assert malformed["HS_Code"] == "27AB" and malformed["HS2"] == 27
+        assert malformed[["HS4", "HS6"]].isna().all()
+        
+        assert db.execute_query(
+            "SELECT COUNT(*) FROM trade WHERE HS2 = 27"
+        ).iloc[0, 0] == db.execute_query("SELECT COUNT(*) FROM trade WHERE HS_Code LIKE '27%'").iloc[0, 0]
+        
+        chapters = db.execute_query("SELECT HS2 FROM trade")["HS2"]
+        assert chapters.dropna().is_monotonic_increasing
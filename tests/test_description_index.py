@@ -0,0 +1,122 @@
+# Description substring index tests against a plain LIKE scan (synthetic data, no models needed)
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+import pytest
+
+from src.database import TradeDatabase
+from src.description_index import DescriptionIndex, DescriptionRewriter
+from src.executor import QueryExecutor
+from tests.synthetic_data import COMMODITIES, write_synthetic_csv
+from tests.test_data import TEST_CASES
+
+EXTRA_QUERIES = [
+    "SELECT COUNT(*) FROM trade WHERE Description ILIKE '%WHEAT%';",
+    "SELECT COUNT(*) FROM trade WHERE Description NOT LIKE '%oil%';",
+    "SELECT COUNT(*) FROM trade WHERE Description NOT ILIKE '%Rice%' AND Year = 2080;",
+    "SELECT SUM(Value) FROM trade WHERE LOWER(Description) LIKE '%copper%';",
+    "SELECT COUNT(*) FROM trade WHERE Description LIKE '%no such commodity%';",
+    "SELECT COUNT(*) FROM trade WHERE Description NOT LIKE '%no such commodity%';",
+    "SELECT Description, COUNT(*) FROM trade WHERE Description LIKE '%ri%' GROUP BY Description ORDER BY 1;",
+    "SELECT COUNT(*) FROM trade WHERE Description LIKE '%Wheat%';",
+    "SELECT COUNT(*) FROM trade WHERE Description LIKE '%o''s%';",
+    "SELECT Country, SUM(Value) FROM trade WHERE Country IN "
+    "(SELECT Country FROM trade WHERE Description LIKE '%gold%') GROUP BY Country ORDER BY 1;",
+]
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    csv_path = write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=5000)
+    database = TradeDatabase(csv_path, use_snapshot=False)
+    database.load_data()
+    yield database
+    database.close()
+
+
+def test_lookup_matches_substring_scan():
+    descriptions = [description for _, description, _ in COMMODITIES] + ["Wheat Flour", "ice"]
+    index = DescriptionIndex(descriptions)
+    
+    for term in ["wheat", "Wheat", "oil", "ri", "i", "", "e o", "zzz", "fractions"]:
+        assert index.lookup(term) == sorted(d for d in set(descriptions) if term in d)
+        assert index.lookup(term, case_sensitive=False) == sorted(
+            d for d in set(descriptions) if term.lower() in d.lower()
+        )
+
+
+def test_rewritten_queries_match_plain_scan(db):
+    rewriter = DescriptionRewriter(db.description_index())
+    queries = [case["expected_sql"] for case in TEST_CASES if "Description" in case["expected_sql"]]
+    queries += EXTRA_QUERIES
+    rewritten_count = 0
+    
+    for sql in queries:
+        rewritten_sql = rewriter.rewrite(sql)
+        if rewritten_sql == sql:
+            continue
+        rewritten_count += 1
+        assert " LIKE " not in rewritten_sql.upper(), rewritten_sql
+        
+        expected = db.execute_query(sql)
+        actual = db.execute_query(rewritten_sql)
+        assert list(actual.columns) == list(expected.columns), sql
+        pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-9)
+    
+    assert rewritten_count >= 20
+
+
+def test_broad_terms_and_other_patterns_left_alone(db):
+    rewriter = DescriptionRewriter(db.description_index(), max_matches=5)
+    for sql in [
+        "SELECT COUNT(*) FROM trade WHERE Description LIKE '%e%';",
+        "SELECT COUNT(*) FROM trade WHERE Description LIKE 'wheat%';",
+        "SELECT COUNT(*) FROM trade WHERE Description LIKE '%wh_at%';",
+        "SELECT COUNT(*) FROM trade WHERE Unit LIKE '%k%';",
+        "SELECT Description LIKE '%wheat%' FROM trade;",
+    ]:
+        assert rewriter.rewrite(sql) == sql
+
+
+def test_executor_serves_like_from_index(db):
+    executor = QueryExecutor(log_failures=False, db=db, route_rollups=False)
+    sql = "SELECT SUM(Value) FROM trade WHERE Description LIKE '%wheat%' AND Direction = 'I';"
+    assert "IN (" in executor._prepare(sql)
+    
+    success, result, msg = executor.execute(sql)
+    assert success
+    expected = db.execute_query(sql)
+    assert result.iloc[0, 0] == pytest.approx(expected.iloc[0, 0])
+
+
+def test_derived_description_columns_not_rewritten(db):
+    rewriter = DescriptionRewriter(db.description_index())
+    executor = QueryExecutor(log_failures=False, db=db, route_rollups=False)
+    for sql in [
+        "SELECT COUNT(*) FROM (SELECT Description || ' rice' AS Description FROM trade) t "
+        "WHERE Description LIKE '%rice%';",
+        "WITH d AS (SELECT Description || ' rice' AS Description FROM trade) "
+        "SELECT COUNT(*) FROM d WHERE Description LIKE '%rice%';",
+        "WITH trade AS (SELECT Description || ' rice' AS Description FROM done_des) "
+        "SELECT COUNT(*) FROM trade WHERE Description LIKE '%rice%';",
+        "SELECT COUNT(*) FROM trade a JOIN (SELECT Country, 'rice' AS Description FROM trade) b "
+        "USING (Country) WHERE b.Description LIKE '%rice%' AND a.Year = 2080;",
+    ]:
+        assert rewriter.rewrite(sql) == sql, sql
+    
+    sql = ("SELECT COUNT(*) FROM (SELECT Description || ' rice' AS Description FROM trade) t "
+           "WHERE Description LIKE '%rice%';")
+    success, result, msg = executor.execute(sql)
+    assert success
+    assert result.iloc[0, 0] == 5000
+    
+    # A trade scan nested inside still is
+    nested = ("SELECT COUNT(*) FROM (SELECT Description FROM trade WHERE Description LIKE '%wheat%') t "
+              "WHERE Description LIKE '%wheat%';")
+    rewritten = rewriter.rewrite(nested)
+    assert "IN (" in rewritten and "~~ '%wheat%'" in rewritten
+    pd.testing.assert_frame_equal(db.execute_query(rewritten), db.execute_query(nested))
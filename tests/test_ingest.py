@@ -0,0 +1,176 @@
+# Incremental (Year, Month) partition ingest tests (synthetic data, no models needed)
+
+import csv
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.database import TradeDatabase
+from src.rollups import ROLLUPS, rollup_sql
+from src.snapshot import ensure_snapshot, read_meta
+from tests.synthetic_data import COLUMNS, generate_rows, write_synthetic_csv
+
+PARTITION_COUNT = "SELECT COUNT(*) FROM trade WHERE Year = 2080 AND Month = 5"
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    return write_synthetic_csv(tmp_path / "done_des.csv", n_rows=3000)
+
+
+def write_month(path, n_rows, year=2080, month=5, seed=3):
+    # One month of rows, with a country and a description the base data lacks
+    rows = generate_rows(n_rows, seed)
+    for i, row in enumerate(rows):
+        row.update(Year=year, Month=month)
+        if i % 10 == 0:
+            row.update(Country="ZZ", Description="freshly listed commodity")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def assert_rollups_match_rebuild(db):
+    for table, dimensions in ROLLUPS.items():
+        actual = db.conn.execute(f"SELECT * FROM {table} ORDER BY ALL").fetchall()
+        expected = db.conn.execute(f"SELECT * FROM ({rollup_sql(dimensions, 'trade')}) ORDER BY ALL").fetchall()
+        assert len(actual) == len(expected)
+        for got, want in zip(actual, expected):
+            assert got[:len(dimensions) + 1] == want[:len(dimensions) + 1]
+            assert got[len(dimensions) + 1:] == pytest.approx(want[len(dimensions) + 1:])
+
+
+def test_replace_partition_in_memory(csv_path, tmp_path):
+    with TradeDatabase(csv_path, use_snapshot=False) as db:
+        total = db.get_row_count()
+        before = db.execute_query(PARTITION_COUNT).iloc[0, 0]
+        others = db.execute_query("SELECT SUM(Value) FROM trade WHERE NOT (Year = 2080 AND Month = 5)").iloc[0, 0]
+        version = db.data_version
+        assert db.description_index().lookup("freshly") == []
+        
+        partition = db.replace_partition(write_month(tmp_path / "month.csv", 120))
+        
+        assert (partition["year"], partition["month"]) == (2080, 5)
+        assert (partition["deleted"], partition["inserted"]) == (before, 120)
+        assert partition["widened_enums"] == ["Country"]
+        assert db.data_version != version
+        
+        # The cached count is not served for the new data version
+        assert db.execute_query(PARTITION_COUNT).iloc[0, 0] == 120
+        assert db.get_row_count() == total - before + 120
+        assert db.execute_query(
+            "SELECT SUM(Value) FROM trade WHERE NOT (Year = 2080 AND Month = 5)"
+        ).iloc[0, 0] == pytest.approx(others)
+        assert db.execute_query("SELECT COUNT(*) FROM trade WHERE Country = 'ZZ'").iloc[0, 0] == 12
+        assert db.description_index().lookup("freshly") == ["freshly listed commodity"]
+        assert_rollups_match_rebuild(db)
+
+
+def test_replace_partition_in_snapshot(csv_path, tmp_path):
+    month_csv = write_month(tmp_path / "month.csv", 80)
+    with TradeDatabase(csv_path) as db:
+        db.execute_query(PARTITION_COUNT)
+        db.replace_partition(month_csv)
+        assert db.execute_query(PARTITION_COUNT).iloc[0, 0] == 80
+        version = db.data_version
+    
+    # The next start reuses the updated snapshot rather than rebuilding from the CSV
+    meta = ensure_snapshot(csv_path, csv_path.with_suffix(".duckdb"))
+    assert meta["data_version"] == version
+    assert [(p["year"], p["month"]) for p in meta["partitions"]] == [(2080, 5)]
+    with TradeDatabase(csv_path) as db:
+        assert db.data_version == version
+        assert db.execute_query(PARTITION_COUNT).iloc[0, 0] == 80
+        assert_rollups_match_rebuild(db)
+
+
+def test_snapshot_ingest_leaves_attached_readers_alone(csv_path, tmp_path):
+    month_csv = write_month(tmp_path / "month.csv", 80)
+    with TradeDatabase(csv_path) as reader, TradeDatabase(csv_path) as writer:
+        before = reader.execute_query(PARTITION_COUNT).iloc[0, 0]
+        writer.replace_partition(month_csv)
+        assert writer.execute_query(PARTITION_COUNT).iloc[0, 0] == 80
+        # The other process still reads the snapshot it attached
+        assert reader.execute_query(PARTITION_COUNT).iloc[0, 0] == before
+        assert reader.get_row_count() == 3000
+    assert sorted(p.name for p in tmp_path.iterdir() if p.name.startswith("done_des.duckdb")) == ["done_des.duckdb"]
+
+
+def test_rebuild_replays_ingested_partitions(csv_path, tmp_path):
+    snapshot_path = csv_path.with_suffix(".duckdb")
+    month_csv = write_month(tmp_path / "month.csv", 80)
+    with TradeDatabase(csv_path) as db:
+        db.replace_partition(month_csv)
+    month_csv.unlink()
+    
+    # A changed CSV rebuilds the snapshot, which keeps the ingested month
+    write_synthetic_csv(csv_path, n_rows=2000, seed=11)
+    meta = ensure_snapshot(csv_path, snapshot_path)
+    assert [(p["year"], p["month"], p["inserted"]) for p in meta["partitions"]] == [(2080, 5, 80)]
+    assert meta["data_version"] != meta["checksum"]
+    with TradeDatabase(csv_path) as db:
+        assert db.data_version == meta["data_version"]
+        assert db.execute_query(PARTITION_COUNT).iloc[0, 0] == 80
+        assert db.execute_query("SELECT COUNT(*) FROM trade WHERE Country = 'ZZ'").iloc[0, 0] == 8
+        assert db.get_row_count() == meta["row_count"]
+        assert_rollups_match_rebuild(db)
+
+
+def test_replace_partition_in_parquet(csv_path, tmp_path):
+    month_csv = write_month(tmp_path / "month.csv", 80)
+    with TradeDatabase(csv_path, use_parquet=True) as db:
+        before = db.execute_query("SELECT Year, COUNT(*) FROM trade WHERE Year <> 2080 GROUP BY Year ORDER BY Year")
+        partition = db.replace_partition(month_csv)
+        assert partition["inserted"] == 80
+        assert db.execute_query(PARTITION_COUNT).iloc[0, 0] == 80
+        assert db.execute_query("SELECT COUNT(*) FROM trade WHERE Country = 'ZZ'").iloc[0, 0] == 8
+        version = db.data_version
+    
+    # Other years are untouched, and the next start reuses the rewritten dataset
+    meta = read_meta(csv_path.with_name("done_des_parquet"))
+    assert meta["data_version"] == version and meta["row_count"] == 3000 - partition["deleted"] + 80
+    with TradeDatabase(csv_path, use_parquet=True) as db:
+        assert db.data_version == version
+        assert db.execute_query(PARTITION_COUNT).iloc[0, 0] == 80
+        assert db.execute_query(
+            "SELECT Year, COUNT(*) FROM trade WHERE Year <> 2080 GROUP BY Year ORDER BY Year"
+        ).equals(before)
+        assert_rollups_match_rebuild(db)
+
+
+def test_parquet_ingest_publishes_a_new_generation(csv_path, tmp_path):
+    dataset_dir = csv_path.with_name("done_des_parquet")
+    with TradeDatabase(csv_path, use_parquet=True) as reader, TradeDatabase(csv_path, use_parquet=True) as writer:
+        first = (dataset_dir / "current").resolve()
+        writer.replace_partition(write_month(tmp_path / "month.csv", 80))
+        second = (dataset_dir / "current").resolve()
+        
+        # Unchanged years are the same files, linked into the new generation
+        assert second != first
+        unchanged = sorted((first / "trade" / "Year=2079").rglob("*.parquet"))
+        assert unchanged
+        for path in unchanged:
+            assert (second / path.relative_to(first)).stat().st_ino == path.stat().st_ino
+        
+        # Views in other processes read through the link too
+        assert reader.execute_query(PARTITION_COUNT).iloc[0, 0] == 80
+        
+        # The replaced generation is kept for queries still reading it, older ones go
+        assert first.exists()
+        writer.replace_partition(write_month(tmp_path / "june.csv", 40, month=6))
+        assert sorted(dataset_dir.glob("gen-*")) == [second, (dataset_dir / "current").resolve()]
+
+
+def test_multi_month_file_rejected(csv_path, tmp_path):
+    bad_csv = write_synthetic_csv(tmp_path / "months.csv", n_rows=50)
+    with TradeDatabase(csv_path, use_snapshot=False) as db:
+        version = db.data_version
+        with pytest.raises(ValueError, match="exactly one"):
+            db.replace_partition(bad_csv)
+        assert db.get_row_count() == 3000
+        assert db.data_version == version
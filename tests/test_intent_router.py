@@ -0,0 +1,100 @@
+# Intent router: routed TEST_CASES return the expected results, and questions with words
+# the router does not understand go to the model (synthetic data, no models needed)
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+import pytest
+
+from src.database import TradeDatabase
+from src.intent_router import IntentRouter
+from tests.synthetic_data import TOTAL_ROW, write_synthetic_csv
+from tests.test_data import TEST_CASES
+
+# Cases whose expected SQL reads the question differently from similar cases
+OTHER_READINGS = {
+    "Trade records for HS code 10019100?",  # Rows, where "Trade records in 2079?" counts them
+    "HS codes exported to USA?",  # A count, where "HS codes imported from China?" lists them
+}
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    csv_path = write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=3000)
+    database = TradeDatabase(csv_path, use_snapshot=False)
+    database.load_data()
+    yield database
+    database.close()
+
+
+def rows(db, sql):
+    frame = db.execute_query(sql)
+    return sorted((tuple(None if pd.isna(value) else round(value, 4) if isinstance(value, float) else value
+                         for value in row) for row in frame.itertuples(index=False)), key=repr)
+
+
+def test_routed_questions_return_the_expected_results(db):
+    router = IntentRouter(db.catalog())
+    routed = 0
+    for case in TEST_CASES:
+        sql = router.route(case["question"])
+        if sql is None or case["question"] in OTHER_READINGS:
+            continue
+        routed += 1
+        assert rows(db, sql) == rows(db, case["expected_sql"]), (case["question"], sql)
+    assert routed >= 100
+    assert router.stats()["routed"] == routed + len(OTHER_READINGS)
+
+
+def test_intents(db):
+    router = IntentRouter(db.catalog())
+    assert router.route("Top 5 import sources in 2081?") == (
+        "SELECT Country, SUM(Value) FROM trade WHERE Year = 2081 AND Direction = 'I' "
+        "GROUP BY Country ORDER BY SUM(Value) DESC LIMIT 5;"
+    )
+    assert router.route("Total quantity of sugar exported to Bhutan in Magh?") == (
+        "SELECT SUM(Quantity) FROM trade WHERE Description LIKE '%sugar%' AND Country = 'BT' "
+        "AND Month = 10 AND Direction = 'E';"
+    )
+    assert router.route("Imports from India and China by year?") == (
+        "SELECT Year, Country, SUM(Value) FROM trade WHERE Country IN ('IN', 'CN') AND Direction = 'I' "
+        "GROUP BY Year, Country ORDER BY Year;"
+    )
+    assert router.route("Number of countries we import wheat from?") == (
+        "SELECT COUNT(DISTINCT Country) FROM trade WHERE Description LIKE '%wheat%' AND Direction = 'I';"
+    )
+
+
+def test_hs_codes_with_non_numeric_codes_present(tmp_path):
+    # HS_Code is text: a 'TOTAL' row must not break the comparison
+    csv_path = write_synthetic_csv(tmp_path / "done_des.csv", n_rows=3000, extra_rows=(TOTAL_ROW,))
+    with TradeDatabase(csv_path, use_snapshot=False) as db:
+        router = IntentRouter(db.catalog())
+        for question, condition, expected in [
+            ("Total imports for HS code 10019100?", "HS_Code = '10019100'", "HS_Code = '10019100'"),
+            ("Total imports for HS code 100191?", "HS6 = 100191", "HS_Code LIKE '100191%'"),
+            ("Total imports for HS code 1001?", "HS4 = 1001", "HS_Code LIKE '1001%'"),
+            ("Total imports for HS code 10?", "HS2 = 10", "HS_Code LIKE '10%'"),
+        ]:
+            sql = router.route(question)
+            assert sql == f"SELECT SUM(Value) FROM trade WHERE Direction = 'I' AND {condition};"
+            expected_sql = f"SELECT SUM(Value) FROM trade WHERE Direction = 'I' AND {expected};"
+            assert rows(db, sql) == rows(db, expected_sql) != [(None,)]
+        
+        # A code with a digit missing is not guessed at
+        assert router.route("Total imports for HS code 1001910?") is None
+
+
+@pytest.mark.parametrize("question", [
+    "Imports from India excluding gold?",
+    "Rice imports not from India?",
+    "What is the trade deficit with India?",
+    "Imports of rice after 2080?",
+    "Average monthly trade value?",
+    "Top 5 countries by year?",
+])
+def test_questions_it_cannot_read_go_to_the_model(db, question):
+    assert IntentRouter(db.catalog()).route(question) is None
@@ -0,0 +1,130 @@
+# Keyset-paginated cursors: pages reassemble the full result in order, tokens expire (synthetic data, no models needed)
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+import pytest
+
+from src.database import TradeDatabase
+from src.executor import QueryExecutor
+from src.paging import KeysetQuery, PageCursor, PageCursorError, ResultPager
+from tests.synthetic_data import write_synthetic_csv
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    csv_path = write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=3000)
+    database = TradeDatabase(csv_path, use_snapshot=False, result_cache_bytes=0)
+    database.load_data()
+    yield database
+    database.close()
+
+
+def all_pages(pager, sql, page_size):
+    page = pager.open(sql, page_size)
+    pages = [page]
+    while page.attrs["next_page"]:
+        page = pager.next_page(page.attrs["next_page"])
+        pages.append(page)
+    assert [page.attrs["page"] for page in pages] == list(range(1, len(pages) + 1))
+    assert all(len(page) <= page_size for page in pages)
+    return pd.concat(pages, ignore_index=True)
+
+
+@pytest.mark.parametrize("sql, sort_columns", [
+    # Ordered results come back in the same order (ties in any order)
+    ("SELECT Country, Value FROM trade WHERE Value > 1000 ORDER BY Value DESC", ["Value"]),
+    ("SELECT Country, SUM(Value) AS total FROM trade GROUP BY Country ORDER BY total DESC", ["total"]),
+    ("SELECT Country, Value FROM trade ORDER BY 2, 1", ["Value", "Country"]),
+    ("SELECT * FROM trade ORDER BY Quantity NULLS FIRST", None),
+    ("SELECT Country FROM trade ORDER BY Value * 2 DESC", None),
+    # Many identical rows
+    ("SELECT Country, Direction FROM trade", None),
+    ("SELECT DISTINCT Country FROM trade ORDER BY Country DESC", ["Country"]),
+    ("SELECT Country, Value FROM trade ORDER BY Value DESC LIMIT 25", ["Value"]),
+])
+def test_pages_reassemble_result(db, sql, sort_columns):
+    full = db.execute_query(sql)
+    paged = all_pages(ResultPager(db), sql, 7)
+    assert len(paged) == len(full)
+    if sort_columns:
+        pd.testing.assert_frame_equal(paged[sort_columns], full[sort_columns], check_dtype=False)
+    
+    columns = list(full.columns)
+    pd.testing.assert_frame_equal(
+        paged.sort_values(columns).reset_index(drop=True),
+        full.sort_values(columns).reset_index(drop=True),
+        check_dtype=False
+    )
+
+
+def test_hidden_order_follows_expression(db):
+    sql = "SELECT Country, Value FROM trade ORDER BY Value * -1"
+    paged = all_pages(ResultPager(db), sql, 50)
+    assert paged["Value"].is_monotonic_decreasing
+
+
+def test_duplicates_do_not_grow_page_queries(db):
+    # ~1500 identical rows per Direction: every page query still fetches page_size + 2 groups
+    pager = ResultPager(db)
+    cursor = PageCursor(KeysetQuery("SELECT Direction FROM trade", pager._describe), 10, db.data_version, None, None)
+    limits, pages = [], []
+    
+    def run(sql, params):
+        limits.append(int(sql.split("LIMIT")[-1]))
+        return db.execute_page(sql, params)
+    
+    more = True
+    while more:
+        page, more = cursor.fetch(run)
+        pages.append(page)
+    
+    assert set(limits) == {12}
+    paged = pd.concat(pages, ignore_index=True)
+    assert paged["Direction"].value_counts().to_dict() == (
+        db.execute_query("SELECT Direction, COUNT(*) AS n FROM trade GROUP BY Direction").set_index("Direction")["n"].to_dict()
+    )
+    assert paged["Direction"].is_monotonic_increasing
+
+
+def test_tokens_expire_and_evict(db):
+    pager = ResultPager(db, page_size=10, idle_seconds=0)
+    page = pager.open("SELECT * FROM trade")
+    with pytest.raises(PageCursorError):
+        pager.next_page(page.attrs["next_page"])
+    assert pager.cursors.stats()["expired"] == 1
+    
+    pager = ResultPager(db, page_size=10, max_cursors=2)
+    tokens = [pager.open("SELECT * FROM trade").attrs["next_page"] for _ in range(3)]
+    with pytest.raises(PageCursorError):
+        pager.next_page(tokens[0])
+    assert pager.next_page(tokens[2]).attrs["page"] == 2
+    
+    # The last page closes its cursor
+    page = pager.open("SELECT DISTINCT Direction FROM trade")
+    assert page.attrs["next_page"] is None
+    assert pager.cursors.stats()["open"] == 2
+
+
+def test_data_change_invalidates_cursor(db, monkeypatch):
+    pager = ResultPager(db, page_size=10)
+    token = pager.open("SELECT * FROM trade").attrs["next_page"]
+    monkeypatch.setattr(db, "data_version", "changed")
+    with pytest.raises(PageCursorError):
+        pager.next_page(token)
+
+
+def test_executor_pages(db):
+    executor = QueryExecutor(log_failures=False, db=db)
+    success, page, message = executor.execute_paged("SELECT * FROM trade WHERE Year = 2080;", page_size=100)
+    assert success and len(page) == 100 and message == "Success: page 1, 100 rows (more rows follow)"
+    
+    success, page, message = executor.next_page(page.attrs["next_page"])
+    assert success and page.attrs["page"] == 2
+    
+    assert executor.next_page("unknown")[0] is False
+    assert executor.execute_paged("DELETE FROM trade")[0] is False
+    assert executor.execute_paged("SELECT * FROM trade WHERE Country = 'ZZ';")[2].startswith("No data found")
@@ -0,0 +1,78 @@
+# Partitioned Parquet dataset build, reuse and pruning tests (synthetic data, no models needed)
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+import pytest
+
+from src.database import TradeDatabase
+from src.parquet_store import ensure_parquet
+from tests.synthetic_data import write_synthetic_csv
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    return write_synthetic_csv(tmp_path / "done_des.csv", n_rows=3000)
+
+
+def scan_info(db, sql):
+    # extra_info of the Parquet scan in the query plan
+    nodes = db.explain(sql)
+    while nodes:
+        node = nodes.pop()
+        if node["name"].strip() == "READ_PARQUET":
+            return node["extra_info"]
+        nodes.extend(node.get("children", []))
+    raise AssertionError(f"No Parquet scan in plan for {sql}")
+
+
+def test_dataset_built_once_and_partitioned(csv_path):
+    dataset_dir = csv_path.with_name("done_des_parquet")
+    first = ensure_parquet(csv_path, dataset_dir)
+    assert first["row_count"] == 3000
+    assert sorted(p.name for p in (dataset_dir / "current" / "trade").iterdir())[0] == "Year=2077"
+    assert {p.name for p in (dataset_dir / "current" / "trade" / "Year=2080").iterdir()} == {"Direction=E", "Direction=I"}
+    
+    assert ensure_parquet(csv_path, dataset_dir)["built_at"] == first["built_at"]
+    
+    write_synthetic_csv(csv_path, n_rows=500, seed=11)
+    assert ensure_parquet(csv_path, dataset_dir)["row_count"] == 500
+
+
+def test_parquet_matches_table(csv_path):
+    sql = """
+        SELECT Year, Direction, Country, SUM(Value) AS total, COUNT(*) AS n, MAX(Description) AS d
+        FROM trade WHERE Month <= 6 GROUP BY ALL ORDER BY ALL
+    """
+    with TradeDatabase(csv_path, use_snapshot=False) as table_db, TradeDatabase(csv_path, use_parquet=True) as parquet_db:
+        expected = table_db.execute_query(sql)
+        actual = parquet_db.execute_query(sql)
+        expected = expected.astype({"Direction": str, "Country": str})
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        assert parquet_db.data_version == table_db.data_version
+        
+        # Rollups are exported too, so aggregates are still routed to them
+        for table in ("trade_rollup_hs", "trade_rollup_ymdc"):
+            assert parquet_db.execute_query(f"SELECT SUM(row_count) FROM {table}").iloc[0, 0] == 3000
+        
+        # A file with more than one month is rejected before any file is replaced
+        with pytest.raises(ValueError, match="exactly one"):
+            parquet_db.replace_partition(csv_path)
+        assert parquet_db.execute_query(sql).equals(actual)
+        assert len(list(csv_path.with_name("done_des_parquet").glob("gen-*"))) == 1
+
+
+def test_year_and_direction_filters_prune_files(csv_path):
+    with TradeDatabase(csv_path, use_parquet=True) as db:
+        info = scan_info(db, "SELECT SUM(Value) FROM trade WHERE Year = 2080 AND Direction = 'I'")
+        assert info["Scanning Files"] == "1/12"
+        
+        info = scan_info(db, "SELECT COUNT(*) FROM trade WHERE Year IN (2080, 2081)")
+        assert info["Scanning Files"] == "4/12"
+        
+        info = scan_info(db, "SELECT COUNT(*) FROM trade WHERE Country = 'IN'")
+        assert "Scanning Files" not in info
+        assert "Country='IN'" in info["Filters"]
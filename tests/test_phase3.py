@@ -18,12 +18,11 @@ class GroqFixer:
     
     def __init__(self, groq: GroqClient):
         self.groq = groq
-        self.last_error = ""
         self.last_sql = ""
     
-    def fix(self, question: str) -> str:
-        """Fix SQL using Groq with last error context."""
-        return self.groq.fix_sql(question, self.last_sql, self.last_error)
+    def fix(self, question: str, error: str) -> str:
+        """Fix SQL using Groq with the executor's error."""
+        return self.groq.fix_sql(question, self.last_sql, error)
 
 
 def test_phase3_complete():
@@ -84,10 +83,6 @@ def test_phase3_complete():
             fixer.fix
         )
         
-        # Store error for next iteration
-        if not success:
-            fixer.last_error = msg
-        
         if success:
             # Validate with Groq
             is_valid = groq.validate_sql(question, clean_sql, result)
@@ -6,6 +6,7 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from config.settings import PREVIEW_ROWS
 from src.models import ModelLoader
 from src.prompt_builder import SQLPromptBuilder
 from src.executor import QueryExecutor
@@ -18,11 +19,10 @@ class GroqFixer:
     
     def __init__(self, groq: GroqClient):
         self.groq = groq
-        self.last_error = ""
         self.last_sql = ""
     
-    def fix(self, question: str) -> str:
-        return self.groq.fix_sql(question, self.last_sql, self.last_error)
+    def fix(self, question: str, error: str) -> str:
+        return self.groq.fix_sql(question, self.last_sql, error)
 
 
 def test_phase4():
@@ -34,8 +34,8 @@ def test_phase4():
     model = ModelLoader()
     model.load_sql_generator()
     
-    builder = SQLPromptBuilder()
     executor = QueryExecutor(max_retries=2, log_failures=False)
+    builder = SQLPromptBuilder(executor.db.catalog())
     formatter = ResponseFormatter()
     groq = GroqClient()
     fixer = GroqFixer(groq)
@@ -64,10 +64,9 @@ def test_phase4():
         
         # Phase 3: Execute with Groq fixing on error
         fixer.last_sql = clean_sql
-        success, result, msg = executor.execute(clean_sql, question, fixer.fix)
+        success, result, msg = executor.execute(clean_sql, question, fixer.fix, max_rows=PREVIEW_ROWS)
         
         if not success:
-            fixer.last_error = msg
             print(f"    Phase 3 - Error: {msg}")
             print()
             continue
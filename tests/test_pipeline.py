@@ -0,0 +1,156 @@
+# Sync and asyncio pipeline tests with stand-ins for the local model and Groq (synthetic data, no models needed)
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.database import TradeDatabase
+from src.executor import QueryExecutor
+from src.formatter import ResponseFormatter
+from src.pipeline import AsyncQueryPipeline, QueryPipeline
+from src.prompt_builder import SQLPromptBuilder
+from tests.synthetic_data import write_synthetic_csv
+from tests.test_data import TEST_CASES
+
+
+class ScriptedModel:
+    # Returns a fixed SQL per question and records how many generations overlap
+    
+    def __init__(self, sql):
+        self.sql = sql
+        self.running = self.max_running = 0
+        self._lock = threading.Lock()
+    
+    def generate_sql(self, prompt):
+        question = prompt.rsplit("User Question: ", 1)[1].rsplit("\n\nSQL:", 1)[0]
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.001)
+        with self._lock:
+            self.running -= 1
+        return self.sql[question]
+
+
+class ScriptedGroq:
+    # Answers with the question it was asked about; fixes SQL from a lookup table
+    
+    def __init__(self, fixes=None):
+        self.fixes = fixes or {}
+        self.errors = []
+        self.blocking_calls = 0
+    
+    def generate(self, prompt, temperature=0.7, max_tokens=1024):
+        self.blocking_calls += 1
+        return f"answer to {prompt.split('Question: ')[1].splitlines()[0]}"
+    
+    async def agenerate(self, prompt, temperature=0.7, max_tokens=1024):
+        await asyncio.sleep(0.01)
+        return f"answer to {prompt.split('Question: ')[1].splitlines()[0]}"
+    
+    def fix_sql(self, question, bad_sql, error_msg):
+        self.blocking_calls += 1
+        self.errors.append(error_msg)
+        return self.fixes[question]
+    
+    async def afix_sql(self, question, bad_sql, error_msg):
+        await asyncio.sleep(0.01)
+        self.errors.append(error_msg)
+        return self.fixes[question]
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    csv_path = write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=3000)
+    database = TradeDatabase(csv_path, use_snapshot=False)
+    database.load_data()
+    yield database
+    database.close()
+
+
+def make_pipeline(db, sql, fixes=None, **options):
+    groq = ScriptedGroq(fixes)
+    executor = QueryExecutor(log_failures=False, db=db)
+    return QueryPipeline(
+        ScriptedModel(sql), executor, groq, SQLPromptBuilder(db.catalog()), ResponseFormatter(groq), **options
+    )
+
+
+def test_async_answers_match_sync(db):
+    cases = TEST_CASES[:40]
+    # Every question goes to the model
+    pipeline = make_pipeline(
+        db, {case["question"]: case["expected_sql"] for case in cases}, use_templates=False, use_router=False
+    )
+    questions = [case["question"] for case in cases] * 5
+    
+    sync_answers = [pipeline.answer(question) for question in questions]
+    calls = pipeline.groq.blocking_calls
+    
+    async def run():
+        async with AsyncQueryPipeline(pipeline, query_workers=4, max_in_flight=50) as async_pipeline:
+            return await async_pipeline.answer_many(questions)
+    
+    async_answers = asyncio.run(run())
+    for sync_answer, async_answer in zip(sync_answers, async_answers):
+        assert async_answer["question"] == sync_answer["question"]
+        assert async_answer["answer"] == sync_answer["answer"]
+        assert async_answer["success"] == sync_answer["success"]
+    
+    # Groq went through the async client only, and the model ran one call at a time
+    assert pipeline.groq.blocking_calls == calls
+    assert pipeline.model.max_running == 1
+
+
+def test_async_regeneration_uses_async_groq(db):
+    question = "Imports from India?"
+    pipeline = make_pipeline(
+        db,
+        {question: "SELECT SUM(Value) FROM trade WHERE Country = 'India';"},
+        {question: "SELECT SUM(Value) FROM trade WHERE Country = 'IN';"},
+        use_router=False
+    )
+    
+    async def run():
+        async with AsyncQueryPipeline(pipeline) as async_pipeline:
+            return await async_pipeline.answer(question)
+    
+    answer = asyncio.run(run())
+    assert answer["success"] and answer["regenerated"]
+    assert answer["answer"] == f"answer to {question}"
+    assert pipeline.groq.blocking_calls == 0
+    # The fix request says what was wrong with the SQL
+    assert len(pipeline.groq.errors) == 1 and "'India'" in pipeline.groq.errors[0]
+
+
+def test_template_hits_skip_the_model(db):
+    # The model only knows the first question; the second has the same shape
+    pipeline = make_pipeline(db, {"Imports from India in 2080?": TEST_CASES[19]["expected_sql"]}, use_router=False)
+    first = pipeline.answer("Imports from India in 2080?")
+    second = pipeline.answer("Imports from China in 2081?")
+    assert first["success"] and second["success"]
+    assert second["sql"] == "SELECT SUM(Value) FROM trade WHERE Country = 'CN' AND Direction = 'I' AND Year = 2081;"
+    
+    async def run():
+        async with AsyncQueryPipeline(pipeline) as async_pipeline:
+            return await async_pipeline.answer("Imports from Japan in 2079?")
+    
+    assert asyncio.run(run())["sql"].endswith("Country = 'JP' AND Direction = 'I' AND Year = 2079;")
+    assert pipeline.templates.stats()["hits"] == 2
+
+
+def test_routed_questions_skip_the_model(db):
+    pipeline = make_pipeline(db, {})
+    answer = pipeline.answer("Top 5 export destinations in 2081?")
+    assert answer["success"]
+    assert answer["sql"] == (
+        "SELECT Country, SUM(Value) FROM trade WHERE Year = 2081 AND Direction = 'E' "
+        "GROUP BY Country ORDER BY SUM(Value) DESC LIMIT 5;"
+    )
+    assert pipeline.router.stats()["routed"] == 1
@@ -0,0 +1,50 @@
+# Per-query profiling and slow-query log tests (synthetic data, no models needed)
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.database import TradeDatabase
+from src.profiling import SlowQueryLog
+from src.result_cache import fingerprint
+from tests.synthetic_data import write_synthetic_csv
+
+SQL = "SELECT Country, SUM(Value) AS total FROM trade WHERE Year = 2080 GROUP BY Country ORDER BY total DESC"
+
+
+@pytest.fixture
+def db(tmp_path):
+    csv_path = write_synthetic_csv(tmp_path / "done_des.csv", n_rows=3000)
+    database = TradeDatabase(csv_path, use_snapshot=False, result_cache_bytes=0, pool_size=1,
+                             profile_queries=True)
+    database.slow_log = SlowQueryLog(tmp_path / "slow_queries.jsonl", threshold=0.0)
+    yield database
+    database.close()
+
+
+def test_slow_query_logged_with_profile(db):
+    result = db.execute_query(SQL, question="Which countries traded most in 2080?")
+    assert len(result) > 0
+    
+    [entry] = db.slow_log.read()
+    assert entry["question"] == "Which countries traded most in 2080?"
+    assert entry["fingerprint"] == fingerprint(SQL)
+    assert entry["rows_scanned"] == 3000
+    assert entry["rows_returned"] == len(result)
+    assert entry["peak_memory_bytes"] >= 0
+    operators = [op["operator"] for op in entry["operators"]]
+    assert "TABLE_SCAN" in operators
+    assert any(op.endswith("GROUP_BY") for op in operators)
+    
+    # The pooled cursor is reused with profiling switched back off
+    with db.pool.checkout() as cursor:
+        assert cursor.execute("SELECT current_setting('enable_profiling')").fetchone()[0] is None
+
+
+def test_fast_queries_not_logged(db):
+    db.slow_log.threshold = 60.0
+    db.preview_query(SQL, max_rows=5)
+    assert db.slow_log.read() == []
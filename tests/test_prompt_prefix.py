@@ -0,0 +1,90 @@
+# SQL prompt prefix reuse: only the question part of each prompt is evaluated (stand-in model, no GGUF needed)
+
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ctransformers.llm import LLM, Config
+
+from src.models import ModelLoader
+from src.prompt_builder import SQLPromptBuilder
+
+
+class CountingLLM:
+    # Character-level stand-in for a ctransformers LLM that counts evaluated tokens.
+    # Context handling is ctransformers' own prepare_inputs_for_generation.
+    
+    prepare_inputs_for_generation = LLM.prepare_inputs_for_generation
+    
+    def __init__(self):
+        self.config = Config()
+        self._context = []
+        self.evaluated = 0
+    
+    def tokenize(self, text):
+        return [1] + [ord(char) for char in text]
+    
+    def eval(self, tokens):
+        self.evaluated += len(tokens)
+        self._context.extend(tokens)
+    
+    def __call__(self, prompt, stream=False, **kwargs):
+        self.eval(self.prepare_inputs_for_generation(self.tokenize(prompt)))
+        self.eval([ord(char) for char in "SELECT 1;"])
+        return iter(["SELECT 1;"]) if stream else "SELECT 1;"
+
+
+def make_loader():
+    loader = ModelLoader()
+    loader.sql_model = CountingLLM()
+    return loader
+
+
+def evaluated_per_call(model, prompts, call):
+    counts = []
+    for prompt in prompts:
+        before = model.evaluated
+        assert call(prompt) == "SELECT 1;"
+        counts.append(model.evaluated - before)
+    return counts
+
+
+def test_primed_prefix_is_not_evaluated_again():
+    loader = make_loader()
+    builder = SQLPromptBuilder()
+    assert loader.prime_sql_prefix(builder.prefix()) == len(builder.prefix()) + 1
+    
+    prompts = [builder.build_prompt(q) for q in ["Imports from India?", "Top 5 countries?", "Trade in 2080?"]]
+    primed = evaluated_per_call(loader.sql_model, prompts, loader.generate_sql)
+    # Even the first question only evaluates the question part and the generated SQL
+    assert primed[0] == len(prompts[0]) - len(builder.prefix()) + len("SELECT 1;")
+    
+    # Later questions cost what plain model calls cost: ctransformers already
+    # keeps the context's common prefix with each prompt
+    model = CountingLLM()
+    plain = evaluated_per_call(model, prompts, model)
+    assert primed[1:] == plain[1:]
+    assert plain[0] > primed[0]
+
+
+def test_prompt_file_change_is_evaluated_once(tmp_path):
+    prompt_path = tmp_path / "sql_generation.txt"
+    prompt_path.write_text("You write DuckDB SQL.", encoding="utf-8")
+    builder = SQLPromptBuilder()
+    builder.prompt_path = prompt_path
+    builder._prompt_mtime = None
+    loader = make_loader()
+    loader.prime_sql_prefix(builder.prefix())
+    loader.generate_sql(builder.build_prompt("Imports from India?"))
+    
+    prompt_path.write_text("You write DuckDB SQL for the trade table.", encoding="utf-8")
+    os.utime(prompt_path, ns=(0, prompt_path.stat().st_mtime_ns + 1_000_000_000))
+    assert builder.prefix().startswith("You write DuckDB SQL for the trade table.")
+    
+    prompts = [builder.build_prompt(q) for q in ["Top 5 countries?", "Trade in 2080?"]]
+    changed, unchanged = evaluated_per_call(loader.sql_model, prompts, loader.generate_sql)
+    # The edited text onwards once, then at most the question again
+    assert changed > len(builder.prefix()) - len("You write DuckDB SQL")
+    assert unchanged <= len(prompts[1]) - len(builder.prefix()) + len("SELECT 1;")
@@ -0,0 +1,72 @@
+# Batch execution tests: fused results match one-at-a-time execution (synthetic data, no models needed)
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+import pytest
+
+from src.database import TradeDatabase
+from src.executor import QueryExecutor
+from tests.synthetic_data import write_synthetic_csv
+from tests.test_data import TEST_CASES
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    csv_path = write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=3000)
+    database = TradeDatabase(csv_path, use_snapshot=False, result_cache_bytes=0)
+    database.load_data()
+    yield database
+    database.close()
+
+
+def assert_same(sql, single, batched):
+    assert single[0] == batched[0] and single[2] == batched[2], sql
+    left, right = single[1], batched[1]
+    if "ORDER BY" not in sql.upper() and not left.empty:
+        left = left.sort_values(list(left.columns)).reset_index(drop=True)
+        right = right.sort_values(list(right.columns)).reset_index(drop=True)
+    pd.testing.assert_frame_equal(left, right, obj=sql)
+
+
+@pytest.mark.parametrize("route_rollups", [True, False])
+def test_batch_matches_single_execution(db, route_rollups):
+    executor = QueryExecutor(log_failures=False, db=db, route_rollups=route_rollups)
+    sqls = [case["expected_sql"] for case in TEST_CASES]
+    assert executor._fusion_batches(sqls)
+    for sql, single, batched in zip(sqls, [executor.execute(sql) for sql in sqls], executor.execute_many(sqls)):
+        assert_same(sql, single, batched)
+
+
+def test_year_totals_share_one_scan(db):
+    executor = QueryExecutor(log_failures=False, db=db, route_rollups=False)
+    sqls = [
+        f"SELECT SUM(Value) AS total FROM trade WHERE Year = {year} AND Direction = 'I';"
+        for year in (2078, 2079, 2080, 2081)
+    ] + ["SELECT Year, COUNT(*) FROM trade GROUP BY Year ORDER BY Year;"]
+    batches = executor._fusion_batches(sqls)
+    assert [batch.indexes for batch in batches] == [[0, 1, 2, 3, 4]]
+    assert batches[0].dimensions == {"Year", "Direction"}
+    
+    for sql, single, batched in zip(sqls, [executor.execute(sql) for sql in sqls], executor.execute_many(sqls)):
+        assert_same(sql, single, batched)
+
+
+def test_unfusable_queries_run_alone(db):
+    executor = QueryExecutor(log_failures=False, db=db, route_rollups=False)
+    sqls = [
+        "SELECT * FROM trade WHERE Country = 'IN' LIMIT 5;",
+        "SELECT SUM(Value) FROM trade WHERE Value > 1000;",
+        "SELECT Country, SUM(Value) - AVG(SUM(Value)) OVER () FROM trade GROUP BY Country;",
+        "SELECT SUM(Value) FROM trade WHERE Year = 2080;",
+        "DROP TABLE trade;",
+    ]
+    assert executor._fusion_batches(sqls) == []
+    results = executor.execute_many(sqls)
+    assert [result[0] for result in results] == [True, True, True, True, False]
+    
+    no_fusion = QueryExecutor(log_failures=False, db=db, fuse_queries=False)
+    assert [result[2] for result in no_fusion.execute_many(sqls)] == [result[2] for result in results]
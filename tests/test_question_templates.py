@@ -0,0 +1,78 @@
+# Question-template cache: slot extraction, SQL instantiation and when a template may not
+# be reused (synthetic data for the catalog's description words, no models needed)
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.database import TradeDatabase
+from src.question_templates import QuestionTemplates
+from tests.synthetic_data import write_synthetic_csv
+
+
+@pytest.fixture(scope="module")
+def catalog(tmp_path_factory):
+    csv_path = write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=3000)
+    database = TradeDatabase(csv_path, use_snapshot=False)
+    database.load_data()
+    yield database.catalog()
+    database.close()
+
+
+def test_same_shape_reuses_sql_with_new_slot_values(catalog):
+    templates = QuestionTemplates(catalog)
+    assert templates.sql_for("Rice exports to India in Shrawan 2081?") is None
+    assert templates.learn(
+        "Rice exports to India in Shrawan 2081?",
+        "SELECT SUM(Value) FROM trade WHERE Description LIKE '%rice%' AND Country = 'IN' "
+        "AND Direction = 'E' AND Month = 4 AND Year = 2081;"
+    )
+    assert templates.sql_for("Sugar imports to Japan in Chaitra 2079?") == (
+        "SELECT SUM(Value) FROM trade WHERE Description LIKE '%sugar%' AND Country = 'JP' "
+        "AND Direction = 'I' AND Month = 12 AND Year = 2079;"
+    )
+    # IN lists and BETWEEN take one slot per literal
+    templates.learn("Trade with India and China between 2078 and 2080?",
+                    "SELECT SUM(Value) FROM trade WHERE Country IN ('IN', 'CN') AND Year BETWEEN 2078 AND 2080;")
+    assert templates.sql_for("Trade with USA and UAE between 2079 and 2082?") == (
+        "SELECT SUM(Value) FROM trade WHERE Country IN ('US', 'AE') AND Year BETWEEN 2079 AND 2082;"
+    )
+    assert templates.stats()["hits"] == 2
+
+
+def test_only_literals_compared_with_the_slot_column_are_filled():
+    templates = QuestionTemplates()
+    templates.learn("Top 5 import countries in Magh?",
+                    "SELECT Country, SUM(Value) FROM trade WHERE Direction = 'I' AND Month = 10 "
+                    "GROUP BY Country ORDER BY SUM(Value) DESC LIMIT 5;")
+    assert templates.sql_for("Top 5 export countries in Baishakh?") == (
+        "SELECT Country, SUM(Value) FROM trade WHERE Direction = 'E' AND Month = 1 "
+        "GROUP BY Country ORDER BY SUM(Value) DESC LIMIT 5;"
+    )
+    # Different wording outside the slots is a different template
+    assert templates.sql_for("Top 10 export countries in Baishakh?") is None
+
+
+def test_slots_the_sql_does_not_use_must_match():
+    templates = QuestionTemplates()
+    templates.learn("Imports trend from 2077 to 2082?",
+                    "SELECT Year, SUM(Value) FROM trade WHERE Direction = 'I' GROUP BY Year ORDER BY Year;")
+    assert templates.sql_for("Exports trend from 2077 to 2082?") is not None
+    assert templates.sql_for("Exports trend from 2078 to 2082?") is None
+    # A literal two slots could have filled is ambiguous
+    assert not templates.learn("Trade with India or India?", "SELECT SUM(Value) FROM trade WHERE Country = 'IN';")
+
+
+def test_failed_template_sql_is_dropped():
+    templates = QuestionTemplates()
+    templates.learn("Imports from India?", "SELECT SUM(Value) FROM trade WHERE Country = 'IN' AND Direction = 'I';")
+    sql = templates.sql_for("Imports from Bhutan?")
+    # Failures of other SQL for the template leave it alone
+    templates.record("Imports from Bhutan?", "SELECT 1;", validated=False)
+    assert templates.sql_for("Imports from Bhutan?") == sql
+    templates.record("Imports from Bhutan?", sql, validated=False)
+    assert templates.sql_for("Imports from India?") is None
+    assert templates.stats()["dropped"] == 1
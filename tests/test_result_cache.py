@@ -0,0 +1,108 @@
+# Result cache fingerprinting, eviction and invalidation tests (synthetic data, no models needed)
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+import pytest
+
+from src.database import TradeDatabase
+from src.executor import QueryExecutor
+from src.result_cache import ResultCache, fingerprint, frame_size
+from tests.synthetic_data import write_synthetic_csv
+
+
+@pytest.fixture
+def db(tmp_path):
+    csv_path = write_synthetic_csv(tmp_path / "done_des.csv", n_rows=2000)
+    with TradeDatabase(csv_path, use_snapshot=False) as database:
+        yield database
+
+
+def test_fingerprint_ignores_formatting():
+    base = fingerprint("SELECT SUM(Value) FROM trade WHERE Year = 2080 AND Country IN ('IN', 'CN');")
+    assert base is not None
+    for sql in [
+        "select sum(Value) from trade where Year = 2080 and Country in ('IN', 'CN')",
+        "SELECT SUM(Value)\n  FROM trade\n WHERE Year = 2080\n   AND Country IN ('CN', 'IN');;",
+        "SELECT SUM(Value) FROM trade -- imports\nWHERE Year = 2080 AND Country IN ('IN','CN')",
+    ]:
+        assert fingerprint(sql) == base
+    
+    assert fingerprint("SELECT SUM(Value) FROM trade WHERE Year = 2081 AND Country IN ('IN', 'CN')") != base
+    assert fingerprint("SELECT * FROM trade ORDER BY random() LIMIT 5") is None
+    assert fingerprint("SELECT FROM WHERE") is None
+
+
+def test_repeated_query_served_from_cache(db):
+    first = db.execute_query("SELECT Year, SUM(Value) FROM trade GROUP BY Year ORDER BY Year;")
+    first.iloc[0, 1] = -1  # callers get copies, so this does not leak into the cache
+    second = db.execute_query("select Year, sum(Value) from trade group by Year order by Year")
+    
+    stats = db.result_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert second.iloc[0, 1] > 0
+    
+    preview = db.preview_query("SELECT * FROM trade ORDER BY Value", max_rows=5)
+    cached_preview = db.preview_query("SELECT * FROM trade ORDER BY Value;", max_rows=5)
+    assert cached_preview.attrs["total_rows"] == preview.attrs["total_rows"] == 2000
+    assert db.result_cache.stats()["hits"] == 2
+
+
+def test_data_version_change_invalidates(db):
+    sql = "SELECT COUNT(*) FROM trade WHERE Direction = 'I'"
+    db.execute_query(sql)
+    db.execute_query(sql)
+    
+    db.data_version = "reloaded"
+    db.execute_query(sql)
+    
+    stats = db.result_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+
+
+def test_result_from_before_a_swap_not_cached(db):
+    sql = "SELECT COUNT(*) FROM trade WHERE Direction = 'E'"
+    db.load_data()
+    
+    def run():
+        # A partition swap lands while the query runs
+        result = pd.DataFrame({"count": [1]})
+        db.data_version = "swapped"
+        return result
+    
+    assert db._cached(sql, run).iloc[0, 0] == 1
+    assert db.result_cache.stats()["entries"] == 0
+    assert db.execute_query(sql).iloc[0, 0] > 1
+
+
+def test_lru_eviction_within_budget():
+    frame = pd.DataFrame({"value": range(100)})
+    cache = ResultCache(max_bytes=frame_size(frame) * 2)
+    
+    cache.put("a", 1, frame)
+    cache.put("b", 1, frame)
+    assert cache.get("a", 1) is not None  # a is now most recently used
+    cache.put("c", 1, frame)
+    
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is not None
+    assert cache.get("c", 1) is not None
+    
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+    
+    # Results larger than the whole budget are never cached
+    cache.put("big", 1, pd.DataFrame({"value": range(1000)}))
+    assert cache.get("big", 1) is None
+
+
+def test_executor_reuses_cached_result(db):
+    executor = QueryExecutor(log_failures=False, db=db)
+    for _ in range(3):
+        success, result, msg = executor.execute("SELECT SUM(Value) FROM trade WHERE Year = 2080;")
+        assert success
+    assert db.result_cache.stats()["hits"] == 2
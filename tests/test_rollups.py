@@ -0,0 +1,94 @@
+# Rollup routing equivalence over the full TEST_CASES corpus (synthetic data, no models needed)
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+import pytest
+
+from src.database import TradeDatabase
+from src.rollups import RollupRouter
+from tests.synthetic_data import TOTAL_ROW, write_synthetic_csv
+from tests.test_data import TEST_CASES
+
+EXTRA_QUERIES = [
+    "SELECT SUM(Value) FROM trade WHERE HS_Code LIKE '27%' AND Direction = 'I';",
+    "SELECT Year, SUM(Quantity) FROM trade WHERE HS_Code LIKE '10%' GROUP BY Year ORDER BY Year;",
+    "SELECT COUNT(*) FILTER (WHERE Direction = 'E'), AVG(Value) FROM trade WHERE Year = 2081;",
+    "SELECT AVG(Value), COUNT(*), SUM(Revenue) FROM trade WHERE Country = 'ZZ';",
+    "SELECT Country, MIN(Value), MAX(Quantity) FROM trade GROUP BY Country HAVING COUNT(*) > 10;",
+    "SELECT DISTINCT Country FROM trade WHERE Direction = 'E' ORDER BY Country;",
+    "SELECT Year AS y, SUM(Value) AS total FROM trade GROUP BY y ORDER BY total DESC LIMIT 3;",
+    "SELECT trade.Year, COUNT(Revenue) FROM trade GROUP BY trade.Year;",
+    # HS2 is NULL for the 'TOTAL' row, where the LIKE is false
+    "SELECT COUNT(*) FROM trade WHERE NOT HS_Code LIKE '27%';",
+    "SELECT Year, SUM(Value) FROM trade WHERE (HS_Code LIKE '27%') IS NOT TRUE GROUP BY Year;",
+    "SELECT COUNT(*) FROM trade WHERE HS_Code LIKE '27%' OR Direction = 'E';",
+]
+
+
+def normalized(df: pd.DataFrame) -> pd.DataFrame:
+    # Row order is only defined up to ties, so compare sorted rows
+    return df.sort_values(list(df.columns), kind="mergesort").reset_index(drop=True)
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    csv_path = write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=20000,
+                                   extra_rows=(TOTAL_ROW,))
+    database = TradeDatabase(csv_path, use_snapshot=False)
+    database.load_data()
+    yield database
+    database.close()
+
+
+def test_routed_queries_match_base_table(db):
+    router = RollupRouter(db)
+    queries = [case["expected_sql"] for case in TEST_CASES] + EXTRA_QUERIES
+    routed_count = 0
+    
+    for sql in queries:
+        routed_sql = router.route(sql)
+        if routed_sql == sql:
+            continue
+        routed_count += 1
+        assert "trade_rollup" in routed_sql
+        
+        expected = db.execute_query(sql)
+        actual = db.execute_query(routed_sql)
+        
+        assert list(actual.columns) == list(expected.columns), sql
+        assert list(actual.dtypes) == list(expected.dtypes), sql
+        pd.testing.assert_frame_equal(
+            normalized(actual), normalized(expected), check_exact=False, rtol=1e-9
+        )
+    
+    # Most of the corpus is rollup-shaped aggregates
+    assert routed_count >= 60
+
+
+def test_row_level_queries_not_routed(db):
+    router = RollupRouter(db)
+    for sql in [
+        "SELECT * FROM trade LIMIT 100;",
+        "SELECT Year FROM trade WHERE Direction = 'I';",
+        "SELECT SUM(Value) FROM trade WHERE Description LIKE '%wheat%';",
+        "SELECT COUNT(Year) FROM trade;",
+        "SELECT SUM(Value) FROM trade WHERE HS_Code LIKE '2%';",
+        "SELECT SUM(Value) OVER () FROM trade;",
+        "SELECT Country FROM trade GROUP BY Country ORDER BY random() LIMIT 5;",
+        "SELECT COUNT(*) FROM trade WHERE Country IN (SELECT Country FROM trade WHERE Value > 1);",
+    ]:
+        assert router.route(sql) == sql
+
+
+def test_hs_chapter_prefix_uses_hs_rollup(db):
+    router = RollupRouter(db)
+    routed = router.route("SELECT SUM(Value) FROM trade WHERE HS_Code LIKE '27%';")
+    assert "trade_rollup_hs" in routed
+    assert "HS2 = 27" in routed
+    
+    routed = router.route("SELECT Year, SUM(Value) FROM trade WHERE HS4 = 2710 GROUP BY Year;")
+    assert "trade_rollup_hs" in routed
@@ -0,0 +1,97 @@
+# Persistent snapshot build and reuse tests (synthetic data, no models needed)
+
+import os
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.database import TradeDatabase
+from src.snapshot import build_snapshot, ensure_snapshot, read_meta
+from tests.synthetic_data import write_synthetic_csv
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    return write_synthetic_csv(tmp_path / "done_des.csv", n_rows=3000)
+
+
+def test_snapshot_built_once_and_reused(csv_path):
+    snapshot_path = csv_path.with_suffix(".duckdb")
+    
+    first = ensure_snapshot(csv_path, snapshot_path)
+    assert snapshot_path.exists()
+    assert first["row_count"] == 3000
+    
+    # Second start reuses the file without rebuilding
+    second = ensure_snapshot(csv_path, snapshot_path)
+    assert second["built_at"] == first["built_at"]
+    
+    # Touching the CSV without changing content does not rebuild either
+    os.utime(csv_path, None)
+    third = ensure_snapshot(csv_path, snapshot_path)
+    assert third["built_at"] == first["built_at"]
+
+
+def test_snapshot_rebuilt_when_csv_changes(csv_path):
+    snapshot_path = csv_path.with_suffix(".duckdb")
+    first = ensure_snapshot(csv_path, snapshot_path)
+    
+    write_synthetic_csv(csv_path, n_rows=1000, seed=11)
+    second = ensure_snapshot(csv_path, snapshot_path)
+    
+    assert second["checksum"] != first["checksum"]
+    assert second["row_count"] == 1000
+    assert read_meta(snapshot_path)["checksum"] == second["checksum"]
+
+
+def test_snapshot_matches_csv_load(csv_path):
+    sql = "SELECT Year, Direction, SUM(Value), COUNT(*) FROM trade GROUP BY Year, Direction ORDER BY Year, Direction"
+    
+    with TradeDatabase(csv_path, use_snapshot=False) as csv_db:
+        expected = csv_db.execute_query(sql)
+        csv_version = csv_db.data_version
+    
+    # Two databases attach the same snapshot read-only side by side
+    with TradeDatabase(csv_path) as first, TradeDatabase(csv_path) as second:
+        assert first.data_version == csv_version
+        for db in (first, second):
+            result = db.execute_query(sql)
+            assert result.iloc[:, [0, 1, 3]].equals(expected.iloc[:, [0, 1, 3]])
+            assert (result.iloc[:, 2] - expected.iloc[:, 2]).abs().max() < 1e-6
+
+
+def test_snapshot_used_without_csv(csv_path):
+    snapshot_path = csv_path.with_suffix(".duckdb")
+    ensure_snapshot(csv_path, snapshot_path)
+    csv_path.unlink()
+    
+    with TradeDatabase(csv_path) as db:
+        assert db.get_row_count() == 3000
+
+
+def test_concurrent_builds_do_not_clobber(csv_path):
+    snapshot_path = csv_path.with_suffix(".duckdb")
+    errors = []
+    
+    def build():
+        try:
+            build_snapshot(csv_path, snapshot_path)
+        except Exception as e:
+            errors.append(e)
+    
+    workers = [threading.Thread(target=build) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    
+    assert errors == []
+    assert read_meta(snapshot_path)["row_count"] == 3000
+    # No scratch files are left behind
+    assert sorted(p.name for p in csv_path.parent.iterdir()) == ["done_des.csv", "done_des.duckdb", "done_des.json"]
+    with TradeDatabase(csv_path) as db:
+        assert db.get_row_count() == 3000
@@ -0,0 +1,145 @@
+# Grammar-constrained SQL generation: reference queries stay generable, logged failure patterns
+# do not, and masking steers a stand-in model to valid SQL (synthetic data, no GGUF needed)
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from ctransformers.llm import LLM, Config
+
+from src.database import TradeDatabase
+from src.models import ModelLoader
+from src.prompt_builder import SQLPromptBuilder
+from src.sql_grammar import SQLGrammar
+from tests.detailed_test_data import DETAILED_TRADE_CASES
+from tests.synthetic_data import write_synthetic_csv
+from tests.test_data import TEST_CASES
+from tests.variety_test_data import ADDITIONAL_VARIETY_CASES
+
+REFERENCE_SQL = [case["expected_sql"] for case in TEST_CASES + DETAILED_TRADE_CASES + ADDITIONAL_VARIETY_CASES]
+
+# Shapes of the failures in logs/query_errors.jsonl, plus other output that never runs
+INVALID_SQL = [
+    "SELECT Country, SUM(Value) FROM trade WHERE Year IN (2080) -- replace with actual years\nGROUP BY Country;",
+    "SELECT Country, Year FROM trade GROUP BY Country, Year ORDER BY random() LIMIT N;",
+    "SELECT AVG(Value) FROM trade GROUP BY Year HAVING Year = (SELECT YEAR(random() * 5) FROM trade);",
+    "SELECT c.Country, SUM(t.Value) FROM trade t JOIN country c ON t.Country = c.ISO_Code GROUP BY c.Country;",
+    "SELECT DISTINCT c1.Country FROM trade t1 JOIN trade t2 ON t1.HS_Code = t2.HS_Code WHERE t1.Direction = 'E';",
+    "SELECT HS_Code, SUM(Value) FROM trade WHERE Direction = 'I' AND LEFT(HS_Code, 2) = '84';",
+    "SELECT Year FROM trade WHERE COUNT(*) > 100000 GROUP BY Year ORDER BY Year;",
+    "SELECT Country, SUM(Value) OVER () AS total FROM trade GROUP BY Country;",
+    "SELECT SUM(Value) FROM trade WHERE Year = ?;",
+    "SELECT SUM(Value) FROM trade WHERE Year = <year>;",
+    "SELECT SUM(Value) FROM imports;",
+    "```sql\nSELECT SUM(Value) FROM trade;\n```",
+    "DELETE FROM trade;",
+    "SELECT 1 FROM trade; DROP TABLE trade;",
+]
+
+
+class PreferenceLLM:
+    # Character-level stand-in for a ctransformers LLM that always wants to write the
+    # first of its texts the output is still a prefix of (earlier texts score higher).
+    # Sampling is greedy over logits the caller may mask in place, like LLM.logits.
+    
+    prepare_inputs_for_generation = LLM.prepare_inputs_for_generation
+    
+    def __init__(self, *texts):
+        self.texts = texts
+        self.config = Config()
+        self._context = []
+        self.prompt_length = 0
+        self._logits = []
+    
+    @property
+    def generated(self):
+        return "".join(chr(token) for token in self._context[self.prompt_length:])
+    
+    @property
+    def logits(self):
+        return self._logits
+    
+    def tokenize(self, text):
+        self.prompt_length = len(text) + 1
+        return [1] + [ord(char) for char in text]
+    
+    def detokenize(self, tokens):
+        return "".join(chr(token) for token in tokens)
+    
+    def is_eos_token(self, token):
+        return token == 0
+    
+    def eval(self, tokens):
+        self._context.extend(tokens)
+        generated = self.generated
+        self._logits = [0.0] * 128
+        for rank, text in enumerate(self.texts):
+            if text.startswith(generated):
+                next_token = ord(text[len(generated)]) if len(text) > len(generated) else 0
+                self._logits[next_token] += len(self.texts) - rank
+    
+    def sample(self, **kwargs):
+        return max(range(128), key=lambda token: self._logits[token])
+    
+    def __call__(self, prompt, stream=False, **kwargs):
+        self.eval(self.prepare_inputs_for_generation(self.tokenize(prompt)))
+        chunks = []
+        while len(chunks) < 150:
+            token = self.sample()
+            if self.is_eos_token(token):
+                break
+            chunks.append(chr(token))
+            self.eval([token])
+        return iter(chunks) if stream else "".join(chunks)
+
+
+@pytest.fixture(scope="module")
+def catalog(tmp_path_factory):
+    csv_path = write_synthetic_csv(tmp_path_factory.mktemp("data") / "done_des.csv", n_rows=3000)
+    database = TradeDatabase(csv_path, use_snapshot=False)
+    database.load_data()
+    yield database.catalog()
+    database.close()
+
+
+def test_reference_queries_are_generable():
+    grammar = SQLGrammar()
+    for sql in REFERENCE_SQL:
+        assert grammar.complete(sql), sql
+        # Every prefix too, or constrained decoding could never reach the query
+        for end in range(1, len(sql)):
+            assert grammar.accepts(sql[:end]), sql[:end]
+
+
+@pytest.mark.parametrize("sql", INVALID_SQL)
+def test_invalid_sql_is_not_generable(sql):
+    grammar = SQLGrammar()
+    assert not grammar.complete(sql)
+    assert not grammar.accepts(sql)
+
+
+def test_values_come_from_the_catalog(catalog):
+    grammar = SQLGrammar(catalog)
+    assert grammar.complete("SELECT SUM(Value) FROM trade WHERE Direction = 'I' AND Country = 'IN';")
+    assert not grammar.accepts("SELECT SUM(Value) FROM trade WHERE Direction = 'Im")
+    assert not grammar.complete("SELECT SUM(Value) FROM trade WHERE Unit = 'KG';")
+    # A list only needs one value that occurs; inequality with any value is fine
+    assert grammar.complete("SELECT SUM(Value) FROM trade WHERE Country IN ('IN', 'XX');")
+    assert not grammar.complete("SELECT SUM(Value) FROM trade WHERE Country IN ('XX', 'YY');")
+    assert grammar.complete("SELECT SUM(Value) FROM trade WHERE Country <> 'XX';")
+
+
+def test_constrained_generation_masks_invalid_tokens(catalog):
+    invalid = "SELECT Country, SUM(Value) FROM trade WHERE Direction = 'Import' ORDER BY 2 DESC LIMIT N;"
+    valid = "SELECT Country, SUM(Value) FROM trade WHERE Direction = 'I' GROUP BY Country ORDER BY 2 DESC LIMIT 5;"
+    prompt = SQLPromptBuilder().build_prompt("Top importers?")
+    
+    loader = ModelLoader()
+    loader.sql_model = PreferenceLLM(invalid, valid)
+    assert loader.generate_sql(prompt) == invalid
+    
+    loader.constrain_sql(SQLGrammar(catalog))
+    assert loader.generate_sql(prompt) == valid
+    assert loader.grammar_stats["masked_tokens"] > 0
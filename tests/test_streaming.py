@@ -0,0 +1,112 @@
+# Streamed generation stops at the end of the SQL statement (stand-in model, no GGUF needed)
+
+import random
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.models import ModelLoader
+from src.prompt_builder import SQLPromptBuilder
+from src.streaming import until_statement_end
+from tests.test_data import TEST_CASES
+
+# What the model tends to write after its SQL: the next few-shot example
+CONTINUATION = "\n\nQuestion: Exports to China?\nSELECT SUM(Value) FROM trade WHERE Country = 'CN';"
+
+
+def tokens(text):
+    # Word and punctuation pieces, roughly like a BPE tokenizer splits SQL
+    return re.findall(r"\s*\w+|\s*[^\w\s]|\s+", text)
+
+
+class StreamingLLM:
+    # Streams a scripted output one token at a time and counts the tokens produced
+    
+    def __init__(self, output):
+        self.output = output
+        self.produced = 0
+        self.closed = False
+    
+    def tokenize(self, text):
+        return [ord(char) for char in text]
+    
+    def prepare_inputs_for_generation(self, tokens, reset=None):
+        return tokens
+    
+    def eval(self, tokens):
+        pass
+    
+    def __call__(self, prompt, stream=False, **kwargs):
+        assert stream
+        try:
+            for token in tokens(self.output):
+                self.produced += 1
+                yield token
+        finally:
+            self.closed = True
+
+
+def stream(text, rng):
+    # text in chunks of 1-8 characters
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 8)
+        yield text[position:position + size]
+        position += size
+
+
+def test_test_cases_end_at_semicolon():
+    rng = random.Random(0)
+    builder = SQLPromptBuilder()
+    for case in TEST_CASES:
+        sql = case["expected_sql"]
+        streamed = "".join(until_statement_end(stream(sql + CONTINUATION, rng)))
+        assert streamed == sql
+        assert builder.extract_sql(streamed) == builder.extract_sql(sql + CONTINUATION)
+
+
+@pytest.mark.parametrize("output, expected", [
+    ("SELECT * FROM trade WHERE Description LIKE '%a;b%';\nmore", "SELECT * FROM trade WHERE Description LIKE '%a;b%';"),
+    ("SELECT 1 -- not here;\nFROM trade; x", "SELECT 1 -- not here;\nFROM trade;"),
+    ("Answer; here it is:\n```sql\nSELECT 1 FROM trade;\n```", "Answer; here it is:\n```sql\nSELECT 1 FROM trade;"),
+    ("SELECT Country FROM trade\n\nThis lists countries.", "SELECT Country FROM trade"),
+    ("\n\nSELECT 1 FROM trade", "\n\nSELECT 1 FROM trade"),
+    ("WITH t AS (SELECT 1 AS a) SELECT a FROM t; SELECT 2;", "WITH t AS (SELECT 1 AS a) SELECT a FROM t;"),
+])
+def test_statement_end(output, expected):
+    for size in (1, 3, 100):
+        chunks = [output[i:i + size] for i in range(0, len(output), size)]
+        # A blank line is only seen after its first newline went out
+        assert "".join(until_statement_end(chunks)).rstrip("\n") == expected
+
+
+def test_model_stops_generating_at_semicolon():
+    sql = TEST_CASES[0]["expected_sql"]
+    loader = ModelLoader()
+    loader.sql_model = StreamingLLM(sql + CONTINUATION)
+    
+    streamed = list(loader.stream_sql(SQLPromptBuilder().build_prompt(TEST_CASES[0]["question"])))
+    assert "".join(streamed) == sql
+    assert loader.sql_model.produced == len(tokens(sql))
+    
+    loader.sql_model = StreamingLLM(sql + CONTINUATION)
+    assert loader.generate_sql("Question?") == sql
+    
+    with pytest.raises(RuntimeError):
+        ModelLoader().stream_sql("Question?")
+
+
+def test_closing_the_stream_stops_the_model():
+    loader = ModelLoader()
+    loader.sql_model = StreamingLLM(TEST_CASES[0]["expected_sql"])
+    
+    chunks = loader.stream_sql("Question?")
+    next(chunks)
+    assert not loader.sql_model.closed
+    chunks.close()
+    assert loader.sql_model.closed
+    assert loader.sql_model.produced == 1